@@ -1 +1 @@
-from datafingerprint.datafingerprint import DataFingerprint
\ No newline at end of file
+from datafingerprint.datafingerprint import DataFingerprint, fingerprint_many
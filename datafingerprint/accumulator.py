@@ -0,0 +1,66 @@
+# -----------------------------------------------------------------------------
+# accumulator.py
+# buffered, vectorized accumulation of triples into a data fingerprint
+#
+# Every statement (triple) adds the shifted average
+#     fp[i] += (v1[i] + v2[(i+1) % L] + v3[(i+2) % L]) / 3
+# to the fingerprint. The contribution is linear in v1, v2 and v3, so instead
+# of looping over i for every triple, the vectors are buffered and reduced in
+# blocks: the statements of a block are rotated with np.roll and averaged all
+# at once, then added to the fingerprint one after the other (a cumulative
+# sum), in the order of the original loop, so the result is bit-for-bit the
+# same as adding them one at a time.
+#
+# Several fingerprints (e.g. of lengths 11 and 13) can be accumulated at once
+# from concatenated vectors; each segment is rotated on its own.
+# -----------------------------------------------------------------------------
+import numpy as np
+
+
+class TripleAccumulator(object):
+    def __init__(self, lengths, block_size=1024):
+        self.lengths = [lengths] if isinstance(lengths, int) else list(lengths)
+        self.L = sum(self.lengths)
+        self.block_size = block_size
+        self.segments = []
+        start = 0
+        for length in self.lengths:
+            self.segments.append(slice(start, start + length))
+            start += length
+        self.fp = np.zeros(self.L)
+        self.pending = []
+
+    # -------------------------------------------------------------------------
+    # reset
+    # drop the fingerprint and any buffered triples
+    # -------------------------------------------------------------------------
+    def reset(self):
+        self.fp = np.zeros(self.L)
+        self.pending = []
+
+    # -------------------------------------------------------------------------
+    # add
+    # buffer one triple, reducing the buffer once it holds block_size triples
+    # -------------------------------------------------------------------------
+    def add(self, v1, v2, v3):
+        self.pending.extend((v1, v2, v3))
+        if len(self.pending) >= 3 * self.block_size:
+            self.flush()
+
+    # -------------------------------------------------------------------------
+    # flush
+    # reduce all buffered triples into the fingerprint and return it
+    # -------------------------------------------------------------------------
+    def flush(self):
+        if self.pending:
+            block = np.concatenate(self.pending).reshape(-1, 3, self.L)
+            self.pending = []
+            # row 0 is the fingerprint so far, row t the statement of triple t
+            rows = np.empty((len(block) + 1, self.L))
+            rows[0] = self.fp
+            for seg in self.segments:
+                rows[1:, seg] = (block[:, 0, seg] + np.roll(block[:, 1, seg], -1, axis=1) +
+                                 np.roll(block[:, 2, seg], -2, axis=1)) / 3
+            # summing (or np.sum, which is pairwise) would change the order of the additions
+            self.fp = np.add.accumulate(rows, axis=0, out=rows)[-1].copy()
+        return self.fp
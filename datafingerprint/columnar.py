@@ -0,0 +1,98 @@
+# -----------------------------------------------------------------------------
+# columnar.py
+# fingerprint many records (rows) that share the same keys column by column
+#
+# The fingerprint of a dict is a sum over its keys: a key with a scalar cargo
+# adds the one statement
+#     fp[i] += (v(0)[i] + v(key)[(i+1) % L] + v(cargo)[(i+2) % L]) / 3
+# and a key with a nested cargo adds the statements of the nested structure
+# as well (see DataFingerprint.recurse_structure). So for a batch of records
+# the vector of every key is computed once, the distinct scalar values of a
+# column are encoded in one batch (DataFingerprint.vector_values), and the
+# statements of the column are added to the fingerprints of all rows with
+# one gather of the encoded values. Only nested cells are recursed one at a
+# time, each continuing from the fingerprint of its row.
+#
+# Each statement is computed with the same operations as the accumulator and
+# added to its row in the order of the keys, as recursion would, so the
+# result is bit-for-bit that of recursing each record. Records therefore only
+# share their keys if these come in the same order.
+# -----------------------------------------------------------------------------
+import numpy as np
+
+BATCH_SIZE = 4096
+
+
+# -----------------------------------------------------------------------------
+# shared_keys
+# the keys shared by all records if they are all non-empty dicts with the
+# same keys in the same order, else None
+# -----------------------------------------------------------------------------
+def shared_keys(records):
+    if not records or not all(isinstance(r, dict) for r in records):
+        return None
+    keys = list(records[0])
+    if not keys or any(len(r) != len(keys) or list(r) != keys for r in records):
+        return None
+    return keys
+
+
+# -----------------------------------------------------------------------------
+# rotate
+# rows of V rotated left by k within each segment
+# -----------------------------------------------------------------------------
+def rotate(V, k, segments):
+    W = np.empty_like(V)
+    for seg in segments:
+        W[..., seg] = np.roll(V[..., seg], -k, axis=-1)
+    return W
+
+
+# -----------------------------------------------------------------------------
+# nested_cell
+# (statements, fp) of one key with a nested cargo, as a statement of a
+# top-level dict whose fingerprint so far is fp
+# -----------------------------------------------------------------------------
+def nested_cell(dfp, fp, base, key, vkey, cargo):
+    dfp.reset()
+    dfp.fp = fp
+    used = dfp.hash_entry(dfp.root, base, key, cargo, vkey)
+    record = (dfp.statements + used, dfp.fp.copy())
+    dfp.reset()
+    return record
+
+
+# -----------------------------------------------------------------------------
+# fingerprint_records
+# statements and fingerprints (an N x width matrix) of dict records, column
+# by column over the given keys (those of the first record by default)
+# -----------------------------------------------------------------------------
+def fingerprint_records(dfp, records, keys=None):
+    keys = list(records[0]) if keys is None and records else keys or []
+    segments = dfp.accumulator.segments
+    base = dfp.vector_value(0)
+    key_vectors = rotate(dfp.vector_values(keys), 1, segments) if keys else np.zeros((0, dfp.width))
+    fps = np.zeros((len(records), dfp.width))
+    statements = np.zeros(len(records), dtype=np.int64)
+    for k, key in enumerate(keys):
+        rows = []
+        codes = []
+        distinct = {}
+        for n, record in enumerate(records):
+            cargo = record.get(key)
+            # skip empty strings, null value, careful about integer "0"
+            if not (cargo or isinstance(cargo, int)):
+                continue
+            if isinstance(cargo, (list, dict)):
+                count, fps[n] = nested_cell(dfp, fps[n].copy(), base, key, dfp.vector_value(key), cargo)
+                statements[n] += count
+                continue
+            rows.append(n)
+            codes.append(distinct.setdefault(cargo, len(distinct)))
+        if not rows:
+            continue
+        values = rotate(dfp.vector_values(list(distinct)), 2, segments)
+        # (v1 + v2 + v3) / 3 in the order of TripleAccumulator.flush
+        fps[rows] += (base + key_vectors[k] + values[codes]) / 3
+        statements[rows] += 1
+    return statements, fps
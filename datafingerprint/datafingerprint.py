@@ -8,30 +8,62 @@
 # Not included here:
 # 1. skip_nulls (default is skipping null values)
 # 2. excluded keys
-# 3. multiple fingerprints (for prime number series)
-# 4. modifications in newer versions
+# 3. modifications in newer versions
 #
 # naming conventions:
 # https://www.python.org/dev/peps/pep-0008/#prescriptive-naming-conventions
 # -----------------------------------------------------------------------------
 import click
+import contextlib
 import os
 import sys
-import glob
+import itertools
 import json
 import math
+import re
+import xml.etree.ElementTree as ET
 import numpy as np
-from functools import lru_cache
+from datafingerprint.accumulator import TripleAccumulator
+from datafingerprint.columnar import BATCH_SIZE, fingerprint_records, shared_keys
+from datafingerprint.encoders import STRING_ENCODINGS, encode_strings
+from datafingerprint.readers import (chunked, clean_id, input_name, iter_jsonl, iter_top_level, list_inputs,
+                                    open_input, open_text)
+from datafingerprint.stats import RunStats
+from datafingerprint.triples import TextTripleSink, make_sink, reformat
+from datafingerprint.vector_cache import VectorCache
+from datafingerprint.vector_store import VectorStore
+from datafingerprint.writers import BUFFER_SIZE, FORMATS, SplitWriter, open_writer
+from datafingerprint.xml_reader import is_xml, iter_xml_records, read_xml
 
 class DataFingerprint(object):
     def __init__(self, **kwargs):
-        self.L = kwargs['length'] if 'length' in kwargs and kwargs['length'] is not None else 13
+        # one or more fingerprint lengths (an int, a list or a string like "11,13")
+        self.lengths = self.parse_lengths(kwargs['length'] if 'length' in kwargs and kwargs['length'] is not None else 13)
         self.norm = kwargs['norm'] if 'norm' in kwargs and kwargs['norm'] is not None else 0
         self.debug = kwargs['debug'] if 'debug' in kwargs and kwargs['debug'] is not None else 1
-        self.tripler = False
-        if 'tripler' in kwargs and kwargs['tripler'] is not None:
-            self.tripler = True
+        # write the triples of each json file to <id>.triple next to it
+        self.tripler = bool(kwargs['tripler']) if 'tripler' in kwargs and kwargs['tripler'] is not None else False
         self.file_paths = kwargs['file_paths'] if 'file_paths' in kwargs and kwargs['file_paths'] is not None else None
+        self.workers = kwargs['workers'] if 'workers' in kwargs and kwargs['workers'] is not None else 1
+        # line-delimited json input: one object per line, identified by id_field
+        self.linewise = kwargs['linewise'] if 'linewise' in kwargs and kwargs['linewise'] is not None else False
+        self.id_field = kwargs['id_field'] if 'id_field' in kwargs and kwargs['id_field'] is not None else 'id'
+        # parse json files incrementally, one top-level entry at a time, and
+        # optionally fingerprint each top-level entry (row) on its own
+        self.stream = kwargs['stream'] if 'stream' in kwargs and kwargs['stream'] is not None else False
+        self.rows = kwargs['rows'] if 'rows' in kwargs and kwargs['rows'] is not None else False
+        # xml input (files named .xml are read as xml anyway); with rows, the
+        # records are the children of the root element or the elements named
+        # record_tag
+        self.xml = kwargs['xml'] if 'xml' in kwargs and kwargs['xml'] is not None else False
+        self.record_tag = kwargs['record_tag'] if 'record_tag' in kwargs else None
+        # fingerprint batches of records sharing the same keys column by column
+        # (off by default; the fingerprints are the same, see columnar.py)
+        self.columnar = kwargs['columnar'] if 'columnar' in kwargs and kwargs['columnar'] is not None else False
+        # format of the fingerprints of a directory: tsv (out.fp), npy (out.npy
+        # and out.ids) or fp (a serialized database out.db.fp/out.db.id)
+        self.output_format = kwargs['output_format'] if 'output_format' in kwargs and kwargs['output_format'] is not None else 'tsv'
+        self.kwargs = dict(kwargs)
         self.root = 'root'
         self.numeric_encoding = 'ME'    # ME, ML, smooth, simple [default]
         self.string_encoding = 'decay'  # decay, pair_sum
@@ -39,10 +71,58 @@ class DataFingerprint(object):
         self.decimal = 3
         self.skip_nulls = True
         self.array_are_sets = False
-        self.fp = np.zeros(self.L)
+        # encoding configs, each a dict overriding numeric_encoding, string_encoding
+        # and/or string_encoding_decay; one fingerprint per length and config
+        self.encodings = kwargs['encodings'] if 'encodings' in kwargs and kwargs['encodings'] else [{}]
+        self.configs = [dict(encoding, L=length) for length in self.lengths for encoding in self.encodings]
+        self.width = sum(c['L'] for c in self.configs)
+        self.block_size = kwargs['block_size'] if 'block_size' in kwargs and kwargs['block_size'] is not None else 1024
+        self.accumulator = TripleAccumulator([c['L'] for c in self.configs], self.block_size)
+        # per-instance cache of token vectors; number_cache_size=0 skips caching numbers like LIBLPH
+        self.cache = VectorCache(
+            max_entries=kwargs['cache_size'] if 'cache_size' in kwargs else 100000,
+            max_bytes=kwargs['cache_bytes'] if 'cache_bytes' in kwargs else None,
+            max_numbers=kwargs['number_cache_size'] if 'number_cache_size' in kwargs else 10000)
+        # optional read-only, memory-mapped token vectors shared across processes;
+        # checked against the encoding on first use, once attributes such as
+        # numeric_encoding have been set
+        self.vector_store = kwargs['vector_store'] if 'vector_store' in kwargs else None
+        if isinstance(self.vector_store, str):
+            self.vector_store = VectorStore(self.vector_store)
+        self.vector_store_checked = False
+        # triples are only produced for a sink: a TripleSink, a .triple file
+        # path, a list to extend or a callback taking chunks of triples
+        self.triple_sink = make_sink(kwargs['triple_sink'] if 'triple_sink' in kwargs else None)
+        # with encode off only the traversal is run: statements are counted and
+        # triples reach the sink, but no vectors are computed or added
+        self.encode = kwargs['encode'] if 'encode' in kwargs and kwargs['encode'] is not None else True
         self.statements = 0
-        self.triples = []
         self.errors = []
+        # timings and counters of the run (see stats.py), off by default
+        self.stats = RunStats(enabled=bool(kwargs['stats']) if 'stats' in kwargs and kwargs['stats'] is not None else False)
+        if self.stats.enabled:
+            self.instrument()
+
+    # -------------------------------------------------------------------------
+    # instrument
+    # time the hot methods of this instance; cache lookups and the buffering
+    # of statements cost about as much as the timer, so vector_value is the
+    # time spent encoding values missing from the cache and add_vector_value
+    # the time spent reducing the buffered statements into the fingerprint
+    # -------------------------------------------------------------------------
+    def instrument(self):
+        for phase, name in [('read', 'read_json'), ('read', 'read_xml'), ('vector_value', 'compute_vector_value'),
+                            ('vector_values', 'vector_values')]:
+            setattr(self, name, self.stats.timed(phase, getattr(self, name)))
+        self.accumulator.flush = self.stats.timed('add_vector_value', self.accumulator.flush)
+
+    # -------------------------------------------------------------------------
+    # stats_report
+    # the timings, cache hit rate, statements per document and peak memory of
+    # the run so far as a json-serializable dict (see stats.RunStats.report)
+    # -------------------------------------------------------------------------
+    def stats_report(self):
+        return self.stats.report(self.cache)
 
     # -------------------------------------------------------------------------
     # reset
@@ -51,18 +131,93 @@ class DataFingerprint(object):
     def reset(self):
         if self.debug > 1:
             print("#resetFingerprint()\n")
-        self.fp = np.zeros(self.L)
+        self.accumulator.reset()
         self.statements = 0
-        self.triples = []
-    #
-    # # -------------------------------------------------------------------------
-    # # set_length
-    # #
-    # # -------------------------------------------------------------------------
-    # def set_length(self, Ls=None):
-    #     if not Ls: Ls = self.L
-    #     if self.debug: print("#setLs(%d)") % Ls
-    #     assert isinstance(Ls, int) and Ls > 1, "Wrong fingerprint length"
+        # the triples of a document reach the sink before the next one starts
+        if self.triple_sink is not None:
+            self.triple_sink.flush()
+
+    # -------------------------------------------------------------------------
+    # fp
+    # the fingerprint, with any triples still buffered in the accumulator
+    # reduced into it first
+    # -------------------------------------------------------------------------
+    @property
+    def fp(self):
+        return self.accumulator.flush()
+
+    @fp.setter
+    def fp(self, value):
+        self.accumulator.pending = []
+        self.accumulator.fp = np.asarray(value, dtype=float)
+
+    # -------------------------------------------------------------------------
+    # L
+    # the length of the fingerprint when only one is computed; with several
+    # lengths or encodings, fp holds width values (see lengths and configs)
+    # -------------------------------------------------------------------------
+    @property
+    def L(self):
+        if len(self.configs) > 1:
+            raise ValueError("L is ambiguous with %d fingerprint configs, use lengths, configs or width"
+                             % len(self.configs))
+        return self.lengths[0]
+
+    # -------------------------------------------------------------------------
+    # parse_lengths
+    # sorted, unique fingerprint lengths from an int, a list of ints or a
+    # string like "11,13" (as LIBLPH::setLs)
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def parse_lengths(Ls):
+        if isinstance(Ls, str):
+            Ls = [L for L in re.split(r'[,\s]+', Ls) if L]
+        elif isinstance(Ls, int):
+            Ls = [Ls]
+        try:
+            lengths = sorted(set(int(L) for L in Ls))
+        except ValueError:
+            lengths = []
+        if not lengths or lengths[0] < 2:
+            raise ValueError('Cannot interpret fingerprint lengths in "%s"' % str(Ls))
+        return lengths
+
+    # -------------------------------------------------------------------------
+    # config_parameters
+    # the length and encoding of every fingerprint computed, with anything a
+    # config does not override taken from the instance
+    # -------------------------------------------------------------------------
+    def config_parameters(self):
+        params = []
+        for c in self.configs:
+            params.append({
+                'L': c['L'],
+                'numeric_encoding': c.get('numeric_encoding', self.numeric_encoding),
+                'string_encoding': c.get('string_encoding', self.string_encoding),
+                'string_encoding_decay': c.get('string_encoding_decay', self.string_encoding_decay),
+            })
+        return params
+
+    # -------------------------------------------------------------------------
+    # config_label
+    # a short name for each config, used to name per-config output files
+    # -------------------------------------------------------------------------
+    def config_labels(self):
+        labels = []
+        for c in self.configs:
+            parts = ['L%d' % c['L']]
+            for name in ('numeric_encoding', 'string_encoding', 'string_encoding_decay'):
+                if name in c:
+                    parts.append(str(c[name]))
+            labels.append('.'.join(parts))
+        return labels
+
+    # -------------------------------------------------------------------------
+    # split
+    # the per-config fingerprints held in one concatenated vector
+    # -------------------------------------------------------------------------
+    def split(self, fp):
+        return [fp[seg] for seg in self.accumulator.segments]
 
     # -------------------------------------------------------------------------
     # isnumeric
@@ -95,13 +250,101 @@ class DataFingerprint(object):
 
     # -------------------------------------------------------------------------
     # vector_value
-    # compute the value of the first argument in vector form
+    # the value of the first argument in vector form, served from the cache
+    # or the vector store when possible
     # -------------------------------------------------------------------------
-    @lru_cache(maxsize=None)
     def vector_value(self, o):
-        length = self.L
+        new = self.cache.get(o)
+        if new is None:
+            if self.vector_store is not None:
+                new = self.stored_vector(o)
+            if new is None:
+                new = self.compute_vector_value(o)
+            self.cache.put(o, new)
+        return new
+
+    # -------------------------------------------------------------------------
+    # vector_values
+    # the vectors of many values at once as an (N x L) matrix; strings missing
+    # from the cache and the vector store are encoded together in one batch;
+    # every value is one cache lookup (hit or miss), as with vector_value
+    # -------------------------------------------------------------------------
+    def vector_values(self, values):
+        configs = self.config_parameters()
+        batchable = all(c['string_encoding'] in STRING_ENCODINGS for c in configs)
+        result = np.zeros((len(values), self.width))
+        batch = {}
+        for n, o in enumerate(values):
+            new = self.cache.get(o)
+            if new is None and self.vector_store is not None:
+                new = self.stored_vector(o)
+                if new is not None:
+                    self.cache.put(o, new)
+            if new is not None:
+                result[n] = new
+            elif isinstance(o, str) and o and batchable and not self.isnumeric(o):
+                batch.setdefault(o, []).append(n)
+            else:
+                # already missed in the cache and the store, so not through vector_value
+                new = self.compute_vector_value(o)
+                self.cache.put(o, new)
+                result[n] = new
+        if batch:
+            strings = list(batch)
+            matrix = np.hstack([encode_strings(strings, c['L'], c['string_encoding'], c['string_encoding_decay'])
+                                for c in configs])
+            for o, new in zip(strings, matrix):
+                result[batch[o]] = new
+                self.cache.put(o, new.copy())
+        return result
+
+    # -------------------------------------------------------------------------
+    # stored_vector
+    # the vector of a value from the vector store, or None
+    # -------------------------------------------------------------------------
+    def stored_vector(self, o):
+        if not self.vector_store_checked:
+            self.check_vector_store()
+        return self.vector_store.get(o)
+
+    # -------------------------------------------------------------------------
+    # check_vector_store
+    # raise ValueError unless the vector store was built for the lengths and
+    # encodings of this instance as they are now
+    # -------------------------------------------------------------------------
+    def check_vector_store(self):
+        if self.vector_store is not None:
+            self.vector_store.check(self)
+            self.vector_store_checked = True
+
+    # -------------------------------------------------------------------------
+    # clear_cache
+    #
+    # -------------------------------------------------------------------------
+    def clear_cache(self):
+        if self.debug > 1:
+            print("#clear_cache()\n")
+        self.cache.clear()
+
+    # -------------------------------------------------------------------------
+    # compute_vector_value
+    # compute the value of the first argument in vector form, concatenated
+    # over all configs
+    # -------------------------------------------------------------------------
+    def compute_vector_value(self, o):
         if self.debug > 2:
             print("\n#computing vector_value:\t%s" % str(o))
+        configs = self.config_parameters()
+        if len(configs) == 1:
+            return self.encode_value(o, **configs[0])
+        return np.concatenate([self.encode_value(o, **c) for c in configs])
+
+    # -------------------------------------------------------------------------
+    # encode_value
+    # the vector of one value for one length and encoding
+    # -------------------------------------------------------------------------
+    def encode_value(self, o, L, numeric_encoding, string_encoding, string_encoding_decay):
+        length = L
         new = np.zeros(length)
         if not o:
             return new
@@ -115,7 +358,7 @@ class DataFingerprint(object):
                 return new
             # -----------------------------------------------------------------
             # number method #1: ME (Mantissa/Exponent)
-            elif self.numeric_encoding == "ME":
+            elif numeric_encoding == "ME":
                 mantissa, exponent = self.frexp10(o)
                 # encode mantissa - a fraction in range (-1~1)
                 mantissa *= (length / 10.0)  # make mantissa in the range of -L to L
@@ -130,7 +373,7 @@ class DataFingerprint(object):
                 new[int(exponent % length)] += 1
             # -----------------------------------------------------------------
             # number method #2: ML (Mantissa/Log value)
-            elif self.numeric_encoding == "ML":
+            elif numeric_encoding == "ML":
                 mantissa, exponent = self.frexp10(o)
                 # encode mantissa - a fraction in range (-1~1)
                 mantissa *= (length / 10.0)
@@ -154,7 +397,7 @@ class DataFingerprint(object):
                         new[int(logvalue % length)] += 1
             # -----------------------------------------------------------------
             # number method #3: Smooth
-            elif self.numeric_encoding == "smooth":
+            elif numeric_encoding == "smooth":
                 over = o - int(o)
                 new[int(o % length)] += (1 - over)
                 new[int((o+1) % length)] += over
@@ -163,8 +406,8 @@ class DataFingerprint(object):
         else:
             # -----------------------------------------------------------------
             # string method #1: DECAY
-            if self.string_encoding == "decay":
-                decay = self.string_encoding_decay if self.string_encoding_decay else 0.1
+            if string_encoding == "decay":
+                decay = string_encoding_decay if string_encoding_decay else 0.1
                 remain = (1 - decay)
                 v = ord(o[0])
                 new[int(v % length)] += 1
@@ -178,7 +421,7 @@ class DataFingerprint(object):
                     new[int((sv+1) % length)] += over
             # -----------------------------------------------------------------
             # string method #2: PAIR SUM
-            elif self.string_encoding == "pair_sum":
+            elif string_encoding == "pair_sum":
                 new[int(ord(o[0]) % length)] += 1
                 for i in range(1, len(o)):
                     v = ord(o[i]) + ord(o[i-1])
@@ -200,20 +443,71 @@ class DataFingerprint(object):
 
     # -------------------------------------------------------------------------
     # add_vector_value
-    #
+    # add (v1[i] + v2[i+1] + v3[i+2])/3 to fp[i], indices wrapping around L;
+    # triples are buffered and reduced in blocks by the accumulator
     # -------------------------------------------------------------------------
     def add_vector_value(self, v1, v2, v3, stuff=None):
-        length = self.L
-        fp = self.fp
         if self.debug > 2:
             print("\n#adding vector values:\t%s" % str(stuff))
-        for i in range(length):
-            v = (v1[i] + v2[int((i+1) % length)] + v3[int((i+2) % length)])/3
-            fp[i] += v
+        self.accumulator.add(v1, v2, v3)
         if self.debug > 2:
-            fp_string = '\t'.join(str(round(i, self.decimal)) for i in fp)
+            fp_string = '\t'.join(str(round(i, self.decimal)) for i in self.fp)
             print("#result:\t" + fp_string)
 
+    # -------------------------------------------------------------------------
+    # hash_entry
+    # add the statement for one key/cargo pair of a dict (or, with
+    # arrays_are_sets, one position of an array); returns 1 if it was used
+    # -------------------------------------------------------------------------
+    def hash_entry(self, name, base, key, cargo, vkey=None, label="#hash_entry"):
+        # skip empty strings, null value, careful about integer "0"
+        if cargo or isinstance(cargo, int):
+            if vkey is None and self.encode:
+                vkey = self.vector_value(key)
+            if isinstance(cargo, (list, dict)):
+                # if it's another list or dict, cargo is the keys_used (length)
+                cargo = self.recurse_structure(cargo, key, vkey)
+            if self.encode:
+                self.add_vector_value(base, vkey, self.vector_value(cargo),
+                                        (label, name, key, cargo))
+            if self.triple_sink is not None:
+                self.triple_sink.add(name, key, cargo)
+            return 1
+        return 0
+
+    # -------------------------------------------------------------------------
+    # array_links
+    # add the statements linking the (already recursed) elements of an array:
+    # start -> first element, each element -> the next, last element -> length
+    # -------------------------------------------------------------------------
+    def array_links(self, name, base, values):
+        if self.encode:
+            # add link to first element in array
+            self.add_vector_value(base, self.vector_value(0), self.vector_value(values[0]),
+                                    ("#array_start", name, 0, values[0]))
+            # add links between subsequent pairs of elements in array
+            for j in range(1, len(values)):
+                self.add_vector_value(base, self.vector_value(values[j-1]), self.vector_value(values[j]),
+                                        ("#array_pair", name, values[j-1], values[j]))
+            # add link from last element in array
+            self.add_vector_value(base, self.vector_value(values[len(values)-1]), self.vector_value(len(values)),
+                                    ("#array_end", name, values[len(values)-1], len(values)))
+        if self.triple_sink is not None:
+            self.triple_sink.add(name, 0, values[0])
+            for j in range(1, len(values)):
+                self.triple_sink.add(name, values[j-1], values[j])
+            self.triple_sink.add(name, values[len(values)-1], len(values))
+        self.statements += (len(values)+1)
+        return len(values)
+
+    # -------------------------------------------------------------------------
+    # position_vector
+    # the vector of an array position (or 0 for the root), None when only
+    # the traversal is run
+    # -------------------------------------------------------------------------
+    def position_vector(self, i):
+        return self.vector_value(i) if self.encode else None
+
     # -------------------------------------------------------------------------
     # recurseStructure
     #
@@ -221,24 +515,14 @@ class DataFingerprint(object):
     def recurse_structure(self, obj, name=None, base=None):
         if self.debug > 1:
             print("\n#recursing:\t%s" % str(type(obj)))
-        length = self.L
         if name is None: name = 'root'
-        if base is None: base = self.vector_value(0)
+        if base is None and self.encode: base = self.vector_value(0)
         # -------------------------------------------------------------------------
         # TYPE 1 data: python dictionary, perl hashes
         if isinstance(obj, dict):
             keys_used = 0
             for key, cargo in obj.items():
-                # skip empty strings, null value, careful about integer "0"
-                if cargo or isinstance(cargo, int):
-                    vkey = self.vector_value(key)
-                    if isinstance(cargo, (list, dict)):
-                        # if it's another list or dict, cargo is the keys_used (length)
-                        cargo = self.recurse_structure(cargo, key, vkey)
-                    self.add_vector_value(base, vkey, self.vector_value(cargo),
-                                            ("#hash_entry", name, key, cargo))
-                    self.triples.append(list([name, key, cargo]))
-                    keys_used += 1   # number of statements used in generating this vector
+                keys_used += self.hash_entry(name, base, key, cargo)   # number of statements used
             self.statements += keys_used
             return keys_used
         # -------------------------------------------------------------------------
@@ -254,50 +538,67 @@ class DataFingerprint(object):
             if self.array_are_sets:
                 keys_used = 0
                 for key in range(len(obj)):
-                    cargo = obj[key]
-                    vkey = self.vector_value(0)     # all positions in array get the same key
-                    if cargo or isinstance(cargo, int):
-                        if isinstance(cargo, (list, dict)):
-                            cargo = self.recurse_structure(cargo, key, vkey)
-                        self.add_vector_value(base, vkey, self.vector_value(cargo),
-                                          ("set_entry", name, key, cargo))
-                        self.triples.append(list([name, key, cargo]))
-                        keys_used += 1
+                    # all positions in array get the same key
+                    keys_used += self.hash_entry(name, base, key, obj[key], self.position_vector(0), "set_entry")
                 self.statements += keys_used
                 # return self.vector_value(keys_used) # verion 180913
                 return keys_used # in newer version 181214
             else:
-                for i in range(len(obj)):
-                    obj[i] = self.recurse_structure(obj[i], i, self.vector_value(i))
-                # add link to first element in array
-                self.add_vector_value(base, self.vector_value(0), self.vector_value(obj[0]),
-                                            ("#array_start", name, 0, obj[0]))
-                self.triples.append(list([name, 0, obj[0]]))
-                # add links between subsequent pairs of elements in array
-                for j in range(1, len(obj)):
-                    self.add_vector_value(base, self.vector_value(obj[j-1]), self.vector_value(obj[j]),
-                                            ("#array_pair", name, obj[j-1], obj[j]))
-                    self.triples.append(list([name, obj[j-1], obj[j]]))
-                # add link from last element in array
-                self.add_vector_value(base, self.vector_value(obj[len(obj)-1]), self.vector_value(len(obj)),
-                                            ("#array_end", name, obj[len(obj)-1], len(obj)))
-                self.triples.append(list([name, obj[len(obj)-1], len(obj)]))
-                self.statements += (len(obj)+1)
-                return len(obj)
+                # the input is left untouched, nested structures are replaced by their sizes
+                values = [self.recurse_structure(obj[i], i, self.position_vector(i)) for i in range(len(obj))]
+                return self.array_links(name, base, values)
         else:
             return obj
 
+    # -------------------------------------------------------------------------
+    # recurse_items
+    # recurse_structure for a document given as a stream of top-level items
+    # (see readers.iter_top_level), so that only one item at a time is held
+    # in memory; gives the same fingerprint as recursing the whole document
+    # -------------------------------------------------------------------------
+    def recurse_items(self, items):
+        name = 'root'
+        base = self.position_vector(0)
+        first = next(items, None)
+        if first is None:
+            return 0
+        kind = first[0]
+        if kind == 'scalar':
+            return first[2]
+        if kind == 'dict':
+            keys_used = 0
+            for kind, key, cargo in itertools.chain([first], items):
+                keys_used += self.hash_entry(name, base, key, cargo)
+            self.statements += keys_used
+            return keys_used
+        # arrays of one element are flattened, so hold the first until the second shows up
+        second = next(items, None)
+        if second is None:
+            return self.recurse_structure([first[2]])
+        if self.array_are_sets:
+            keys_used = 0
+            for kind, key, cargo in itertools.chain([first, second], items):
+                keys_used += self.hash_entry(name, base, key, cargo, self.position_vector(0), "set_entry")
+            self.statements += keys_used
+            return keys_used
+        values = []
+        for kind, i, cargo in itertools.chain([first, second], items):
+            values.append(self.recurse_structure(cargo, i, self.position_vector(i)))
+        return self.array_links(name, base, values)
+
     # -----------------------------------------------------------------------------
     # normalize
     #
-    # Normalize the fingerprint by subtracting the mean and dividing by the
-    # standard deviation
+    # Normalize the fingerprint (or the given one) by subtracting the mean and
+    # dividing by the standard deviation, separately for each config
     # -----------------------------------------------------------------------------
-    def normalize(self):
+    def normalize(self, fp=None):
         if self.debug > 0:
             print("\n#normalize():" )
-        fp = self.fp
-        return (np.array(fp)-np.mean(fp)) / np.std(fp)
+        fp = np.array(self.fp if fp is None else fp)
+        if len(self.configs) == 1:
+            return (fp-np.mean(fp)) / np.std(fp)
+        return np.concatenate([(f-np.mean(f)) / np.std(f) for f in self.split(fp)])
 
     # -----------------------------------------------------------------------------
     # reformat
@@ -305,14 +606,12 @@ class DataFingerprint(object):
     # -----------------------------------------------------------------------------
     @staticmethod
     def reformat(value):
-        if isinstance(value, int):
-            value = str(value)
-        else:
-            value = '"{}"'.format(value)
-        return value
+        return reformat(value)
 
     # -----------------------------------------------------------------------------
-    # write_triple
+    # output_triples
+    # write the triples of obj to outfile, as the tripler does, without
+    # encoding it or touching the current fingerprint
     # A triple is name, key, cargo
     # Ex:
     # JSON input is:
@@ -342,24 +641,22 @@ class DataFingerprint(object):
     # each "list" has a 0 -> entry 1 -> entry2 -> end index structure
     #
     # -----------------------------------------------------------------------------
-    def output_triples(self, outfile):
-        with open(outfile, "w") as f:
-            for t in self.triples:
-                counter = 0
-                for item in t:
-                    counter += 1
-                    f.write(self.reformat(item))
-                    if counter < 3:
-                        f.write('\t')
-                f.write('\n')
+    def output_triples(self, outfile, obj):
+        previous = self.triple_sink, self.encode, self.statements
+        self.triple_sink, self.encode = TextTripleSink(outfile), False
+        try:
+            self.recurse_structure(obj)
+        finally:
+            self.triple_sink.close()
+            self.triple_sink, self.encode, self.statements = previous
 
     # -------------------------------------------------------------------------
     # read_json
-    #
+    # the data of a (possibly compressed) json file
     # -------------------------------------------------------------------------
     def read_json(self, file):
         data = None
-        with open(file) as f:
+        with open_text(file) as f:
             try:
                 data = json.load(f)
                 if not data:
@@ -369,6 +666,275 @@ class DataFingerprint(object):
                 sys.stderr.write("Invalid json file skipped: " + str(file))
         return data
 
+    # -------------------------------------------------------------------------
+    # normalize_rows
+    # normalize() for every row of a matrix of fingerprints at once
+    # -------------------------------------------------------------------------
+    def normalize_rows(self, fps):
+        fps = np.array(fps, dtype=float)
+        for seg in self.accumulator.segments:
+            block = fps[:, seg]
+            fps[:, seg] = (block - block.mean(axis=1, keepdims=True)) / block.std(axis=1, keepdims=True)
+        return fps
+
+    # -------------------------------------------------------------------------
+    # fingerprint_many
+    # fingerprint json objects (dicts or lists) and/or json files (paths),
+    # returning ids, statement counts and an (N x width) matrix, without
+    # printing; objects are identified by ids if given, else by their
+    # position, files by their name; empty or invalid files are left out
+    # -------------------------------------------------------------------------
+    def fingerprint_many(self, items, ids=None, normalize=None):
+        normalize = self.norm if normalize is None else normalize
+        if ids is not None and hasattr(items, '__len__') and len(ids) != len(items):
+            raise ValueError("Got %d ids for %d items" % (len(ids), len(items)))
+        if self.workers > 1:
+            items = list(items)
+        if self.workers > 1 and items and all(isinstance(o, (str, os.PathLike)) for o in items):
+            from datafingerprint.parallel import fingerprint_files
+            records = fingerprint_files([str(o) for o in items], self, self.workers, ids=ids)
+        elif self.columnar and self.encode and self.triple_sink is None and isinstance(items, list) and shared_keys(items):
+            statements, fps = fingerprint_records(self, items)
+            for count in statements if self.stats.enabled else []:
+                self.stats.document(count)
+            records = zip([str(n) for n in range(len(items))] if ids is None else ids, statements, fps)
+        else:
+            records = self.fingerprint_items(items, ids)
+        # sized up front when the number of items is known, else doubled as needed
+        fps = np.zeros((max(len(items) if hasattr(items, '__len__') else 1024, 1), self.width))
+        statements = np.zeros(len(fps), dtype=np.int64)
+        found = []
+        for patient_id, count, fp in records:
+            n = len(found)
+            if n == len(fps):
+                fps = np.concatenate([fps, np.zeros_like(fps)])
+                statements = np.concatenate([statements, np.zeros_like(statements)])
+            found.append(patient_id)
+            statements[n] = count
+            fps[n] = fp
+        fps = fps[:len(found)]
+        return found, statements[:len(found)], self.normalize_rows(fps) if normalize else fps
+
+    # -------------------------------------------------------------------------
+    # fingerprint_items
+    # yield (id, statements, fp) for json objects and json files
+    # -------------------------------------------------------------------------
+    def fingerprint_items(self, items, ids=None):
+        for n, o in enumerate(items):
+            if isinstance(o, (str, os.PathLike)):
+                record = self.fingerprint_file(str(o))
+                if record is None:
+                    continue
+                patient_id = record[0] if ids is None else ids[n]
+                yield patient_id, record[1], record[2]
+            else:
+                self.recurse_structure(o)
+                self.stats.document(self.statements)
+                yield str(n) if ids is None else ids[n], self.statements, self.fp.copy()
+                self.reset()
+
+    # -------------------------------------------------------------------------
+    # read_xml
+    # the data of an xml file (see xml_reader.read_xml)
+    # -------------------------------------------------------------------------
+    def read_xml(self, file):
+        try:
+            data = read_xml(file)
+        except ET.ParseError:
+            sys.stderr.write("Invalid xml file skipped: " + str(file))
+            return None
+        if not data:
+            sys.stderr.write("Empty xml file skipped: " + str(file))
+            return False
+        return data
+
+    # -------------------------------------------------------------------------
+    # fingerprint_file
+    # fingerprint one json file and reset, returning (id, statements, fp) or
+    # None if the file is empty or invalid; the name of the file is the id
+    # -------------------------------------------------------------------------
+    def fingerprint_file(self, file):
+        patient_id = input_name(file)
+        with self.triple_file(os.path.join(os.path.dirname(file), patient_id + '.triple')):
+            valid = self.fingerprint_document(file)
+        if not valid:
+            return None
+        self.stats.document(self.statements)
+        record = (patient_id, self.statements, self.fp.copy())
+        self.reset()
+        return record
+
+    # -------------------------------------------------------------------------
+    # fingerprint_document
+    # recurse the structure of a json file, read whole or streamed; returns
+    # False if the file is empty or invalid
+    # -------------------------------------------------------------------------
+    def fingerprint_document(self, file):
+        xml = self.xml or is_xml(file)
+        if self.stream and not xml:
+            return self.stream_json(file)
+        data = self.read_xml(file) if xml else self.read_json(file)
+        if not data:
+            return False
+        self.recurse_structure(data)
+        return True
+
+    # -------------------------------------------------------------------------
+    # triple_file
+    # with tripler on, send the triples produced inside the block to a
+    # .triple file as they are produced; no file is left if there were none
+    # -------------------------------------------------------------------------
+    @contextlib.contextmanager
+    def triple_file(self, path):
+        if not self.tripler:
+            yield
+            return
+        previous = self.triple_sink
+        self.triple_sink = TextTripleSink(path)
+        try:
+            yield
+        finally:
+            self.triple_sink.close()
+            if not self.triple_sink.count:
+                os.remove(path)
+            self.triple_sink = previous
+
+    # -------------------------------------------------------------------------
+    # stream_json
+    # fingerprint a json file parsed incrementally, one top-level entry at a
+    # time; returns False (after reporting it) for empty or invalid files
+    # -------------------------------------------------------------------------
+    def stream_json(self, file):
+        try:
+            with open_text(file) as f:
+                self.recurse_items(self.stats.timed_iter('read', iter_top_level(f)))
+        except ValueError:
+            sys.stderr.write("Invalid json file skipped: " + str(file))
+            self.reset()
+            return False
+        if not self.statements:
+            sys.stderr.write("Empty json file skipped: " + str(file))
+            self.reset()
+            return False
+        return True
+
+    # -------------------------------------------------------------------------
+    # fingerprint_rows
+    # yield (id, statements, fp) for each record of a json or xml file (see
+    # json_rows and xml_reader.iter_xml_records) as soon as it has been read;
+    # records are fingerprinted in batches, column by column when they share
+    # keys, and with several workers by the process pool, in order
+    # -------------------------------------------------------------------------
+    def fingerprint_rows(self, file):
+        if self.xml or is_xml(file):
+            rows = iter_xml_records(file, self.record_tag, self.id_field)
+        else:
+            rows = self.json_rows(file)
+        rows = self.stats.timed_iter('read', rows)
+        if self.workers > 1:
+            from datafingerprint.parallel import fingerprint_rows
+            return fingerprint_rows(rows, self, self.workers)
+        return (record for batch in chunked(rows, BATCH_SIZE) for record in self.fingerprint_batch(batch))
+
+    # -------------------------------------------------------------------------
+    # json_rows
+    # (id, row) for each entry of the top-level object of a json file (the key
+    # is the id), or for each element of a top-level array (id taken from
+    # id_field, else the index), read incrementally
+    # -------------------------------------------------------------------------
+    def json_rows(self, file):
+        with open_text(file) as f:
+            for kind, key, row in iter_top_level(f):
+                if kind == 'list' and isinstance(row, dict) and row.get(self.id_field) is not None:
+                    key = row.pop(self.id_field)
+                yield clean_id(key), row
+
+    # -------------------------------------------------------------------------
+    # fingerprint_batch
+    # yield (id, statements, fp) for (id, row) pairs with any statements
+    # -------------------------------------------------------------------------
+    def fingerprint_batch(self, batch):
+        rows = [row for patient_id, row in batch]
+        keys = shared_keys(rows) if self.columnar and self.encode and self.triple_sink is None else None
+        if keys is not None:
+            statements, fps = fingerprint_records(self, rows, keys)
+            for (patient_id, row), count, fp in zip(batch, statements, fps):
+                if count:
+                    self.stats.document(count)
+                    yield patient_id, int(count), fp
+            return
+        for patient_id, row in batch:
+            self.recurse_structure(row)
+            if self.statements:
+                self.stats.document(self.statements)
+                yield patient_id, self.statements, self.fp.copy()
+            self.reset()
+
+    # -------------------------------------------------------------------------
+    # fingerprint_jsonl
+    # yield (id, statements, fp) for each object of a line-delimited json
+    # file, stdin ('-') or compressed stream, one line in memory at a time
+    # -------------------------------------------------------------------------
+    def fingerprint_jsonl(self, file):
+        with open_input(file) as stream:
+            for patient_id, data in self.stats.timed_iter('read', iter_jsonl(stream, self.id_field)):
+                self.recurse_structure(data)
+                if self.statements:
+                    self.stats.document(self.statements)
+                    yield patient_id, self.statements, self.fp.copy()
+                self.reset()
+
+    # -------------------------------------------------------------------------
+    # worker_parameters
+    # everything a worker process needs to build an equivalent DataFingerprint
+    # -------------------------------------------------------------------------
+    def worker_parameters(self):
+        # a shared triple sink cannot be written from several processes
+        kwargs = dict(self.kwargs, file_paths=None, workers=1, triple_sink=None)
+        if self.vector_store is not None:
+            # fail here rather than in every worker
+            self.check_vector_store()
+            kwargs['vector_store'] = self.vector_store.path
+        attributes = {name: getattr(self, name) for name in
+                      ('numeric_encoding', 'string_encoding', 'string_encoding_decay', 'decimal', 'array_are_sets')}
+        return {'cls': type(self), 'kwargs': kwargs, 'attributes': attributes}
+
+    # -------------------------------------------------------------------------
+    # fingerprint_writer
+    # a writer of fingerprints to <directory>/<name>.*, one output per config
+    # (<name>.<config label>.* with several configs)
+    # -------------------------------------------------------------------------
+    def fingerprint_writer(self, directory, buffer_size=BUFFER_SIZE, name='out'):
+        writers = []
+        for label, c in zip(self.config_labels(), self.configs):
+            outname = name if len(self.configs) == 1 else name + '.' + label
+            writers.append(open_writer(os.path.join(directory, outname), c['L'], self.output_format,
+                                       self.decimal, buffer_size))
+            if self.stats.enabled:
+                writers[-1].write = self.stats.timed('write', writers[-1].write)
+        return SplitWriter(writers, self.accumulator.segments)
+
+    # -------------------------------------------------------------------------
+    # config_writer
+    # with several configs, a writer of the fingerprints of file_path to one
+    # <name>.<config label>.* output per config next to it (stdin.* in the
+    # working directory for stdin); None with one config
+    # -------------------------------------------------------------------------
+    def config_writer(self, file_path):
+        if len(self.configs) == 1:
+            return None
+        if file_path == '-':
+            return self.fingerprint_writer('.', name='stdin')
+        return self.fingerprint_writer(os.path.dirname(file_path) or '.', name=input_name(file_path))
+
+    # -------------------------------------------------------------------------
+    # write_fingerprints
+    # write fingerprints to <directory>/out.fp, one file per config
+    # -------------------------------------------------------------------------
+    def write_fingerprints(self, directory, id_list, statement_list, fp_list):
+        with self.fingerprint_writer(directory) as writer:
+            writer.add_block(id_list, statement_list, np.reshape(fp_list, (-1, self.width)))
+
     # -------------------------------------------------------------------------
     # process
     # TODO: Update to contain the steps from the main below that process
@@ -381,61 +947,74 @@ class DataFingerprint(object):
             raise ValueError("DataFingerprint requires a list of one or more 'file_path'")
 
         for file_path in file_paths:
+            # For line-delimited json or rows of one big json, output each
+            # fingerprint as it is computed, to stdout or with several
+            # configs to one output per config
+            if self.linewise or self.rows:
+                records = self.fingerprint_jsonl(file_path) if self.linewise else self.fingerprint_rows(file_path)
+                writer = self.config_writer(file_path)
+                for patient_id, statements, fp in records:
+                    if writer is not None:
+                        writer.add(patient_id, statements, self.normalize(fp) if self.norm else fp)
+                        continue
+                    with self.stats.timer('format'):
+                        if self.norm:
+                            fp = self.normalize(fp)
+                        fp_string = '\t'.join(str(round(i, self.decimal)) for i in fp)
+                    with self.stats.timer('write'):
+                        sys.stdout.write(patient_id + '\t' + str(statements) + '\t' + fp_string + '\n')
+                if writer is not None:
+                    writer.close()
+                continue
             print(file_path)
             # For multiple json files in a directory
             if os.path.isdir(file_path):
-                file_list = glob.glob(os.path.join(file_path, '*.json'))
-                id_list = []
-                fp_list = []
-                statement_list = []
-                n = 0
-                for file in file_list:
-                    patient_file = os.path.basename(file)           # file name without path
-                    patient_id = os.path.splitext(patient_file)[0]  # name of file is patient ID
-                    data = self.read_json(file)
-                    if data:
-                        self.recurse_structure(data)                        # compute data fingerprint
-                        id_list.append(patient_id)                              # record patient ID
-                        if self.norm:                                                # record normalized data fingerprint
-                            fp_list.append(np.round(self.normalize(), self.decimal))
-                        else:                                                   # record original data fingerprint
-                            fp_list.append(np.round(self.fp, self.decimal))
-                        statement_list.append(self.statements)              # record # of statements used
-                        # output triple statements
-                        if self.tripler:
-                            self.output_triples(os.path.join(file_path, "") + patient_id + '.triple')
-                        # output fingerprint to screen
-                        fp_string = '\t'.join(str(round(i, self.decimal)) for i in self.fp)
-                        print(patient_id + '\t' + str(self.statements) + '\t' + fp_string)
-                        self.reset()                                        # reset for next patient
-                        n += 1                                                  # keep track of valid patients
-                    # output all fingerprints to a file
-                    outfile = os.path.join(file_path, "") + 'out.fp'
-                    with open(outfile, "w") as f:
-                            for i in range(n):
-                                f.write(id_list[i] + '\t')
-                                f.write(str(statement_list[i]) + '\t')
-                                for j in fp_list[i]:
-                                    f.write(str(j))
-                                    f.write('\t')
-                                f.write('\n')
+                file_list = list_inputs(file_path, 'xml' if self.xml else 'json')
+                if self.workers > 1:
+                    # fingerprints come back from the pool in input order
+                    from datafingerprint.parallel import fingerprint_files
+                    records = fingerprint_files(file_list, self, self.workers)
+                else:
+                    records = (self.fingerprint_file(file) for file in file_list)
+                # all fingerprints go to one output, written in blocks
+                with self.fingerprint_writer(file_path) as writer:
+                    for record in records:
+                        if record:
+                            patient_id, statements, fp = record
+                            writer.add(patient_id, statements, self.normalize(fp) if self.norm else fp)
+                            # output fingerprint to screen
+                            with self.stats.timer('format'):
+                                fp_string = '\t'.join(str(round(i, self.decimal)) for i in fp)
+                            with self.stats.timer('write'):
+                                print(patient_id + '\t' + str(statements) + '\t' + fp_string)
             # For single json file
             else:
-                patient_id = os.path.splitext(os.path.basename(file_path))[0]
-                data = self.read_json(file_path)
-                if data:
-                    self.recurse_structure(data)
-                    if self.tripler:
-                        self.output_triples(patient_id + '.triple')
-                    # output fingerprint to screen
-                    if self.norm:  # record normalized data fingerprint
-                        fp_string = '\t'.join(str(round(i, self.decimal)) for i in self.normalize())
-                        print(patient_id + '\t' + str(self.statements) + '\t' + fp_string)
-                        return fp_string
-                    else:  # record original data fingerprint
-                        fp_string = '\t'.join(str(round(i, self.decimal)) for i in self.fp)
+                patient_id = input_name(file_path)
+                with self.triple_file(patient_id + '.triple'):
+                    valid = self.fingerprint_document(file_path)
+                if valid:
+                    self.stats.document(self.statements)
+                    writer = self.config_writer(file_path)
+                    if writer is not None:
+                        with writer:
+                            writer.add(patient_id, self.statements, self.normalize() if self.norm else self.fp)
+                    # output fingerprint to screen, normalized or original
+                    with self.stats.timer('format'):
+                        fp = self.normalize() if self.norm else self.fp
+                        fp_string = '\t'.join(str(round(i, self.decimal)) for i in fp)
+                    with self.stats.timer('write'):
                         print(patient_id + '\t' + str(self.statements) + '\t' + fp_string)
-                        return fp_string
+                    return fp_string
+
+# -------------------------------------------------------------------------
+# fingerprint_many
+# ids, statement counts and the (N x L) fingerprints of json objects and/or
+# files, computed by a DataFingerprint built from kwargs (see
+# DataFingerprint.fingerprint_many)
+# -------------------------------------------------------------------------
+def fingerprint_many(items, ids=None, normalize=False, **kwargs):
+    kwargs.setdefault('debug', 0)
+    return DataFingerprint(**kwargs).fingerprint_many(items, ids, normalize)
 
 # -------------------------------------------------------------------------
 # main
@@ -449,19 +1028,71 @@ class DataFingerprint(object):
 @click.option('--tripler/--no-tripler', default=False,
     help="Output a name/key/cargo tab delimited list of entries in json file(s)")
 @click.option('--normalize/-no-normalize', default=False, help="Normalize fingerprint")
-@click.option('--fp-length', default=13,
-    help="The length of the fingerprint to generate.")
-def main(file_path, debug, tripler, normalize, fp_length):
+@click.option('--fp-length', default='13',
+    help="The length of the fingerprint to generate, or several lengths separated by commas (e.g. 11,13), each written to <input>.L<length>.fp (out.L<length>.fp for a directory).")
+@click.option('--numeric-encoding', default=None,
+    help="Numeric encoding(s) to use, separated by commas (ME, ML, smooth, simple).")
+@click.option('--string-encoding', default=None,
+    help="String encoding(s) to use, separated by commas (decay, pair_sum).")
+@click.option('--vector-store', default=None,
+    help="A token vector store built with datafingerprint.vector_store to read vectors from")
+@click.option('--workers', default=1, type=click.IntRange(1, None),
+    help="Number of worker processes used to fingerprint a directory of JSON files.")
+@click.option('--linewise/--no-linewise', default=False,
+    help="Read one JSON object per line (file, - for stdin, or .gz/.bz2/.xz) and fingerprint each object")
+@click.option('--id-field', default='id',
+    help="With --linewise, the field holding the identifier of each object")
+@click.option('--stream/--no-stream', default=False,
+    help="Parse JSON files incrementally so that only one top-level entry is held in memory at a time")
+@click.option('--rows/--no-rows', default=False,
+    help="Fingerprint each entry of the top-level object (or array) of a JSON file separately, streaming the file")
+@click.option('--xml/--no-xml', default=False,
+    help="Read XML instead of JSON: a directory's .xml files, or with --rows the records of one big XML file")
+@click.option('--record-tag', default=None,
+    help="With --xml --rows, the tag of the records (default: the children of the root element)")
+@click.option('--columnar/--no-columnar', default=False,
+    help="With --rows, fingerprint batches of entries that share the same keys column by column")
+@click.option('--output-format', default='tsv', type=click.Choice(FORMATS),
+    help="Format of the fingerprints of a directory: tab delimited out.fp, out.npy with out.ids, or a serialized out.db.fp/out.db.id")
+@click.option('--stats', 'stats_path', default=None,
+    help="Write a JSON report of where the run spent its time (phases, cache hit rate, statements per document, peak memory) to this file, - for stderr")
+def main(file_path, debug, tripler, normalize, fp_length, numeric_encoding, string_encoding, vector_store, workers,
+         linewise, id_field, stream, rows, xml, record_tag, columnar, output_format, stats_path):
+    # every combination of the requested encodings is computed in the same traversal
+    encodings = [{}]
+    if numeric_encoding:
+        encodings = [dict(e, numeric_encoding=n) for e in encodings for n in numeric_encoding.split(',')]
+    if string_encoding:
+        encodings = [dict(e, string_encoding=n) for e in encodings for n in string_encoding.split(',')]
     params = {
-        'L': fp_length,
+        'length': fp_length,
+        'encodings': encodings,
         'norm': normalize,
         'debug': debug,
         'tripler': tripler,
         'file_paths': file_path,  # a tuple of one or more files or directories
+        'vector_store': vector_store,
+        'workers': workers,
+        'linewise': linewise,
+        'id_field': id_field,
+        'stream': stream,
+        'rows': rows,
+        'xml': xml,
+        'record_tag': record_tag,
+        'columnar': columnar,
+        'output_format': output_format,
+        'stats': stats_path is not None,
     }
 
     FPrinter = DataFingerprint(**params)          # create DataFingerprint object
     FPrinter.process()
+    if stats_path is not None:
+        report = json.dumps(FPrinter.stats_report(), indent=2) + '\n'
+        if stats_path == '-':
+            sys.stderr.write(report)
+        else:
+            with open(stats_path, 'w') as f:
+                f.write(report)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
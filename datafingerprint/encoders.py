@@ -0,0 +1,116 @@
+# -----------------------------------------------------------------------------
+# encoders.py
+# batch versions of the string encodings of DataFingerprint.vector_value
+#
+# encode_strings turns a list of N strings into an (N x L) matrix of token
+# vectors. Strings are sorted by length and processed in chunks padded to the
+# longest string of the chunk; the decay recurrence runs over character
+# positions for all strings of a chunk at once, and the fractional scatter is
+# a single np.bincount. The arithmetic is done in the same order as the
+# scalar path, so the results are bit-for-bit identical to vector_value.
+# -----------------------------------------------------------------------------
+import numpy as np
+
+STRING_ENCODINGS = ('decay', 'pair_sum')
+
+
+# -----------------------------------------------------------------------------
+# code_points
+# all characters of strings as one int array, with per-string offsets
+# -----------------------------------------------------------------------------
+def code_points(strings):
+    lengths = np.fromiter((len(s) for s in strings), dtype=np.int64, count=len(strings))
+    offsets = np.zeros(len(strings), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    flat = np.frombuffer(''.join(strings).encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    return flat.astype(np.int64), offsets, lengths
+
+
+# -----------------------------------------------------------------------------
+# chunks
+# split an ascending order of lengths into runs of at most max_cells padded
+# characters (but at least one string each)
+# -----------------------------------------------------------------------------
+def chunks(lengths, order, max_cells):
+    start = 0
+    while start < len(order):
+        end = min(len(order), start + max(1, max_cells // max(1, lengths[order[start]])))
+        while end - start > 1 and (end - start) * lengths[order[end-1]] > max_cells:
+            end = start + (end - start) // 2
+        yield order[start:end]
+        start = end
+
+
+# -----------------------------------------------------------------------------
+# scatter_chunk
+# raw (un-normalized) vectors of one chunk of strings
+# -----------------------------------------------------------------------------
+def scatter_chunk(ords, mask, length, encoding, decay):
+    n, width = ords.shape
+    # column 0 holds the first character, then two columns per later character
+    index = np.zeros((n, 2 * width - 1), dtype=np.int64)
+    weight = np.zeros((n, 2 * width - 1))
+    valid = np.zeros((n, 2 * width - 1), dtype=bool)
+    index[:, 0] = ords[:, 0] % length
+    weight[:, 0] = 1
+    valid[:, 0] = mask[:, 0]
+    if encoding == 'decay':
+        remain = (1 - decay)
+        v = ords[:, 0].astype(float)
+        for i in range(1, width):
+            v = v*remain + ords[:, i]*decay
+            sv = v*length/10.0
+            over = sv - np.trunc(sv)
+            index[:, 2*i-1] = np.mod(sv, length).astype(np.int64)
+            weight[:, 2*i-1] = 1 - over
+            index[:, 2*i] = np.mod(sv + 1, length).astype(np.int64)
+            weight[:, 2*i] = over
+            valid[:, 2*i-1] = valid[:, 2*i] = mask[:, i]
+    elif encoding == 'pair_sum':
+        index[:, 1::2] = (ords[:, 1:] + ords[:, :-1]) % length
+        weight[:, 1::2] = 1
+        valid[:, 1::2] = mask[:, 1:]
+    else:
+        raise ValueError("Unknown string encoding: " + str(encoding))
+    # bincount adds the weights in input order, like the scalar loop does
+    rows = np.broadcast_to(np.arange(n)[:, None] * length, index.shape)
+    raw = np.bincount((rows + index)[valid], weights=weight[valid], minlength=n * length)
+    return raw.reshape(n, length)
+
+
+# -----------------------------------------------------------------------------
+# normalize_rows
+# shift each row to a minimum of 0 and scale it to a sum of 1, summing the
+# columns left to right as the builtin sum in vector_value does
+# -----------------------------------------------------------------------------
+def normalize_rows(raw):
+    raw -= raw.min(axis=1)[:, None]
+    total = raw[:, 0].copy()
+    for j in range(1, raw.shape[1]):
+        total += raw[:, j]
+    nonzero = total != 0
+    raw[nonzero] /= total[nonzero, None]
+    return raw
+
+
+# -----------------------------------------------------------------------------
+# encode_strings
+# (N x L) matrix of the vectors of N non-numeric strings; empty strings
+# give rows of zeros
+# -----------------------------------------------------------------------------
+def encode_strings(strings, length, encoding='decay', decay=0.1, max_cells=1 << 20):
+    decay = decay if decay else 0.1
+    result = np.zeros((len(strings), length))
+    if not len(strings):
+        return result
+    flat, offsets, lengths = code_points(strings)
+    order = np.argsort(lengths, kind='stable')
+    order = order[lengths[order] > 0]
+    for idx in chunks(lengths, order, max_cells):
+        width = lengths[idx[-1]]
+        pos = np.arange(width)
+        mask = pos[None, :] < lengths[idx][:, None]
+        gather = np.where(mask, offsets[idx][:, None] + pos[None, :], 0)
+        ords = np.where(mask, flat[gather], 0)
+        result[idx] = normalize_rows(scatter_chunk(ords, mask, length, encoding, decay))
+    return result
@@ -0,0 +1,492 @@
+# -----------------------------------------------------------------------------
+# fpdb.py
+# read, create and append to serialized fingerprint databases, as written by
+# bin/serializeLPH.pl and searched by bin/fpc
+#
+# A database <base> is a pair of files
+#   <base>.fp   pack('i', L) followed by one int32 rank vector of length L per
+#               fingerprint
+#   <base>.id   '#created', '#version' and '#L' header lines, then one line
+#               per fingerprint: seek position in <base>.fp, id, and the
+#               columns that were ignored when serializing
+# The rank vectors are memory-mapped as a read-only (N x L) int32 array, so
+# opening a database with millions of fingerprints costs no parsing of the
+# vectors and any number of processes share them in the page cache. The ids
+# are indexed in a <base>.idx sidecar (see idindex.py), so appending to a
+# large database does not read its .id file.
+#
+# serializeLPH.pl and append write the records one after the other, in .id
+# order. When the first and last lines of the .id file show that layout
+# (entry i at record i), the vectors are read from the memory map directly
+# and the .id file is only read when ids or ignored columns are asked for;
+# otherwise it is read on first access to map entries to records.
+#
+# USAGE: python3 -m datafingerprint.fpdb -o <base> --fp-length <L> <fingerprint files>
+# -----------------------------------------------------------------------------
+import click
+import os
+import time
+import numpy as np
+from datafingerprint.idindex import IdIndex
+from datafingerprint.readers import open_text
+
+FP_VERSION = '180110'
+HEADER_SIZE = 4
+RANK_DTYPE = np.dtype('<i4')
+
+
+# -----------------------------------------------------------------------------
+# db_paths
+# the .fp and .id file names of a database given by its base name or either file
+# -----------------------------------------------------------------------------
+def db_paths(path):
+    base = path[:-3] if path.endswith('.fp') or path.endswith('.id') else path
+    return base, base + '.fp', base + '.id'
+
+
+# -----------------------------------------------------------------------------
+# standardize
+# z-score each fingerprint (row) as serializeLPH.pl's normalize does
+# -----------------------------------------------------------------------------
+def standardize(fps):
+    fps = np.asarray(fps, dtype=np.float64)
+    avg = fps.mean(axis=1, keepdims=True)
+    std = fps.std(axis=1, ddof=1, keepdims=True) if fps.shape[1] > 1 else np.zeros_like(avg)
+    std[std == 0] = 1
+    return (fps - avg) / std
+
+
+# -----------------------------------------------------------------------------
+# ranks
+# 0-based rank of every value within its fingerprint (row); ties are ranked
+# in position order, like the stable sort of serializeLPH.pl
+# -----------------------------------------------------------------------------
+def ranks(fps):
+    fps = np.atleast_2d(fps)
+    order = np.argsort(fps, axis=1, kind='stable')
+    result = np.empty(fps.shape, dtype=RANK_DTYPE)
+    np.put_along_axis(result, order, np.arange(fps.shape[1], dtype=RANK_DTYPE)[None, :], axis=1)
+    return result
+
+
+# -----------------------------------------------------------------------------
+# pack_strings
+# a list of byte strings as one uint8 buffer plus int64 offsets
+# -----------------------------------------------------------------------------
+def pack_strings(items):
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(s) for s in items])
+    return np.frombuffer(b''.join(items), dtype=np.uint8).copy(), offsets
+
+
+# -----------------------------------------------------------------------------
+# read_id_header
+# header fields of an .id file and the offset of its first entry line
+# -----------------------------------------------------------------------------
+def read_id_header(path):
+    header = {}
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.startswith(b'#'):
+                break
+            key, _, value = line[1:].rstrip(b'\r\n').partition(b'\t')
+            header[key.decode()] = value.decode().strip()
+            offset += len(line)
+    return header, offset
+
+
+# -----------------------------------------------------------------------------
+# last_seek
+# the seek position of the last complete entry line of an .id file whose
+# entries start at data_start, or None if it has none
+# -----------------------------------------------------------------------------
+def last_seek(path, data_start, chunk_size=4096):
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        size = chunk_size
+        while True:
+            start = max(data_start, end - size)
+            f.seek(start)
+            tail = f.read(end - start)
+            # a line cut short by an interrupted append is not an entry yet
+            lines = tail[:tail.rfind(b'\n') + 1].splitlines()
+            if start > data_start:
+                lines = lines[1:]
+            lines = [line for line in lines if line.strip() and not line.startswith(b'#')]
+            if lines:
+                return int(lines[-1].split(b'\t')[0])
+            if start == data_start:
+                return None
+            size *= 2
+
+
+# -----------------------------------------------------------------------------
+# first_seek
+# the seek position of the first entry line of an .id file, or None
+# -----------------------------------------------------------------------------
+def first_seek(path, data_start):
+    with open(path, 'rb') as f:
+        f.seek(data_start)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            if line.strip() and not line.startswith(b'#'):
+                return int(line.split(b'\t')[0])
+    return None
+
+
+# -----------------------------------------------------------------------------
+# read_id_file
+# header fields, seek positions, ids and ignored columns of an .id file
+# -----------------------------------------------------------------------------
+def read_id_file(path):
+    header = {}
+    seeks = []
+    names = []
+    extras = []
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.rstrip(b'\r\n')
+            if line.startswith(b'#'):
+                key, _, value = line[1:].partition(b'\t')
+                header[key.decode()] = value.decode().strip()
+                continue
+            if not line:
+                continue
+            seek, _, rest = line.partition(b'\t')
+            name, _, extra = rest.partition(b'\t')
+            seeks.append(int(seek))
+            names.append(name)
+            extras.append(extra)
+    return header, np.array(seeks, dtype=np.int64), names, extras
+
+
+# -----------------------------------------------------------------------------
+# read_fingerprint_text
+# yield (id, ignored columns, values) from a tab-delimited fingerprint file,
+# such as out.fp or the output of bin/LPH_*.pl (optionally compressed)
+# -----------------------------------------------------------------------------
+def read_fingerprint_text(path, L, columns_to_ignore=1):
+    with open_text(path) as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            fields = line.rstrip('\r\n').split('\t')
+            values = fields[1+columns_to_ignore:1+columns_to_ignore+L]
+            if len(values) < L or '' in values:
+                raise ValueError("Not enough values for %s: %d" % (fields[0], len(values)))
+            yield fields[0], fields[1:1+columns_to_ignore], [float(v) for v in values]
+
+
+class FingerprintDB(object):
+    """A serialized fingerprint database with memory-mapped rank vectors."""
+    def __init__(self, path):
+        self.base, self.fp_path, self.id_path = db_paths(path)
+        self.header, self.data_start = read_id_header(self.id_path)
+        if 'L' not in self.header:
+            raise ValueError("No fingerprint size (#L) in " + self.id_path)
+        self.L = int(self.header['L'])
+        self.record_size = self.L * RANK_DTYPE.itemsize
+        with open(self.fp_path, 'rb') as f:
+            stored = np.frombuffer(f.read(HEADER_SIZE), dtype=np.dtype('<i4'))
+        if len(stored) != 1 or stored[0] != self.L:
+            raise ValueError("Incompatible fingerprint sizes in %s and %s" % (self.fp_path, self.id_path))
+        # the ids are read on first use; membership and appends go through the
+        # persistent id index when there is one
+        self.rows = None
+        self.lookup = None
+        self.id_index = None
+        if os.path.exists(self.base + '.idx'):
+            self.id_index = IdIndex(self.base, self.id_path)
+            if self.id_index.end > os.path.getsize(self.id_path):
+                # the .id file was rewritten since it was indexed
+                self.id_index = IdIndex.build(self.base, self.id_path, self.data_start)
+        self.map()
+        self.entries = self.sequential_entries()
+
+    def __len__(self):
+        if self.rows is None and self.entries is not None:
+            return self.entries
+        if self.rows is None and self.id_index is not None:
+            return len(self.id_index)
+        return len(self.load_ids().rows)
+
+    # -------------------------------------------------------------------------
+    # sequential_entries
+    # the number of entries if the first and last lines of the .id file show
+    # the records in order, one after the other (entry i at record i, as the
+    # writers lay them out), else None
+    # -------------------------------------------------------------------------
+    def sequential_entries(self):
+        first = first_seek(self.id_path, self.data_start)
+        if first is None:
+            return 0
+        last = last_seek(self.id_path, self.data_start)
+        if first != HEADER_SIZE or (last - HEADER_SIZE) % self.record_size:
+            return None
+        n = (last - HEADER_SIZE) // self.record_size + 1
+        if n > len(self.fps) or (self.id_index is not None and len(self.id_index) != n):
+            return None
+        return n
+
+    # -------------------------------------------------------------------------
+    # load_ids
+    # read the seek positions, ids and ignored columns of the .id file
+    # -------------------------------------------------------------------------
+    def load_ids(self):
+        if self.rows is None:
+            header, seeks, names, extras = read_id_file(self.id_path)
+            self.rows = np.zeros(0, dtype=np.int64)
+            self.names, self.name_offsets = pack_strings([])
+            self.extras, self.extra_offsets = pack_strings([])
+            self.add_entries(seeks, names, extras)
+            self.map()
+        return self
+
+    # -------------------------------------------------------------------------
+    # __getitem__
+    # the rank vector(s) of entry number(s) i, in .id file order
+    # -------------------------------------------------------------------------
+    def __getitem__(self, i):
+        if self.rows is None and self.entries is not None:
+            return self.fps[:self.entries][i]
+        return self.fps[self.load_ids().rows[i]]
+
+    # -------------------------------------------------------------------------
+    # vectors
+    # the rank vectors of all entries in .id file order; the memory map itself
+    # unless the .id file lists records out of order
+    # -------------------------------------------------------------------------
+    def vectors(self):
+        if self.rows is None and self.entries is not None:
+            return self.fps[:self.entries]
+        self.load_ids()
+        if np.array_equal(self.rows, np.arange(len(self.rows))):
+            return self.fps[:len(self.rows)]
+        return self.fps[self.rows]
+
+    def __contains__(self, name):
+        return self.index(name) is not None
+
+    # -------------------------------------------------------------------------
+    # map
+    # memory-map the complete records of the .fp file as an (N x L) array
+    # -------------------------------------------------------------------------
+    def map(self):
+        n = (os.path.getsize(self.fp_path) - HEADER_SIZE) // self.record_size
+        if n > 0:
+            self.fps = np.memmap(self.fp_path, dtype=RANK_DTYPE, mode='r', offset=HEADER_SIZE, shape=(n, self.L))
+        else:
+            self.fps = np.zeros((0, self.L), dtype=RANK_DTYPE)
+        if self.rows is not None and len(self.rows) and self.rows.max() >= n:
+            raise ValueError("%s refers to records beyond the end of %s" % (self.id_path, self.fp_path))
+
+    # -------------------------------------------------------------------------
+    # add_entries
+    # extend the in-memory index with seek positions, ids and ignored columns
+    # -------------------------------------------------------------------------
+    def add_entries(self, seeks, names, extras):
+        offsets = np.asarray(seeks, dtype=np.int64) - HEADER_SIZE
+        if np.any(offsets % self.record_size) or np.any(offsets < 0):
+            raise ValueError("Misaligned seek positions in " + self.id_path)
+        self.rows = np.concatenate([self.rows, offsets // self.record_size])
+        for attr, items in (('names', names), ('extras', extras)):
+            blob, offsets = pack_strings(items)
+            start = getattr(self, attr[:-1] + '_offsets')
+            setattr(self, attr, np.concatenate([getattr(self, attr), blob]))
+            setattr(self, attr[:-1] + '_offsets', np.concatenate([start[:-1], offsets + start[-1]]))
+        if self.lookup is not None:
+            first = len(self.rows) - len(names)
+            for i, name in enumerate(names):
+                self.lookup.setdefault(name.decode('utf-8', 'surrogateescape'), first + i)
+
+    # -------------------------------------------------------------------------
+    # id
+    # the id of entry number i
+    # -------------------------------------------------------------------------
+    def id(self, i):
+        self.load_ids()
+        return self.names[self.name_offsets[i]:self.name_offsets[i+1]].tobytes().decode('utf-8', 'surrogateescape')
+
+    # -------------------------------------------------------------------------
+    # ids
+    # the ids of all entries (or of the given entry numbers)
+    # -------------------------------------------------------------------------
+    def ids(self, entries=None):
+        if entries is None:
+            entries = range(len(self))
+        return [self.id(i) for i in entries]
+
+    # -------------------------------------------------------------------------
+    # extra
+    # the ignored columns stored with entry number i
+    # -------------------------------------------------------------------------
+    def extra(self, i):
+        self.load_ids()
+        text = self.extras[self.extra_offsets[i]:self.extra_offsets[i+1]].tobytes().decode('utf-8', 'surrogateescape')
+        return text.split('\t') if text else []
+
+    # -------------------------------------------------------------------------
+    # index
+    # the entry number of an id (the first one, if repeated) or None
+    # -------------------------------------------------------------------------
+    def index(self, name):
+        if self.id_index is not None:
+            return self.id_index.lookup(name)
+        if self.lookup is None:
+            self.lookup = {}
+            self.load_ids()
+            for i in range(len(self) - 1, -1, -1):
+                self.lookup[self.id(i)] = i
+        return self.lookup.get(name)
+
+    # -------------------------------------------------------------------------
+    # get
+    # the rank vector of an id or None
+    # -------------------------------------------------------------------------
+    def get(self, name):
+        i = self.index(name)
+        return None if i is None else self[i]
+
+    # -------------------------------------------------------------------------
+    # append
+    # serialize fingerprints (N x L values) under ids, skipping ids already in
+    # the database; returns the number of fingerprints added
+    #
+    # The .fp records are written and synced before the .id lines, and the
+    # .id lines before the id index records, so an interrupted append leaves
+    # at most records that are not listed yet; they are dropped by the next
+    # append (and ignored by readers, which follow the .id file).
+    # -------------------------------------------------------------------------
+    def append(self, ids, fps, extra=None, normalize=False):
+        fps = np.asarray(fps, dtype=np.float64).reshape(-1, self.L)
+        if len(ids) != len(fps):
+            raise ValueError("Got %d ids for %d fingerprints" % (len(ids), len(fps)))
+        if self.id_index is None:
+            self.id_index = IdIndex.build(self.base, self.id_path, self.data_start)
+        known = self.id_index.lookup_many(ids) >= 0
+        keep = []
+        seen = set()
+        for i, name in enumerate(ids):
+            if not known[i] and name not in seen:
+                seen.add(name)
+                keep.append(i)
+        if not keep:
+            return 0
+        fps = fps[keep]
+        if normalize:
+            fps = standardize(fps)
+        ranked = ranks(fps)
+
+        start = HEADER_SIZE + len(self.id_index) * self.record_size
+        if os.path.getsize(self.fp_path) < start:
+            raise ValueError("%s holds fewer records than %s lists" % (self.fp_path, self.id_path))
+        with open(self.fp_path, 'r+b') as f:
+            f.truncate(start)
+            f.seek(start)
+            f.write(ranked.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        seeks = start + self.record_size * np.arange(len(keep), dtype=np.int64)
+        names = [ids[i].encode('utf-8', 'surrogateescape') for i in keep]
+        extras = [('\t'.join(str(c) for c in extra[i]) if extra is not None else '').encode('utf-8', 'surrogateescape')
+                  for i in keep]
+        lines = [b'%d\t%s\t%s\n' % (seek, name, columns) if columns else b'%d\t%s\n' % (seek, name)
+                 for seek, name, columns in zip(seeks, names, extras)]
+        end = self.id_index.end
+        offsets = end + np.cumsum([0] + [len(line) for line in lines[:-1]])
+        with open(self.id_path, 'r+b') as f:
+            f.truncate(end)
+            f.seek(end)
+            f.write(b''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        self.id_index.add(names, offsets, end + sum(len(line) for line in lines))
+        if self.rows is not None:
+            self.add_entries(seeks, names, extras)
+        if self.entries is not None:
+            # the new records follow the listed ones
+            self.entries = len(self.id_index) if start == HEADER_SIZE + self.entries * self.record_size else None
+        self.map()
+        return len(keep)
+
+    # -------------------------------------------------------------------------
+    # create
+    # write an empty database for fingerprints of length L
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def create(path, L):
+        base, fp_path, id_path = db_paths(path)
+        with open(id_path, 'w') as f:
+            f.write('#created\t' + time.strftime('%a %b %d %H:%M:%S %Z %Y') + '\n')
+            f.write('#version\t' + FP_VERSION + '\n')
+            f.write('#L\t%d\n' % L)
+        with open(fp_path, 'wb') as f:
+            f.write(np.array([L], dtype=np.dtype('<i4')).tobytes())
+        IdIndex.build(base, id_path, os.path.getsize(id_path))
+        return FingerprintDB(base)
+
+    # -------------------------------------------------------------------------
+    # open
+    # open the database at path, creating it if it does not exist yet
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def open(path, L=None):
+        base, fp_path, id_path = db_paths(path)
+        if os.path.exists(id_path):
+            db = FingerprintDB(base)
+            if L is not None and db.L != L:
+                raise ValueError("Incompatible fingerprint sizes: %s has L=%d, not %d" % (base, db.L, L))
+            return db
+        if L is None:
+            raise ValueError("A fingerprint size is needed to create " + base)
+        return FingerprintDB.create(base, L)
+
+
+# -----------------------------------------------------------------------------
+# expand_files
+# file arguments, where @list stands for the files named in list
+# -----------------------------------------------------------------------------
+def expand_files(files):
+    for file in files:
+        if file.startswith('@') and os.path.exists(file[1:]):
+            with open(file[1:]) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and os.path.getsize(line):
+                        yield line
+        else:
+            yield file
+
+
+# -------------------------------------------------------------------------
+# main
+# serialize fingerprint files into a database, like bin/serializeLPH.pl
+# -------------------------------------------------------------------------
+@click.command()
+@click.option('--output', '-o', required=True, help="Base name of the database to create or extend")
+@click.option('--fp-length', required=True, type=int, help="The fingerprint length")
+@click.option('--ignore-columns', default=1, help="Columns between the id and the fingerprint values (1 for the statement count)")
+@click.option('--normalize/--no-normalize', default=False, help="Standardize fingerprints before ranking")
+@click.option('--batch-size', default=65536, help="Fingerprints serialized at a time")
+@click.argument('files', nargs=-1, required=True)
+def main(output, fp_length, ignore_columns, normalize, batch_size, files):
+    db = FingerprintDB.open(output, fp_length)
+    added = 0
+    for file in expand_files(files):
+        ids, extra, fps = [], [], []
+        for name, columns, values in read_fingerprint_text(file, fp_length, ignore_columns):
+            ids.append(name)
+            extra.append(columns)
+            fps.append(values)
+            if len(ids) >= batch_size:
+                added += db.append(ids, fps, extra, normalize)
+                ids, extra, fps = [], [], []
+        if ids:
+            added += db.append(ids, fps, extra, normalize)
+    print("Added %s fingerprints to %s" % (added or 'zero', db.fp_path))
+
+
+if __name__ == '__main__':
+    main()
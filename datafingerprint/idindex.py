@@ -0,0 +1,248 @@
+# -----------------------------------------------------------------------------
+# idindex.py
+# persistent hash index from ids to the entries of a serialized fingerprint
+# database, so appending to a database needs no pass over its .id file
+#
+# The index of <base>.id is kept next to it as
+#   <base>.idx       records (64-bit id hash, entry number, offset of the
+#                    entry's line in <base>.id) sorted by hash, in .npy
+#                    format, ending with a sentinel whose offset is the end of
+#                    the part of <base>.id that is indexed
+#   <base>.idx.log   records of entries appended since, unsorted
+# A lookup is a binary search of the memory-mapped records (or a dict lookup
+# for logged ones) followed by reading one line of the .id file to rule out
+# hash collisions. Lines added to the .id file by other tools (such as
+# bin/serializeLPH.pl) are picked up from the indexed end on opening. The log
+# is merged into the sorted records once it grows past a fraction of them.
+# The first index of an existing .id file is built in bulk: the file is read
+# in chunks, each hashed into records, and the records sorted once.
+# -----------------------------------------------------------------------------
+import os
+import numpy as np
+from datafingerprint.vector_store import token_hash
+
+RECORD = np.dtype([('hash', '<u8'), ('entry', '<i8'), ('offset', '<i8')])
+SENTINEL_HASH = np.iinfo(np.uint64).max
+BUILD_CHUNK_SIZE = 1 << 24
+
+
+# -----------------------------------------------------------------------------
+# id_key
+# the bytes of an id as written in the .id file
+# -----------------------------------------------------------------------------
+def id_key(name):
+    return name if isinstance(name, bytes) else name.encode('utf-8', 'surrogateescape')
+
+
+# -----------------------------------------------------------------------------
+# hash_lines
+# records of the entries of a block of complete .id lines starting at offset,
+# numbered from entry (comments and blank lines are skipped)
+# -----------------------------------------------------------------------------
+def hash_lines(data, offset, entry):
+    lines = data.split(b'\n')[:-1]
+    starts = offset + np.cumsum([0] + [len(line) + 1 for line in lines[:-1]], dtype=np.int64)
+    keep = [n for n, line in enumerate(lines) if not line.startswith(b'#') and line.strip()]
+    records = np.zeros(len(keep), dtype=RECORD)
+    records['hash'] = np.fromiter((token_hash(lines[n].split(b'\t', 2)[1].rstrip(b'\r')) for n in keep),
+                                  dtype=np.uint64, count=len(keep))
+    records['entry'] = entry + np.arange(len(keep))
+    records['offset'] = starts[keep]
+    return records
+
+
+# -----------------------------------------------------------------------------
+# write_records
+# save sorted records followed by the sentinel, replacing path atomically
+# -----------------------------------------------------------------------------
+def write_records(path, records, end):
+    sentinel = np.array([(SENTINEL_HASH, -1, end)], dtype=RECORD)
+    tmp = path + '.tmp%d' % os.getpid()
+    with open(tmp, 'wb') as f:
+        np.save(f, np.concatenate([records, sentinel]))
+    os.replace(tmp, path)
+
+
+class IdIndex(object):
+    """Persistent hash index from ids to entry numbers of a fingerprint database."""
+    def __init__(self, base, id_path, compact_fraction=0.1):
+        self.path = base + '.idx'
+        self.log_path = self.path + '.log'
+        self.id_path = id_path
+        self.compact_fraction = compact_fraction
+        self.load()
+        self.catch_up()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, name):
+        return self.lookup(name) is not None
+
+    # -------------------------------------------------------------------------
+    # load
+    # map the sorted records and read the log
+    # -------------------------------------------------------------------------
+    def load(self):
+        self.sorted = np.load(self.path, mmap_mode='r')
+        self.hashes = self.sorted['hash']
+        self.end = int(self.sorted['offset'][-1])
+        indexed = len(self.sorted) - 1
+        log = np.zeros(0, dtype=RECORD)
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'rb') as f:
+                data = f.read()
+            # a record cut short by an interrupted write is dropped, as are
+            # records already merged by an interrupted compaction
+            log = np.frombuffer(data[:len(data) - len(data) % RECORD.itemsize], dtype=RECORD)
+            log = log[log['entry'] >= indexed]
+        self.recent = {}
+        for h, entry, offset in log.tolist():
+            self.recent.setdefault(h, []).append((entry, offset))
+        self.count = indexed + len(log)
+        self.logged = len(log)
+        if len(log):
+            self.end = max(self.end, self.line_end(int(log['offset'].max())))
+
+    # -------------------------------------------------------------------------
+    # line_end
+    # offset just past the .id line starting at offset
+    # -------------------------------------------------------------------------
+    def line_end(self, offset):
+        with open(self.id_path, 'rb') as f:
+            f.seek(offset)
+            return offset + len(f.readline())
+
+    # -------------------------------------------------------------------------
+    # name_at
+    # the id on the .id line starting at offset
+    # -------------------------------------------------------------------------
+    def name_at(self, f, offset):
+        f.seek(offset)
+        fields = f.readline().rstrip(b'\r\n').split(b'\t')
+        return fields[1] if len(fields) > 1 else None
+
+    # -------------------------------------------------------------------------
+    # catch_up
+    # index the complete .id lines past the indexed end
+    # -------------------------------------------------------------------------
+    def catch_up(self):
+        names = []
+        offsets = []
+        offset = self.end
+        with open(self.id_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                if not line.startswith(b'#') and line.strip():
+                    names.append(line.split(b'\t')[1].rstrip(b'\r\n'))
+                    offsets.append(offset)
+                offset += len(line)
+        if names:
+            self.add(names, offsets, offset)
+        self.end = offset
+
+    # -------------------------------------------------------------------------
+    # lookup
+    # the entry number of an id (the first one, if repeated) or None
+    # -------------------------------------------------------------------------
+    def lookup(self, name):
+        entry = self.lookup_many([name])[0]
+        return None if entry < 0 else int(entry)
+
+    # -------------------------------------------------------------------------
+    # lookup_many
+    # entry numbers of many ids (-1 for unknown ids); the hashes are searched
+    # at once and only the ids whose hash is found are checked in the .id file
+    # -------------------------------------------------------------------------
+    def lookup_many(self, names):
+        keys = [id_key(name) for name in names]
+        hashes = np.array([token_hash(key) for key in keys], dtype=np.uint64)
+        entries = np.full(len(keys), -1, dtype=np.int64)
+        first = np.searchsorted(self.hashes, hashes)
+        found = self.hashes[np.minimum(first, len(self.hashes) - 1)] == hashes
+        candidates = np.nonzero(found | np.array([int(h) in self.recent for h in hashes], dtype=bool))[0]
+        if not len(candidates):
+            return entries
+        with open(self.id_path, 'rb') as f:
+            for k in candidates:
+                h, key = hashes[k], keys[k]
+                i = int(first[k])
+                while i < len(self.hashes) and self.hashes[i] == h and entries[k] < 0:
+                    entry, offset = int(self.sorted['entry'][i]), int(self.sorted['offset'][i])
+                    if entry >= 0 and self.name_at(f, offset) == key:
+                        entries[k] = entry
+                    i += 1
+                for entry, offset in self.recent.get(int(h), ()):
+                    if entries[k] < 0 and self.name_at(f, offset) == key:
+                        entries[k] = entry
+        return entries
+
+    # -------------------------------------------------------------------------
+    # add
+    # index the next entries, whose .id lines start at offsets and end at end
+    # -------------------------------------------------------------------------
+    def add(self, names, offsets, end):
+        records = np.zeros(len(names), dtype=RECORD)
+        records['hash'] = [token_hash(id_key(name)) for name in names]
+        records['entry'] = self.count + np.arange(len(names))
+        records['offset'] = offsets
+        with open(self.log_path, 'ab') as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        for h, entry, offset in records.tolist():
+            self.recent.setdefault(h, []).append((entry, offset))
+        self.count += len(names)
+        self.logged += len(names)
+        self.end = end
+        if self.logged > self.compact_fraction * max(len(self.sorted) - 1, 1):
+            self.compact()
+
+    # -------------------------------------------------------------------------
+    # compact
+    # merge the log into the sorted records
+    # -------------------------------------------------------------------------
+    def compact(self):
+        log = [(h, entry, offset) for h, items in self.recent.items() for entry, offset in items]
+        records = np.concatenate([np.asarray(self.sorted[:-1]), np.array(log, dtype=RECORD)])
+        records = records[np.lexsort((records['entry'], records['hash']))]
+        write_records(self.path, records, self.end)
+        open(self.log_path, 'wb').close()
+        self.load()
+
+    # -------------------------------------------------------------------------
+    # build
+    # index the ids of an existing .id file whose entries start at data_start,
+    # chunk_size bytes at a time; a last line cut short is left to catch_up
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def build(base, id_path, data_start, chunk_size=BUILD_CHUNK_SIZE):
+        path = base + '.idx'
+        parts = []
+        entries = 0
+        end = data_start
+        with open(id_path, 'rb') as f:
+            f.seek(data_start)
+            rest = b''
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                data = rest + data
+                cut = data.rfind(b'\n') + 1
+                rest = data[cut:]
+                if cut:
+                    parts.append(hash_lines(data[:cut], end, entries))
+                    entries += len(parts[-1])
+                    end += cut
+        records = np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD)
+        del parts
+        # entries are in order already, so a stable sort by hash keeps the
+        # first of repeated ids first
+        records = records[np.argsort(records['hash'], kind='stable')]
+        write_records(path, records, end)
+        if os.path.exists(path + '.log'):
+            os.remove(path + '.log')
+        return IdIndex(base, id_path)
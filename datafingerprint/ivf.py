@@ -0,0 +1,310 @@
+# -----------------------------------------------------------------------------
+# ivf.py
+# inverted-file (coarse quantizer) approximate nearest-neighbour index over a
+# serialized fingerprint database
+#
+# The rank vectors are prepared as in search.py (centred, unit length), so the
+# correlation of two fingerprints is a dot product. A spherical k-means over a
+# sample of them gives nlist centroids; every entry is assigned to the cell of
+# its most correlated centroid. A query probes its nprobe most correlated
+# cells and the entries listed there are reranked by their exact correlation.
+#
+# An index is a directory holding
+#   meta.json      version, L, nlist and the number of entries in the lists
+#   centroids.npy  the centroids (float32, nlist x L)
+#   cells.bin      the cell of every indexed entry, in entry order (int32);
+#                  entries appended to the database are appended here
+#   entries.npy    entry numbers grouped by cell (int64), for the first
+#                  'compacted' entries of cells.bin
+#   offsets.npy    start of each cell in entries.npy (int64, nlist + 1)
+# Entries appended since the last compaction are scanned from cells.bin; the
+# lists are rebuilt once that tail grows past a fraction of the index.
+#
+# USAGE: python3 -m datafingerprint.ivf build <db> <index>
+#        python3 -m datafingerprint.ivf evaluate <db> <index> --nprobe 1,4,16
+# -----------------------------------------------------------------------------
+import click
+import json
+import os
+import sys
+import time
+import numpy as np
+from datafingerprint.fpdb import FingerprintDB
+from datafingerprint.report import PerQueryTopK, write_pairs
+from datafingerprint.search import DEFAULT_BLOCK_SIZE, correlation_blocks, prepare
+
+INDEX_VERSION = 1
+CELL_DTYPE = np.dtype('<i4')
+
+
+# -----------------------------------------------------------------------------
+# assign
+# the most correlated centroid of every prepared vector, in blocks
+# -----------------------------------------------------------------------------
+def assign(X, centroids, block_size=DEFAULT_BLOCK_SIZE):
+    cells = np.empty(len(X), dtype=np.int64)
+    for start in range(0, len(X), block_size):
+        cells[start:start+block_size] = np.argmax(X[start:start+block_size] @ centroids.T, axis=1)
+    return cells
+
+
+# -----------------------------------------------------------------------------
+# train_centroids
+# spherical k-means: centroids are kept at unit length and vectors go to the
+# centroid with the largest dot product; empty cells are reseeded
+# -----------------------------------------------------------------------------
+def train_centroids(X, nlist, iterations=20, seed=0):
+    rng = np.random.RandomState(seed)
+    centroids = X[rng.choice(len(X), nlist, replace=len(X) < nlist)].astype(np.float64)
+    for iteration in range(iterations):
+        cells = assign(X, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, cells, X)
+        empty = np.bincount(cells, minlength=nlist) == 0
+        sums[empty] = X[rng.choice(len(X), empty.sum())]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        centroids = sums / norms
+    return centroids.astype(np.float32)
+
+
+class IVFIndex(object):
+    """An inverted-file index over the entries of a FingerprintDB."""
+    def __init__(self, path, db, compact_fraction=0.1):
+        self.path = path
+        self.db = db
+        self.compact_fraction = compact_fraction
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != INDEX_VERSION:
+            raise ValueError("Unsupported index version in " + str(path))
+        if self.meta['L'] != db.L:
+            raise ValueError("Index %s was built for L=%d, not %d" % (path, self.meta['L'], db.L))
+        self.centroids = np.load(os.path.join(path, 'centroids.npy'))
+        self.nlist = len(self.centroids)
+        self.load()
+
+    def __len__(self):
+        return len(self.cells)
+
+    # -------------------------------------------------------------------------
+    # load
+    # map the cell assignments and the compacted lists
+    # -------------------------------------------------------------------------
+    def load(self):
+        cells_path = os.path.join(self.path, 'cells.bin')
+        n = os.path.getsize(cells_path) // CELL_DTYPE.itemsize
+        self.cells = np.memmap(cells_path, dtype=CELL_DTYPE, mode='r', shape=(n,)) if n \
+            else np.zeros(0, dtype=CELL_DTYPE)
+        self.entries = np.load(os.path.join(self.path, 'entries.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(self.path, 'offsets.npy'))
+        self.compacted = len(self.entries)
+
+    # -------------------------------------------------------------------------
+    # add
+    # index the entries appended to the database since the last call; returns
+    # the number of entries added
+    # -------------------------------------------------------------------------
+    def add(self, block_size=DEFAULT_BLOCK_SIZE):
+        start = len(self)
+        vectors = self.db.vectors()
+        if len(vectors) <= start:
+            return 0
+        with open(os.path.join(self.path, 'cells.bin'), 'ab') as f:
+            for s in range(start, len(vectors), block_size):
+                X = prepare(vectors[s:s + block_size])
+                f.write(assign(X, self.centroids).astype(CELL_DTYPE).tobytes())
+        self.load()
+        if len(self) - self.compacted > self.compact_fraction * max(self.compacted, 1):
+            self.compact()
+        return len(self) - start
+
+    # -------------------------------------------------------------------------
+    # compact
+    # rebuild the inverted lists from all cell assignments
+    # -------------------------------------------------------------------------
+    def compact(self):
+        cells = np.asarray(self.cells)
+        entries = np.argsort(cells, kind='stable').astype(np.int64)
+        offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(cells, minlength=self.nlist))
+        # write next to the lists and swap in, so readers never see a partial list
+        for name, array in (('entries.npy', entries), ('offsets.npy', offsets)):
+            tmp = os.path.join(self.path, 'tmp%d.' % os.getpid() + name)
+            np.save(tmp, array)
+            os.replace(tmp, os.path.join(self.path, name))
+        self.meta['compacted'] = len(entries)
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        self.load()
+
+    # -------------------------------------------------------------------------
+    # probe
+    # the nprobe most correlated cells of every prepared query
+    # -------------------------------------------------------------------------
+    def probe(self, P, nprobe):
+        nprobe = min(nprobe, self.nlist)
+        scores = P @ self.centroids.T
+        if nprobe == self.nlist:
+            return np.tile(np.arange(self.nlist), (len(P), 1))
+        return np.argpartition(-scores, nprobe - 1, axis=1)[:, :nprobe]
+
+    # -------------------------------------------------------------------------
+    # candidates
+    # entry numbers listed in the given cells, including unlisted appends
+    # -------------------------------------------------------------------------
+    def candidates(self, cells):
+        parts = [self.entries[self.offsets[c]:self.offsets[c+1]] for c in cells]
+        if len(self) > self.compacted:
+            tail = np.asarray(self.cells[self.compacted:])
+            parts.append(self.compacted + np.nonzero(np.isin(tail, cells))[0])
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    # -------------------------------------------------------------------------
+    # search
+    # entry numbers and exact correlations of the (approximate) k best
+    # matches of every query rank vector, best first; missing matches are -1
+    # -------------------------------------------------------------------------
+    def search(self, queries, k=10, nprobe=8):
+        P = prepare(np.atleast_2d(queries))
+        vectors = self.db.vectors()
+        found = np.full((len(P), k), -1, dtype=np.int64)
+        scores = np.full((len(P), k), -np.inf)
+        for q, cells in enumerate(self.probe(P, nprobe)):
+            candidates = self.candidates(cells)
+            if not len(candidates):
+                continue
+            c = prepare(vectors[candidates]) @ P[q]
+            best = np.argsort(-c, kind='stable')[:k]
+            found[q, :len(best)] = candidates[best]
+            scores[q, :len(best)] = c[best]
+        return found, scores
+
+    # -------------------------------------------------------------------------
+    # build
+    # train the coarse quantizer on a sample of db and index all its entries;
+    # there are at most as many cells as sampled entries
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def build(path, db, nlist=None, iterations=20, sample_size=None, seed=0):
+        vectors = db.vectors()
+        n = len(vectors)
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(n)))
+        if sample_size is None:
+            sample_size = 64 * nlist
+        sample_size = min(sample_size, n)
+        if sample_size < 1 or nlist < 1:
+            raise ValueError("Cannot build an index of %d cells from %d of the %d entries of %s"
+                             % (nlist, sample_size, n, db.base))
+        nlist = min(nlist, sample_size)
+        rng = np.random.RandomState(seed)
+        sample = np.sort(rng.choice(n, sample_size, replace=False))
+        centroids = train_centroids(prepare(vectors[sample]), nlist, iterations, seed)
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'centroids.npy'), centroids)
+        np.save(os.path.join(path, 'entries.npy'), np.zeros(0, dtype=np.int64))
+        np.save(os.path.join(path, 'offsets.npy'), np.zeros(nlist + 1, dtype=np.int64))
+        open(os.path.join(path, 'cells.bin'), 'wb').close()
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'L': db.L, 'nlist': nlist, 'compacted': 0}, f, indent=2)
+        index = IVFIndex(path, db)
+        index.add()
+        index.compact()
+        return index
+
+
+# -----------------------------------------------------------------------------
+# exact_search
+# entry numbers of the exact k best matches of every query, by full scan
+# -----------------------------------------------------------------------------
+def exact_search(queries, db, k, block_size=DEFAULT_BLOCK_SIZE):
+    best = PerQueryTopK(k, len(queries))
+    for q0, t0, C in correlation_blocks(queries, db.vectors(), block_size):
+        best.add(q0, t0, C)
+    order = np.argsort(-best.c, axis=1, kind='stable')
+    return np.take_along_axis(best.t, order, axis=1)
+
+
+# -----------------------------------------------------------------------------
+# recall
+# mean fraction of the exact k best matches found by an approximate search
+# -----------------------------------------------------------------------------
+def recall(found, exact):
+    hits = [len(np.intersect1d(f[f >= 0], e[e >= 0])) for f, e in zip(found, exact)]
+    return float(np.mean(hits) / exact.shape[1])
+
+
+@click.group()
+def main():
+    pass
+
+
+@main.command()
+@click.argument('database')
+@click.argument('index')
+@click.option('--nlist', default=None, type=int, help="Number of cells (default 4 sqrt(N))")
+@click.option('--iterations', default=20, help="k-means iterations")
+@click.option('--sample-size', default=None, type=int, help="Fingerprints to train the centroids on (default 64 per cell)")
+def build(database, index, nlist, iterations, sample_size):
+    db = FingerprintDB(database)
+    ivf = IVFIndex.build(index, db, nlist, iterations, sample_size)
+    print("Indexed %d fingerprints in %d cells" % (len(ivf), ivf.nlist))
+
+
+@main.command()
+@click.argument('database')
+@click.argument('index')
+def add(database, index):
+    added = IVFIndex(index, FingerprintDB(database)).add()
+    print("Added %d fingerprints to %s" % (added, index))
+
+
+@main.command()
+@click.argument('database')
+@click.argument('index')
+@click.argument('query')
+@click.option('--k', default=10, help="Matches to report per query")
+@click.option('--nprobe', default=8, help="Cells to probe per query")
+@click.option('--ids/--no-ids', default=False, help="Report ids instead of entry numbers")
+def search(database, index, query, k, nprobe, ids):
+    db = FingerprintDB(database)
+    qdb = FingerprintDB(query)
+    found, scores = IVFIndex(index, db).search(qdb.vectors(), k, nprobe)
+    keep = found >= 0
+    qi = np.nonzero(keep)[0]
+    write_pairs(sys.stdout, qi, found[keep], scores[keep], *((qdb, db) if ids else ()))
+
+
+# -------------------------------------------------------------------------
+# evaluate
+# recall@k and latency of the index for several nprobe, against an exact
+# scan, with a random sample of the database as queries
+# -------------------------------------------------------------------------
+@main.command()
+@click.argument('database')
+@click.argument('index')
+@click.option('--queries', default=100, help="Number of database entries to use as queries")
+@click.option('--k', default=10, help="Matches per query")
+@click.option('--nprobe', default='1,2,4,8,16,32', help="Comma-separated numbers of cells to probe")
+@click.option('--seed', default=0)
+def evaluate(database, index, queries, k, nprobe, seed):
+    db = FingerprintDB(database)
+    ivf = IVFIndex(index, db)
+    sample = np.sort(np.random.RandomState(seed).choice(len(db), min(queries, len(db)), replace=False))
+    Q = np.asarray(db[sample])
+    start = time.perf_counter()
+    exact = exact_search(Q, db, k)
+    exact_ms = 1000 * (time.perf_counter() - start) / len(Q)
+    print('nprobe\trecall@%d\tms_per_query' % k)
+    for p in [int(x) for x in nprobe.split(',')]:
+        start = time.perf_counter()
+        found, scores = ivf.search(Q, k, p)
+        ms = 1000 * (time.perf_counter() - start) / len(Q)
+        print('%d\t%.4f\t%.3f' % (p, recall(found, exact), ms))
+    print('exact\t1.0000\t%.3f' % exact_ms)
+
+
+if __name__ == '__main__':
+    main()
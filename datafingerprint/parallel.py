@@ -0,0 +1,115 @@
+# -----------------------------------------------------------------------------
+# parallel.py
+# fingerprint many json files with a pool of worker processes
+#
+# Files are sent to the workers in chunks to keep inter-process traffic low.
+# Each worker builds its own DataFingerprint once (of the class of the
+# parent, e.g. a rowwise.RowEncoder, with its own vector cache) and sends
+# back only ids, statement counts and a block of fingerprints as numpy
+# arrays (and, with stats on, its counters, which are merged into the stats
+# of the parent). Chunks are collected with imap, so results come back
+# in input order and the merged output is deterministic.
+# -----------------------------------------------------------------------------
+import collections
+import multiprocessing
+import numpy as np
+from datafingerprint.readers import chunked
+
+worker = None
+
+
+# -----------------------------------------------------------------------------
+# init_worker
+# build the DataFingerprint of a worker process
+# -----------------------------------------------------------------------------
+def init_worker(params):
+    global worker
+    worker = params['cls'](**params['kwargs'])
+    for name, value in params['attributes'].items():
+        setattr(worker, name, value)
+
+
+# -----------------------------------------------------------------------------
+# fingerprint_chunk
+# fingerprint a list of (position, file) pairs in a worker, returning the
+# positions of the valid files with compact arrays
+# -----------------------------------------------------------------------------
+def fingerprint_chunk(files):
+    positions = []
+    ids = []
+    statements = []
+    fps = []
+    for n, file in files:
+        record = worker.fingerprint_file(file)
+        if record:
+            positions.append(n)
+            ids.append(record[0])
+            statements.append(record[1])
+            fps.append(record[2])
+    fps = np.array(fps) if fps else np.zeros((0, worker.width))
+    return positions, ids, np.array(statements, dtype=np.int64), fps, worker.stats.take(worker.cache)
+
+
+# -----------------------------------------------------------------------------
+# fingerprint_files
+# yield (id, statements, fp) for every valid file, in input order; a file is
+# identified by its name, or by the entry of ids at its position if given
+# -----------------------------------------------------------------------------
+def fingerprint_files(files, dfp, workers, chunk_size=None, ids=None):
+    files = list(enumerate(files))
+    if chunk_size is None:
+        # several chunks per worker for load balancing, but not too small
+        chunk_size = max(1, min(256, len(files) // (workers * 8)))
+    chunks = [files[i:i+chunk_size] for i in range(0, len(files), chunk_size)]
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(dfp.worker_parameters(),)) as pool:
+        for positions, names, statements, fps, stats in pool.imap(fingerprint_chunk, chunks):
+            dfp.stats.merge(stats)
+            if ids is not None:
+                names = [ids[n] for n in positions]
+            for record in zip(names, statements, fps):
+                yield record
+
+
+# -----------------------------------------------------------------------------
+# fingerprint_row_chunk
+# fingerprint a list of (id, row) pairs in a worker, returning compact arrays
+# -----------------------------------------------------------------------------
+def fingerprint_row_chunk(rows):
+    ids = []
+    statements = []
+    fps = []
+    for patient_id, count, fp in worker.fingerprint_batch(rows):
+        ids.append(patient_id)
+        statements.append(count)
+        fps.append(fp)
+    fps = np.array(fps) if fps else np.zeros((0, worker.width))
+    return ids, np.array(statements, dtype=np.int64), fps, worker.stats.take(worker.cache)
+
+
+# -----------------------------------------------------------------------------
+# fingerprint_rows
+# yield (id, statements, fp) for (id, row) pairs, such as the entries of one
+# big json or xml file, in input order; rows are read as chunks are sent
+# out, with at most 4 chunks per worker in flight
+# -----------------------------------------------------------------------------
+def fingerprint_rows(rows, dfp, workers, chunk_size=1024):
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(dfp.worker_parameters(),)) as pool:
+        pending = collections.deque()
+        for chunk in chunked(rows, chunk_size):
+            pending.append(pool.apply_async(fingerprint_row_chunk, (chunk,)))
+            if len(pending) >= 4 * workers:
+                for record in collect(pending.popleft(), dfp):
+                    yield record
+        while pending:
+            for record in collect(pending.popleft(), dfp):
+                yield record
+
+
+# -----------------------------------------------------------------------------
+# collect
+# the records of a finished chunk, merging the worker's stats into dfp's
+# -----------------------------------------------------------------------------
+def collect(result, dfp):
+    ids, statements, fps, stats = result.get()
+    dfp.stats.merge(stats)
+    return zip(ids, statements, fps)
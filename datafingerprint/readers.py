@@ -0,0 +1,332 @@
+# -----------------------------------------------------------------------------
+# readers.py
+# streaming input for DataFingerprint
+#
+# open_input opens a file, stdin ('-') or a gzip/bz2/xz compressed file as a
+# binary stream with a large read buffer. iter_jsonl reads one JSON object
+# per line from such a stream (as in Wikidata dumps, see
+# bin/LPH_linewise_JSON.pl), holding only the current line in memory.
+#
+# Compressed input is recognized by its suffix (or, on stdin, by its magic
+# bytes) and decompressed in a background thread, a few large blocks ahead
+# of the reader, like the `gunzip -c` pipes of the Perl runners: zlib, bz2
+# and lzma release the GIL while they decompress, so decompression overlaps
+# with parsing and fingerprinting.
+# -----------------------------------------------------------------------------
+import bz2
+import glob
+import gzip
+import io
+import json
+import lzma
+import os
+import queue
+import re
+import sys
+import threading
+
+BUFFER_SIZE = 1 << 20
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_CHARS = '0123456789.eE+-'
+COMPRESSED = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+MAGIC = {b'\x1f\x8b': '.gz', b'BZh': '.bz2', b'\xfd7zXZ\x00': '.xz'}
+# decompressed blocks read ahead of the reader
+READ_AHEAD = 4
+
+
+class ThreadedReader(io.RawIOBase):
+    """Raw stream reading another stream in blocks from a background thread."""
+    def __init__(self, stream, block_size=BUFFER_SIZE, read_ahead=READ_AHEAD, close=()):
+        self.stream = stream
+        self.block_size = block_size
+        # streams to close with this one, after the background thread is done
+        self.to_close = [stream] + list(close)
+        self.blocks = queue.Queue(read_ahead)
+        self.block = memoryview(b'')
+        self.stopped = threading.Event()
+        self.done = False
+        self.thread = threading.Thread(target=self.read_blocks, daemon=True)
+        self.thread.start()
+
+    # -------------------------------------------------------------------------
+    # read_blocks
+    # put the blocks of the stream on the queue, then b'' (or the exception
+    # that ended reading)
+    # -------------------------------------------------------------------------
+    def read_blocks(self):
+        try:
+            while not self.stopped.is_set():
+                block = self.stream.read(self.block_size)
+                self.put(block)
+                if not block:
+                    return
+        except Exception as e:
+            self.put(e)
+
+    # -------------------------------------------------------------------------
+    # put
+    # queue an item, giving up once the reader has been closed
+    # -------------------------------------------------------------------------
+    def put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    # -------------------------------------------------------------------------
+    # readinto
+    # fill b from the current block, taking the next one when it is used up
+    # -------------------------------------------------------------------------
+    def readinto(self, b):
+        if not self.block:
+            if self.done:
+                return 0
+            item = self.blocks.get()
+            if isinstance(item, Exception):
+                self.done = True
+                raise item
+            if not item:
+                self.done = True
+                return 0
+            self.block = memoryview(item)
+        n = min(len(b), len(self.block))
+        b[:n] = self.block[:n]
+        self.block = self.block[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            for stream in self.to_close:
+                stream.close()
+        super(ThreadedReader, self).close()
+
+
+# -----------------------------------------------------------------------------
+# open_input
+# binary, buffered stream of a (possibly compressed) file or of stdin
+# -----------------------------------------------------------------------------
+def open_input(path, buffer_size=BUFFER_SIZE):
+    if path == '-':
+        try:
+            stream = open(sys.stdin.fileno(), 'rb', buffering=buffer_size, closefd=False)
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            # stdin replaced by something without a file descriptor
+            stream = sys.stdin.buffer
+            if not hasattr(stream, 'peek'):
+                stream = io.BufferedReader(stream, buffer_size)
+        suffix = compression(stream)
+    else:
+        stream = open(path, 'rb', buffering=buffer_size)
+        suffix = compressed_suffix(path)
+    if suffix is None:
+        return stream
+    return io.BufferedReader(ThreadedReader(COMPRESSED[suffix](stream, 'rb'), buffer_size, close=[stream]),
+                             buffer_size)
+
+
+# -----------------------------------------------------------------------------
+# compressed_suffix
+# the compression suffix a path ends with, or None
+# -----------------------------------------------------------------------------
+def compressed_suffix(path):
+    for suffix in COMPRESSED:
+        if str(path).lower().endswith(suffix):
+            return suffix
+    return None
+
+
+# -----------------------------------------------------------------------------
+# compression
+# the compression suffix of a buffered stream, told by its magic bytes
+# -----------------------------------------------------------------------------
+def compression(stream):
+    head = stream.peek(6)
+    for magic, suffix in MAGIC.items():
+        if head.startswith(magic):
+            return suffix
+    return None
+
+
+# -----------------------------------------------------------------------------
+# input_name
+# the name of a file without its directory, compression suffix and extension,
+# e.g. patient1 for data/patient1.json.gz
+# -----------------------------------------------------------------------------
+def input_name(path):
+    name = os.path.basename(path)
+    suffix = compressed_suffix(name)
+    if suffix:
+        name = name[:-len(suffix)]
+    return os.path.splitext(name)[0]
+
+
+# -----------------------------------------------------------------------------
+# list_inputs
+# the files of a directory with an extension, compressed or not, sorted
+# -----------------------------------------------------------------------------
+def list_inputs(directory, extension):
+    pattern = re.compile(r'\.%s(%s)?$' % (re.escape(extension), '|'.join(re.escape(s) for s in COMPRESSED)),
+                         re.IGNORECASE)
+    return sorted(f for f in glob.glob(os.path.join(directory, '*')) if pattern.search(f) and os.path.isfile(f))
+
+
+# -----------------------------------------------------------------------------
+# clean_id
+# drop characters from an id that would break the tab-delimited output
+# -----------------------------------------------------------------------------
+def clean_id(value):
+    return re.sub(r'[^A-Za-z0-9_.\-=,+*:;@^`|~]+', '', str(value))
+
+
+# -----------------------------------------------------------------------------
+# iter_jsonl
+# yield (id, object) for every line holding a JSON object with an id_field;
+# the id field is removed from the object, lines that are not objects (such
+# as the brackets around a Wikidata dump) are skipped
+# -----------------------------------------------------------------------------
+def iter_jsonl(stream, id_field='id'):
+    for line in stream:
+        line = line.strip()
+        if not line.startswith(b'{'):
+            continue
+        if line.endswith(b','):
+            line = line[:-1]
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            sys.stderr.write("Invalid json line skipped: " + line[:80].decode('utf-8', 'replace') + "\n")
+            continue
+        if entry.get(id_field) is None:
+            continue
+        yield clean_id(entry.pop(id_field)), entry
+
+
+# -----------------------------------------------------------------------------
+# chunked
+# lists of up to chunk_size items of an iterable, read as they are needed
+# -----------------------------------------------------------------------------
+def chunked(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# -----------------------------------------------------------------------------
+# open_text
+# text stream of a (possibly compressed) file or of stdin
+# -----------------------------------------------------------------------------
+def open_text(path, buffer_size=BUFFER_SIZE):
+    return io.TextIOWrapper(open_input(path, buffer_size), encoding='utf-8')
+
+
+class IncrementalReader(object):
+    """Decode JSON values one at a time from a text stream read in chunks."""
+    def __init__(self, stream, chunk_size=BUFFER_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    # -------------------------------------------------------------------------
+    # fill
+    # drop the text already consumed and read up to size more characters
+    # -------------------------------------------------------------------------
+    def fill(self, size):
+        chunk = self.stream.read(size)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+        return bool(chunk)
+
+    # -------------------------------------------------------------------------
+    # peek
+    # the next non-whitespace character, or '' at the end of the stream
+    # -------------------------------------------------------------------------
+    def peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill(self.chunk_size):
+                return ''
+
+    # -------------------------------------------------------------------------
+    # expect
+    # consume the next non-whitespace character, which must be one of chars
+    # -------------------------------------------------------------------------
+    def expect(self, chars):
+        c = self.peek()
+        if not c or c not in chars:
+            raise json.JSONDecodeError("Expecting one of %r" % chars, self.buf, self.pos)
+        self.pos += 1
+        return c
+
+    # -------------------------------------------------------------------------
+    # decode
+    # the next complete JSON value; the read size doubles on every retry so a
+    # large value is decoded in amortized linear time
+    # -------------------------------------------------------------------------
+    def decode(self):
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number cut by the end of the buffer may continue in the next chunk
+                complete = end < len(self.buf) and not (isinstance(value, (int, float)) and
+                                                        self.buf[end] in NUMBER_CHARS)
+                if complete or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill(size)
+            size *= 2
+
+
+# -----------------------------------------------------------------------------
+# iter_top_level
+# yield ('dict', key, value) for each entry of a top-level object,
+# ('list', index, value) for each element of a top-level array, or a single
+# ('scalar', None, value) for anything else
+# -----------------------------------------------------------------------------
+def iter_top_level(stream, chunk_size=BUFFER_SIZE):
+    reader = IncrementalReader(stream, chunk_size)
+    c = reader.peek()
+    if c == '{' or c == '[':
+        kind, close = ('dict', '}') if c == '{' else ('list', ']')
+        reader.expect(c)
+        if reader.peek() == close:
+            reader.expect(close)
+            return
+        index = 0
+        while True:
+            if kind == 'dict':
+                key = reader.decode()
+                reader.expect(':')
+            else:
+                key = index
+            yield kind, key, reader.decode()
+            index += 1
+            if reader.expect(',' + close) == close:
+                break
+    else:
+        yield 'scalar', None, reader.decode()
+    if reader.peek():
+        raise json.JSONDecodeError("Extra data", reader.buf, reader.pos)
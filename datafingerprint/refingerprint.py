@@ -0,0 +1,174 @@
+# -----------------------------------------------------------------------------
+# refingerprint.py
+# compute data fingerprints from triples instead of json, so that a corpus
+# can be fingerprinted again at other lengths or encodings without parsing
+#
+# A triple (name, key, cargo) is the statement
+#     fp[i] += (v(name)[i] + v(key)[(i+1) % L] + v(cargo)[(i+2) % L]) / 3
+# where the name of the top-level structure, 'root', stands for v(0) (see
+# DataFingerprint.recurse_structure). The vectors of the distinct tokens are
+# computed once, in a batch, and rotated once; the statements of many
+# documents are then gathered by token id and summed per document with
+# np.add.reduceat, a chunk of triples at a time. The statement count of a
+# document is its number of triples.
+#
+# Triples are read from a triple store (see triplestore.py) or from the
+# .triple files written by --tripler. Two things cannot be recovered from
+# triples: a key literally named 'root' is taken for the top-level name, and
+# with array_are_sets the entries of a set use v(0) rather than v(position).
+#
+# USAGE: python3 -m datafingerprint.refingerprint -i <store or dir of .triple files> --fp-length 11,13
+# -----------------------------------------------------------------------------
+import click
+import os
+import sys
+import numpy as np
+from datafingerprint.datafingerprint import DataFingerprint
+from datafingerprint.readers import input_name, list_inputs
+from datafingerprint.triplestore import TripleStore, read_text_triples, token_value
+from datafingerprint.vector_store import token_key
+
+CHUNK_SIZE = 1 << 16
+ROOT_KEY = token_key('root')
+
+
+# -----------------------------------------------------------------------------
+# token_vectors
+# the (rotated) vectors of the tokens with the given keys, for the three
+# positions of a triple: W[k][t] is v(token t) rotated left by k within each
+# config's segment, and W[0] has an extra last row, v(0), for 'root' names
+# -----------------------------------------------------------------------------
+def token_vectors(dfp, keys):
+    V = dfp.vector_values([token_value(k) for k in keys])
+    W = [np.vstack([V, dfp.vector_value(0)]), np.empty_like(V), np.empty_like(V)]
+    for seg in dfp.accumulator.segments:
+        W[1][:, seg] = np.roll(V[:, seg], -1, axis=1)
+        W[2][:, seg] = np.roll(V[:, seg], -2, axis=1)
+    return W
+
+
+# -----------------------------------------------------------------------------
+# root_id
+# the token id of 'root' among keys, or -1
+# -----------------------------------------------------------------------------
+def root_id(keys):
+    for i, key in enumerate(keys):
+        if key == ROOT_KEY:
+            return i
+    return -1
+
+
+# -----------------------------------------------------------------------------
+# reduce_documents
+# the fingerprints of documents whose triples (token ids) are
+# triples[offsets[d]:offsets[d+1]], summed a chunk of triples at a time
+# -----------------------------------------------------------------------------
+def reduce_documents(W, root, triples, offsets, chunk_size=CHUNK_SIZE):
+    offsets = np.asarray(offsets, dtype=np.int64)
+    fps = np.zeros((len(offsets) - 1, W[1].shape[1]))
+    first, last = int(offsets[0]), int(offsets[-1])
+    for s in range(first, last, chunk_size):
+        e = min(s + chunk_size, last)
+        t = np.asarray(triples[s:e])
+        names = t[:, 0]
+        if root >= 0:
+            names = np.where(names == root, len(W[0]) - 1, names)
+        C = W[0][names] + W[1][t[:, 1]] + W[2][t[:, 2]]
+        # the chunk starts in one document and may start several others
+        starts = np.unique(np.concatenate([[s], offsets[(offsets > s) & (offsets < e)]]))
+        docs = np.searchsorted(offsets, starts, 'right') - 1
+        fps[docs] += np.add.reduceat(C, starts - s, axis=0)
+    return fps / 3
+
+
+# -----------------------------------------------------------------------------
+# fingerprint_store
+# yield (id, statements, fp) for the documents of a triple store, holding the
+# fingerprints of about chunk_size triples at a time
+# -----------------------------------------------------------------------------
+def fingerprint_store(dfp, store, chunk_size=CHUNK_SIZE):
+    if isinstance(store, str):
+        store = TripleStore(store)
+    keys = store.keys()
+    W = token_vectors(dfp, keys)
+    root = root_id(keys)
+    d0 = 0
+    while d0 < len(store):
+        # documents up to chunk_size triples, but at least one
+        d1 = max(d0 + 1, int(np.searchsorted(store.offsets, store.offsets[d0] + chunk_size, 'right')) - 1)
+        d1 = min(d1, len(store))
+        offsets = store.offsets[d0:d1+1]
+        fps = reduce_documents(W, root, store.triples, offsets, chunk_size)
+        for d in range(d0, d1):
+            yield store.ids[d], int(offsets[d-d0+1] - offsets[d-d0]), fps[d-d0]
+        d0 = d1
+
+
+# -----------------------------------------------------------------------------
+# fingerprint_triple_files
+# yield (id, statements, fp) for .triple files, interning batch_size files
+# at a time (token vectors are kept in the DataFingerprint's cache)
+# -----------------------------------------------------------------------------
+def fingerprint_triple_files(dfp, files, batch_size=1024, chunk_size=CHUNK_SIZE):
+    files = list(files)
+    for b in range(0, len(files), batch_size):
+        tokens = {}
+        ids = []
+        rows = []
+        offsets = [0]
+        for file in files[b:b+batch_size]:
+            for triple in read_text_triples(file):
+                rows.extend(tokens.setdefault(token_key(o), len(tokens)) for o in triple)
+            ids.append(input_name(file))
+            offsets.append(len(rows) // 3)
+        keys = list(tokens)
+        triples = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        fps = reduce_documents(token_vectors(dfp, keys), root_id(keys), triples, offsets, chunk_size)
+        for d, patient_id in enumerate(ids):
+            yield patient_id, offsets[d+1] - offsets[d], fps[d]
+
+
+# -----------------------------------------------------------------------------
+# fingerprint_triples
+# yield (id, statements, fp) for a triple store directory, a directory of
+# .triple files or a single .triple file
+# -----------------------------------------------------------------------------
+def fingerprint_triples(dfp, path):
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        return fingerprint_store(dfp, path)
+    if os.path.isdir(path):
+        return fingerprint_triple_files(dfp, list_inputs(path, 'triple'))
+    return fingerprint_triple_files(dfp, [path])
+
+
+# -------------------------------------------------------------------------
+# main
+#
+# -------------------------------------------------------------------------
+@click.command()
+@click.option('--file_path', '--input', '-i', multiple=True, required=True,
+    help="A triple store, a directory of .triple files or a .triple file")
+@click.option('--normalize/-no-normalize', default=False, help="Normalize fingerprint")
+@click.option('--fp-length', default='13',
+    help="The length of the fingerprint to generate, or several lengths separated by commas (e.g. 11,13).")
+@click.option('--numeric-encoding', default=None,
+    help="Numeric encoding(s) to use, separated by commas (ME, ML, smooth, simple).")
+@click.option('--string-encoding', default=None,
+    help="String encoding(s) to use, separated by commas (decay, pair_sum).")
+def main(file_path, normalize, fp_length, numeric_encoding, string_encoding):
+    encodings = [{}]
+    if numeric_encoding:
+        encodings = [dict(e, numeric_encoding=n) for e in encodings for n in numeric_encoding.split(',')]
+    if string_encoding:
+        encodings = [dict(e, string_encoding=n) for e in encodings for n in string_encoding.split(',')]
+    dfp = DataFingerprint(length=fp_length, encodings=encodings, norm=normalize, debug=0)
+    for path in file_path:
+        for patient_id, statements, fp in fingerprint_triples(dfp, path):
+            if normalize:
+                fp = dfp.normalize(fp)
+            fp_string = '\t'.join(str(round(i, dfp.decimal)) for i in fp)
+            sys.stdout.write(patient_id + '\t' + str(statements) + '\t' + fp_string + '\n')
+
+
+if __name__ == '__main__':
+    main()
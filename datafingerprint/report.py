@@ -0,0 +1,174 @@
+# -----------------------------------------------------------------------------
+# report.py
+# bounded-memory reporting of search results: global top-k, per-query top-k
+# and the correlation histogram
+#
+# The collectors take the correlation tiles of search.correlation_blocks and
+# keep only integer entry numbers and correlations, so memory grows with k
+# (or k per query), not with the number of pairs compared; ids are looked up
+# only when the final pairs are written. The histogram counts every pair
+# compared, in the bins of bin/searchLPHs.pl: int(c * 100 + 100).
+# -----------------------------------------------------------------------------
+import numpy as np
+
+HISTOGRAM_BINS = 201
+
+
+# -----------------------------------------------------------------------------
+# upper_mask
+# the pairs of a tile that belong to the upper triangle (i < j) of an
+# all-against-all search, or None if the whole tile does
+# -----------------------------------------------------------------------------
+def upper_mask(q0, t0, shape):
+    if t0 >= q0 + shape[0]:
+        return None
+    return (t0 + np.arange(shape[1]))[None, :] > (q0 + np.arange(shape[0]))[:, None]
+
+
+class Histogram(object):
+    """Counts of correlations in 0.01-wide bins, as in bin/searchLPHs.pl."""
+    def __init__(self):
+        self.counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+
+    # -------------------------------------------------------------------------
+    # add
+    # count the correlations of a tile
+    # -------------------------------------------------------------------------
+    def add(self, q0, t0, C, all_vs_all=False):
+        mask = upper_mask(q0, t0, C.shape) if all_vs_all else None
+        values = C.ravel() if mask is None else C[mask]
+        # searchLPHs.pl bins the six-decimal text written by fpc
+        values = np.round(values.astype(np.float64), 6)
+        bins = np.clip((values * 100 + 100).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+        self.counts += np.bincount(bins, minlength=HISTOGRAM_BINS)
+
+    # -------------------------------------------------------------------------
+    # write
+    # the non-empty bins as CORR/PAIRS lines
+    # -------------------------------------------------------------------------
+    def write(self, f):
+        f.write('CORR\tPAIRS\n')
+        for i in np.nonzero(self.counts)[0]:
+            f.write('%.2f\t%d\n' % ((i - 100) / 100, self.counts[i]))
+
+
+class TopK(object):
+    """The k pairs with the highest correlations over a whole search."""
+    def __init__(self, k, cutoff=None):
+        self.k = k
+        self.threshold = -np.inf if cutoff is None else cutoff
+        self.qi = np.zeros(0, dtype=np.int64)
+        self.ti = np.zeros(0, dtype=np.int64)
+        self.c = np.zeros(0)
+        self.pending = []
+        self.npending = 0
+
+    # -------------------------------------------------------------------------
+    # add
+    # keep the pairs of a tile that can still make the top k
+    # -------------------------------------------------------------------------
+    def add(self, q0, t0, C, all_vs_all=False):
+        mask = C >= self.threshold
+        upper = upper_mask(q0, t0, C.shape) if all_vs_all else None
+        if upper is not None:
+            mask &= upper
+        i, j = np.nonzero(mask)
+        if len(i):
+            self.pending.append((q0 + i, t0 + j, C[i, j]))
+            self.npending += len(i)
+            if self.npending >= self.k:
+                self.compact()
+
+    # -------------------------------------------------------------------------
+    # compact
+    # reduce the kept pairs to the k best and raise the threshold to the
+    # lowest of them
+    # -------------------------------------------------------------------------
+    def compact(self):
+        if self.pending:
+            qi, ti, c = zip(*self.pending)
+            self.qi = np.concatenate((self.qi,) + qi)
+            self.ti = np.concatenate((self.ti,) + ti)
+            self.c = np.concatenate((self.c,) + c)
+            self.pending = []
+            self.npending = 0
+        if len(self.c) > self.k:
+            best = np.argpartition(-self.c, self.k - 1)[:self.k]
+            self.qi, self.ti, self.c = self.qi[best], self.ti[best], self.c[best]
+        if len(self.c) >= self.k:
+            self.threshold = max(self.threshold, self.c.min())
+
+    # -------------------------------------------------------------------------
+    # result
+    # query indices, target indices and correlations, best first
+    # -------------------------------------------------------------------------
+    def result(self):
+        self.compact()
+        order = np.lexsort((self.ti, self.qi, -self.c))
+        return self.qi[order], self.ti[order], self.c[order]
+
+
+class PerQueryTopK(object):
+    """The k best targets of every query; in an all-against-all search each
+    pair counts for both of its fingerprints."""
+    def __init__(self, k, n_queries, cutoff=None):
+        self.k = k
+        self.cutoff = cutoff
+        self.c = np.full((n_queries, k), -np.inf)
+        self.t = np.full((n_queries, k), -1, dtype=np.int64)
+
+    # -------------------------------------------------------------------------
+    # add
+    # merge the candidates of a tile into the rows of its queries
+    # -------------------------------------------------------------------------
+    def add(self, q0, t0, C, all_vs_all=False):
+        C = C.astype(np.float64)
+        if all_vs_all:
+            upper = upper_mask(q0, t0, C.shape)
+            if upper is not None:
+                C[~upper] = -np.inf
+            self.merge(t0, q0, C.T)
+        self.merge(q0, t0, C)
+
+    # -------------------------------------------------------------------------
+    # merge
+    # keep the k best of the current and the new candidates of rows r0...
+    # -------------------------------------------------------------------------
+    def merge(self, r0, c0, C):
+        rows = slice(r0, r0 + C.shape[0])
+        c = np.hstack([self.c[rows], C])
+        t = np.hstack([self.t[rows], np.broadcast_to(c0 + np.arange(C.shape[1]), C.shape)])
+        if c.shape[1] > self.k:
+            best = np.argpartition(-c, self.k - 1, axis=1)[:, :self.k]
+            c = np.take_along_axis(c, best, axis=1)
+            t = np.take_along_axis(t, best, axis=1)
+        self.c[rows] = c
+        self.t[rows] = t
+
+    # -------------------------------------------------------------------------
+    # result
+    # query indices, target indices and correlations, by query and then
+    # best first
+    # -------------------------------------------------------------------------
+    def result(self):
+        order = np.argsort(-self.c, axis=1, kind='stable')
+        c = np.take_along_axis(self.c, order, axis=1)
+        t = np.take_along_axis(self.t, order, axis=1)
+        keep = (t >= 0) & np.isfinite(c)
+        if self.cutoff is not None:
+            keep &= c >= self.cutoff
+        qi = np.nonzero(keep)[0]
+        return qi, t[keep], c[keep]
+
+
+# -----------------------------------------------------------------------------
+# write_pairs
+# one line per pair; entry numbers are written 1-based unless the databases
+# are given, in which case they are resolved to ids
+# -----------------------------------------------------------------------------
+def write_pairs(f, qi, ti, c, query_db=None, target_db=None):
+    if query_db is None:
+        f.write(''.join('%d\t%d\t%.6f\n' % row for row in zip(qi + 1, ti + 1, c)))
+    else:
+        target_db = query_db if target_db is None else target_db
+        f.write(''.join('%s\t%s\t%.6f\n' % (query_db.id(q), target_db.id(t), v) for q, t, v in zip(qi, ti, c)))
@@ -0,0 +1,180 @@
+# -----------------------------------------------------------------------------
+# rowwise.py
+# the row-wise "geometric" fingerprint of fingerprint_runner.py as a
+# DataFingerprint with its own value encoding and combination of statements
+#
+# Each entry (row) of the top-level object of a json file, e.g. one patient
+# per key, gets a fingerprint of its own. The encoding differs from
+# DataFingerprint's:
+# - numbers (ints, floats and booleans, but not numeric strings) are encoded
+#   by mantissa and exponent with the exponent weighted exponent_weight and
+#   the mantissa 1 - exponent_weight
+# - strings use the decay encoding; anything else (lists) is a zero vector
+# - only dicts are recursed; a statement combines its three vectors by a
+#   geometric mean,
+#       tmp[i] = ((1+|v1[i] cos v1[i]|)(1+|v2[i] cos 2v2[i]|)(1+|v3[i] cos 3v3[i]|))^(1/3) - 1
+#   shifted to a minimum of 0 and scaled to a sum of 1
+# - as in fingerprint_runner.py each statement replaces the fingerprint, so
+#   it is that of the last statement; with accumulate=True the statements
+#   are summed instead, as DataFingerprint does
+# Everything else (the traversal, the vector cache, reading the rows of a
+# file and the pool of worker processes) is DataFingerprint's.
+#
+# USAGE: python3 -m datafingerprint.rowwise <rows.json> <L> [--workers 4]
+# -----------------------------------------------------------------------------
+import click
+import math
+import sys
+import numpy as np
+from datafingerprint.accumulator import TripleAccumulator
+from datafingerprint.datafingerprint import DataFingerprint
+from datafingerprint.encoders import encode_strings
+from datafingerprint.writers import FORMATS, open_writer
+
+
+class GeometricAccumulator(TripleAccumulator):
+    """Combine statements by their geometric mean, keeping only the last one unless accumulating."""
+    def __init__(self, lengths, block_size=1024, accumulate=False):
+        super(GeometricAccumulator, self).__init__(lengths, block_size)
+        self.accumulate = accumulate
+
+    # -------------------------------------------------------------------------
+    # add
+    # buffer one statement; unless statements are accumulated only the last
+    # one counts
+    # -------------------------------------------------------------------------
+    def add(self, v1, v2, v3):
+        if not self.accumulate:
+            self.pending = [v1, v2, v3]
+            return
+        super(GeometricAccumulator, self).add(v1, v2, v3)
+
+    # -------------------------------------------------------------------------
+    # flush
+    # combine the buffered statements into the fingerprint and return it
+    # -------------------------------------------------------------------------
+    def flush(self):
+        if self.pending:
+            v = np.concatenate(self.pending).reshape(-1, 3, self.L)
+            self.pending = []
+            tmp = ((1 + np.abs(v[:, 0] * np.cos(v[:, 0]))) *
+                   (1 + np.abs(v[:, 1] * np.cos(2 * v[:, 1]))) *
+                   (1 + np.abs(v[:, 2] * np.cos(3 * v[:, 2])))) ** (1 / 3) - 1
+            for seg in self.segments:
+                tmp[:, seg] -= tmp[:, seg].min(axis=1, keepdims=True)
+                sums = tmp[:, seg].sum(axis=1, keepdims=True)
+                tmp[:, seg] = np.divide(tmp[:, seg], sums, out=tmp[:, seg], where=sums != 0)
+            if self.accumulate:
+                self.fp = self.fp + tmp.sum(axis=0)
+            else:
+                self.fp = tmp[-1].copy()
+        return self.fp
+
+
+class RowEncoder(DataFingerprint):
+    """The row-wise geometric fingerprint of fingerprint_runner.py."""
+    def __init__(self, **kwargs):
+        kwargs.setdefault('debug', 0)
+        # statements are not linear, so they cannot be added column by column
+        kwargs['columnar'] = False
+        super(RowEncoder, self).__init__(**kwargs)
+        self.exponent_weight = kwargs['exponent_weight'] if 'exponent_weight' in kwargs and kwargs['exponent_weight'] is not None else 0.5
+        # sum the statements instead of keeping the last one
+        self.accumulate = kwargs['accumulate'] if 'accumulate' in kwargs and kwargs['accumulate'] is not None else False
+        self.accumulator = GeometricAccumulator([c['L'] for c in self.configs], self.block_size, self.accumulate)
+        if self.stats.enabled:
+            self.accumulator.flush = self.stats.timed('add_vector_value', self.accumulator.flush)
+
+    # -------------------------------------------------------------------------
+    # vector_value
+    # the vector of a string or a number, a zero vector for anything else
+    # -------------------------------------------------------------------------
+    def vector_value(self, o):
+        if not isinstance(o, (str, int, float)):
+            return np.zeros(self.width)
+        return super(RowEncoder, self).vector_value(o)
+
+    # -------------------------------------------------------------------------
+    # encode_value
+    # the vector of a number (weighted mantissa/exponent) or of a string,
+    # numeric or not (decay)
+    # -------------------------------------------------------------------------
+    def encode_value(self, o, L, numeric_encoding, string_encoding, string_encoding_decay):
+        if isinstance(o, str):
+            return encode_strings([o], L, string_encoding, string_encoding_decay)[0]
+        length = L
+        new = np.zeros(length)
+        if not isinstance(o, (int, float)) or not o:
+            return new
+        elif numeric_encoding == 'ME':
+            e = int(math.log10(abs(o)))
+            mantissa = o / 10**e * (length / 10.0)
+            over = abs(mantissa - int(mantissa))
+            man_w = 1 - self.exponent_weight
+            if over:
+                new[int(mantissa % length)] += man_w * (1 - over)
+                index = mantissa + 1 if mantissa > 0 else mantissa - 1
+                new[int(index % length)] += man_w * over
+            else:
+                new[int(mantissa % length)] += man_w
+            new[int(e % length)] += self.exponent_weight
+        else:
+            new[int(o % length)] += 1
+        new = new - min(new)
+        if sum(new) != 0:
+            new = new / sum(new)
+        return new
+
+    # -------------------------------------------------------------------------
+    # recurse_structure
+    # add the statements of a dict (nested dicts first); anything else is
+    # returned as is
+    # -------------------------------------------------------------------------
+    def recurse_structure(self, obj, name=None, base=None):
+        if not isinstance(obj, dict):
+            return obj
+        return super(RowEncoder, self).recurse_structure(obj, name, base)
+
+    # -------------------------------------------------------------------------
+    # fingerprint
+    # (statements, fp) of one row, leaving the encoder reset
+    # -------------------------------------------------------------------------
+    def fingerprint(self, row):
+        self.recurse_structure(row)
+        record = (self.statements, self.fp.copy())
+        self.reset()
+        return record
+
+
+# -------------------------------------------------------------------------
+# main
+# print the normalized fingerprint of every row that has one, like
+# fingerprint_runner.py, or write them all with --output
+# -------------------------------------------------------------------------
+@click.command()
+@click.argument('file_path')
+@click.argument('length', type=int)
+@click.option('--workers', default=1, type=click.IntRange(1, None), help="Number of worker processes")
+@click.option('--accumulate/--last', default=False,
+    help="Sum the statements of a row instead of keeping the last one (as fingerprint_runner.py does)")
+@click.option('--exponent-weight', default=0.5, help="Weight of the exponent in the encoding of numbers")
+@click.option('--output', '-o', default=None, help="Write the fingerprints to <output>.* instead of stdout")
+@click.option('--output-format', default='tsv', type=click.Choice(FORMATS), help="Format of --output")
+def main(file_path, length, workers, accumulate, exponent_weight, output, output_format):
+    encoder = RowEncoder(length=length, workers=workers, accumulate=accumulate, exponent_weight=exponent_weight)
+    writer = open_writer(output, length, output_format, encoder.decimal) if output else None
+    for patient_id, statements, fp in encoder.fingerprint_rows(file_path):
+        if not np.any(fp):
+            continue
+        fp = encoder.normalize(fp)
+        if writer is not None:
+            writer.add(patient_id, statements, fp)
+        else:
+            fp_string = '\t'.join(str(round(i, encoder.decimal)) for i in fp)
+            sys.stdout.write(patient_id + '\t' + str(statements) + '\t' + fp_string + '\n')
+    if writer is not None:
+        writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# -----------------------------------------------------------------------------
+# search.py
+# blocked, vectorized rank correlation search over serialized fingerprint
+# databases, as an alternative to bin/fpc
+#
+# Every rank vector is centred and scaled to unit length once per block, so
+# the Spearman correlation of two fingerprints is the dot product of their
+# prepared vectors and a (query block x target block) tile of correlations is
+# a single matrix product. Memory stays bounded by block_size^2 correlations
+# plus two blocks of vectors, whatever the size of the databases. Without a
+# target all-against-all comparisons are made, computing only the tiles on
+# and above the diagonal and reporting only pairs i < j, as fpc does.
+#
+# USAGE: python3 -m datafingerprint.search <query.fp> [<target.fp>] [--cutoff 0.5] [--top 100000]
+# -----------------------------------------------------------------------------
+import click
+import sys
+import numpy as np
+from datafingerprint.fpdb import FingerprintDB
+from datafingerprint.report import Histogram, PerQueryTopK, TopK, upper_mask, write_pairs
+
+DEFAULT_BLOCK_SIZE = 2048
+
+
+# -----------------------------------------------------------------------------
+# prepare
+# centre each rank vector (row) and scale it to unit length, so that dot
+# products are correlations; constant vectors are left at zero
+# -----------------------------------------------------------------------------
+def prepare(ranks, dtype=np.float32):
+    r = np.asarray(ranks, dtype=np.float64)
+    centred = r - r.mean(axis=1, keepdims=True)
+    norm = np.sqrt(np.einsum('ij,ij->i', centred, centred))[:, None]
+    norm[norm == 0] = 1
+    return (centred / norm).astype(dtype)
+
+
+# -----------------------------------------------------------------------------
+# correlation_blocks
+# yield (q0, t0, C) for every tile of correlations C[i, j] between query
+# q0 + i and target t0 + j; without a target only tiles with t0 >= q0 are
+# computed (the caller keeps j > i in the diagonal tiles, see block_pairs)
+# -----------------------------------------------------------------------------
+def correlation_blocks(query, target=None, block_size=DEFAULT_BLOCK_SIZE, dtype=np.float32):
+    all_vs_all = target is None
+    if all_vs_all:
+        target = query
+    for q0 in range(0, len(query), block_size):
+        Q = prepare(query[q0:q0+block_size], dtype)
+        for t0 in range(q0 if all_vs_all else 0, len(target), block_size):
+            T = Q if all_vs_all and t0 == q0 else prepare(target[t0:t0+block_size], dtype)
+            yield q0, t0, Q @ T.T
+
+
+# -----------------------------------------------------------------------------
+# block_pairs
+# global query indices, target indices and correlations of the pairs of a
+# tile that pass the cutoff, in row-major order
+# -----------------------------------------------------------------------------
+def block_pairs(q0, t0, C, cutoff=None, all_vs_all=False):
+    mask = np.ones(C.shape, dtype=bool) if cutoff is None else C >= cutoff
+    upper = upper_mask(q0, t0, C.shape) if all_vs_all else None
+    if upper is not None:
+        mask &= upper
+    i, j = np.nonzero(mask)
+    return q0 + i, t0 + j, C[i, j]
+
+
+# -----------------------------------------------------------------------------
+# search
+# yield (query indices, target indices, correlations) arrays, one tile at a
+# time, for all pairs with a correlation of at least cutoff
+# -----------------------------------------------------------------------------
+def search(query, target=None, cutoff=None, block_size=DEFAULT_BLOCK_SIZE, dtype=np.float32):
+    for q0, t0, C in correlation_blocks(query, target, block_size, dtype):
+        yield block_pairs(q0, t0, C, cutoff, target is None)
+
+
+# -----------------------------------------------------------------------------
+# correlation
+# the rank correlation of two single fingerprints
+# -----------------------------------------------------------------------------
+def correlation(a, b):
+    p = prepare(np.vstack([a, b]), np.float64)
+    return float(p[0] @ p[1])
+
+
+# -------------------------------------------------------------------------
+# main
+# write one line per pair: query, target and correlation; by default in
+# fpc's format (1-based entry numbers, six decimals), in tile order, or only
+# the top pairs (overall or per query), best first
+# -------------------------------------------------------------------------
+@click.command()
+@click.argument('query')
+@click.argument('target', required=False)
+@click.option('--cutoff', default=None, type=float, help="Do not report pairs with a lower correlation")
+@click.option('--top', default=None, type=int, help="Report only this many pairs with the highest correlations")
+@click.option('--per-query', default=None, type=int, help="Report only this many best targets of every query")
+@click.option('--histogram', default=None, help="File to write the histogram of all correlations to")
+@click.option('--block-size', default=DEFAULT_BLOCK_SIZE, help="Fingerprints per block; tiles hold block-size^2 correlations")
+@click.option('--ids/--no-ids', default=False, help="Report ids instead of entry numbers")
+@click.option('--double/--single', default=False, help="Compute in double instead of single precision")
+def main(query, target, cutoff, top, per_query, histogram, block_size, ids, double):
+    qdb = FingerprintDB(query)
+    tdb = FingerprintDB(target) if target else None
+    if tdb is not None and tdb.L != qdb.L:
+        raise click.BadParameter("Incompatible fingerprint sizes: %d and %d" % (qdb.L, tdb.L))
+    all_vs_all = tdb is None
+    dbs = (qdb, tdb) if ids else ()
+    counts = Histogram() if histogram else None
+    collector = None
+    if top:
+        collector = TopK(top, cutoff)
+    elif per_query:
+        collector = PerQueryTopK(per_query, len(qdb), cutoff)
+
+    dtype = np.float64 if double else np.float32
+    blocks = correlation_blocks(qdb.vectors(), None if all_vs_all else tdb.vectors(), block_size, dtype)
+    for q0, t0, C in blocks:
+        if counts is not None:
+            counts.add(q0, t0, C, all_vs_all)
+        if collector is not None:
+            collector.add(q0, t0, C, all_vs_all)
+        else:
+            write_pairs(sys.stdout, *block_pairs(q0, t0, C, cutoff, all_vs_all), *dbs)
+    if collector is not None:
+        write_pairs(sys.stdout, *collector.result(), *dbs)
+    if counts is not None:
+        with open(histogram, 'w') as f:
+            counts.write(f)
+
+
+if __name__ == '__main__':
+    main()
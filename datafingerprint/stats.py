@@ -0,0 +1,238 @@
+# -----------------------------------------------------------------------------
+# stats.py
+# timings and counters of a fingerprint run, for DataFingerprint(stats=True)
+# and the --stats report
+#
+# Hot methods are timed by wrapping them on the instance when stats are
+# enabled, so a DataFingerprint without stats runs its methods unwrapped.
+# Timed sections are exclusive: a timed method called from inside another
+# one (an encoding from vector_values) is counted in the outer section only,
+# so the phases add up to at most the elapsed time and the rest is the
+# traversal itself. Documents record how many statements they had, in
+# power-of-two buckets. Workers send their counters back with their results
+# (see take and merge); their phases are summed, so with several workers
+# they can add up to more than the elapsed time.
+# -----------------------------------------------------------------------------
+import collections
+import contextlib
+import sys
+import time
+
+try:
+    import resource
+except ImportError:     # not on windows
+    resource = None
+
+CACHE_COUNTERS = ('hits', 'misses', 'evictions')
+
+
+class NullTimer(object):
+    """A timer doing nothing (contextlib.nullcontext needs python 3.7)."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class RunStats(object):
+    """Timings of the phases of a run and statements per document."""
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.active = False
+        self.reset()
+
+    # -------------------------------------------------------------------------
+    # reset
+    # drop all counters
+    # -------------------------------------------------------------------------
+    def reset(self):
+        self.seconds = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self.documents = 0
+        self.statements = 0
+        self.min_statements = None
+        self.max_statements = 0
+        self.buckets = collections.defaultdict(int)
+        # cache counters of workers, the local cache is read by report
+        self.cache = dict.fromkeys(CACHE_COUNTERS, 0)
+
+    # -------------------------------------------------------------------------
+    # timed
+    # function wrapped to add its time to a phase, unless another timed
+    # section is already running
+    # -------------------------------------------------------------------------
+    def timed(self, name, function):
+        clock = time.perf_counter
+
+        def run(*args, **kwargs):
+            if self.active:
+                return function(*args, **kwargs)
+            self.active = True
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.seconds[name] += clock() - start
+                self.calls[name] += 1
+                self.active = False
+        return run
+
+    # -------------------------------------------------------------------------
+    # timer
+    # context manager adding the time of a block to a phase (doing nothing
+    # when stats are disabled)
+    # -------------------------------------------------------------------------
+    def timer(self, name):
+        if not self.enabled or self.active:
+            return NULL_TIMER
+        return self.section(name)
+
+    @contextlib.contextmanager
+    def section(self, name):
+        self.active = True
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+            self.active = False
+
+    # -------------------------------------------------------------------------
+    # timed_iter
+    # the items of an iterable, with the time spent producing them (reading
+    # and parsing) added to a phase
+    # -------------------------------------------------------------------------
+    def timed_iter(self, name, items):
+        if not self.enabled:
+            return items
+        return self.iterate(name, iter(items))
+
+    def iterate(self, name, items):
+        produce = self.timed(name, next)
+        while True:
+            try:
+                item = produce(items)
+            except StopIteration:
+                return
+            yield item
+
+    # -------------------------------------------------------------------------
+    # document
+    # count a fingerprinted document and its statements
+    # -------------------------------------------------------------------------
+    def document(self, statements):
+        if not self.enabled:
+            return
+        statements = int(statements)
+        self.documents += 1
+        self.statements += statements
+        self.max_statements = max(self.max_statements, statements)
+        if self.min_statements is None or statements < self.min_statements:
+            self.min_statements = statements
+        self.buckets[statements.bit_length()] += 1
+
+    # -------------------------------------------------------------------------
+    # take
+    # the counters (and those of a vector cache) as a picklable dict, reset
+    # afterwards, for a worker to send back with its results
+    # -------------------------------------------------------------------------
+    def take(self, cache=None):
+        if not self.enabled:
+            return None
+        counters = {
+            'seconds': dict(self.seconds),
+            'calls': dict(self.calls),
+            'documents': self.documents,
+            'statements': self.statements,
+            'min_statements': self.min_statements,
+            'max_statements': self.max_statements,
+            'buckets': dict(self.buckets),
+            'cache': dict(self.cache),
+        }
+        if cache is not None:
+            for name in CACHE_COUNTERS:
+                counters['cache'][name] += getattr(cache, name)
+                setattr(cache, name, 0)
+        self.reset()
+        return counters
+
+    # -------------------------------------------------------------------------
+    # merge
+    # add the counters taken from another RunStats (a worker's)
+    # -------------------------------------------------------------------------
+    def merge(self, counters):
+        if not counters or not self.enabled:
+            return
+        for name, value in counters['seconds'].items():
+            self.seconds[name] += value
+        for name, value in counters['calls'].items():
+            self.calls[name] += value
+        for bucket, value in counters['buckets'].items():
+            self.buckets[bucket] += value
+        for name, value in counters['cache'].items():
+            self.cache[name] += value
+        self.documents += counters['documents']
+        self.statements += counters['statements']
+        self.max_statements = max(self.max_statements, counters['max_statements'])
+        if counters['min_statements'] is not None:
+            self.min_statements = counters['min_statements'] if self.min_statements is None else \
+                min(self.min_statements, counters['min_statements'])
+
+    # -------------------------------------------------------------------------
+    # report
+    # the counters as a json-serializable dict, with the hit rate of a vector
+    # cache and the peak memory of this process and its finished children
+    # -------------------------------------------------------------------------
+    def report(self, cache=None):
+        elapsed = time.perf_counter() - self.start
+        phases = {}
+        for name in sorted(self.seconds):
+            phases[name] = {'seconds': self.seconds[name], 'calls': self.calls[name],
+                            'share': self.seconds[name] / elapsed if elapsed else 0.0}
+        counts = dict(self.cache)
+        if cache is not None:
+            for name in CACHE_COUNTERS:
+                counts[name] += getattr(cache, name)
+        lookups = counts['hits'] + counts['misses']
+        bucket_labels = {}
+        for bucket in sorted(self.buckets):
+            label = '0' if bucket == 0 else '%d-%d' % (1 << (bucket - 1), (1 << bucket) - 1)
+            bucket_labels[label] = self.buckets[bucket]
+        return {
+            'elapsed_seconds': elapsed,
+            'phases': phases,
+            'other_seconds': max(0.0, elapsed - sum(self.seconds.values())),
+            'cache': dict(counts, hit_rate=counts['hits'] / lookups if lookups else None,
+                          entries=len(cache) if cache is not None else None),
+            'documents': {
+                'count': self.documents,
+                'statements': self.statements,
+                'mean_statements': self.statements / self.documents if self.documents else None,
+                'min_statements': self.min_statements,
+                'max_statements': self.max_statements,
+                'statements_histogram': bucket_labels,
+            },
+            'memory': peak_memory(),
+        }
+
+
+# -----------------------------------------------------------------------------
+# peak_memory
+# peak resident set size in MiB of this process and of its waited-for
+# children (such as the workers of a pool), where the platform tells
+# -----------------------------------------------------------------------------
+def peak_memory():
+    if resource is None:
+        return {'peak_rss_mb': None, 'children_peak_rss_mb': None}
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / float(1 << 20),
+        'children_peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / float(1 << 20),
+    }
@@ -0,0 +1,101 @@
+# -----------------------------------------------------------------------------
+# triples.py
+# sinks receiving the (name, key, cargo) triples of a DataFingerprint
+# traversal in chunks
+#
+# Triples are only produced when a sink is given, so a plain fingerprinting
+# run materializes none. A sink buffers chunk_size triples and hands them on
+# at once: to a callback (or a list, which is extended) or, formatted like
+# tripler.py's .triple files, to a text file in a single write per chunk.
+# -----------------------------------------------------------------------------
+CHUNK_SIZE = 4096
+
+
+# -----------------------------------------------------------------------------
+# reformat
+# a triple item as written in .triple files: ints bare, the rest quoted
+# -----------------------------------------------------------------------------
+def reformat(value):
+    if isinstance(value, int):
+        return str(value)
+    return '"{}"'.format(value)
+
+
+# -----------------------------------------------------------------------------
+# format_triple
+# one tab-delimited .triple line
+# -----------------------------------------------------------------------------
+def format_triple(triple):
+    return '\t'.join(reformat(item) for item in triple) + '\n'
+
+
+class TripleSink(object):
+    """Buffer triples and pass them to a callback in chunks."""
+    def __init__(self, callback=None, chunk_size=CHUNK_SIZE):
+        self.callback = callback
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    # add
+    # buffer one triple, passing the buffer on once it holds chunk_size
+    # -------------------------------------------------------------------------
+    def add(self, name, key, cargo):
+        self.buffer.append((name, key, cargo))
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    # -------------------------------------------------------------------------
+    # flush
+    # pass on the buffered triples
+    # -------------------------------------------------------------------------
+    def flush(self):
+        if self.buffer:
+            self.count += len(self.buffer)
+            self.write(self.buffer)
+            self.buffer = []
+
+    def write(self, chunk):
+        self.callback(chunk)
+
+    def close(self):
+        self.flush()
+
+
+class TextTripleSink(TripleSink):
+    """Write triples to a .triple text file (a path or an open file)."""
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        super(TextTripleSink, self).__init__(None, chunk_size)
+        self.owned = isinstance(file, str)
+        self.file = open(file, 'w') if self.owned else file
+
+    def write(self, chunk):
+        self.file.write(''.join(format_triple(t) for t in chunk))
+
+    def close(self):
+        self.flush()
+        if self.owned:
+            self.file.close()
+
+
+# -----------------------------------------------------------------------------
+# make_sink
+# a sink from a TripleSink, a file path, a list to extend or a callback
+# -----------------------------------------------------------------------------
+def make_sink(sink, chunk_size=CHUNK_SIZE):
+    if sink is None or isinstance(sink, TripleSink):
+        return sink
+    if isinstance(sink, str):
+        return TextTripleSink(sink, chunk_size)
+    if isinstance(sink, list):
+        return TripleSink(sink.extend, chunk_size)
+    if callable(sink):
+        return TripleSink(sink, chunk_size)
+    raise ValueError("Cannot use %r as a triple sink" % (sink,))
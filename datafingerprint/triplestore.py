@@ -0,0 +1,355 @@
+# -----------------------------------------------------------------------------
+# triplestore.py
+# compact binary store of the (name, key, cargo) triples of many documents
+#
+# Every distinct token (string or number) is interned once; triples are
+# stored as rows of three int32 token ids. A store is a directory holding
+#   meta.json          version and counts
+#   tokens.bin         the token keys (see vector_store.token_key), which keep
+#                      the type of a token: "1" and 1 are different tokens
+#   token_offsets.npy  offsets of each token key in tokens.bin (int64, T+1)
+#   triples.bin        token ids of the triples (int32, N x 3)
+#   documents.npy      offsets of each document's triples (int64, D+1)
+#   ids.txt            the document ids, one per line
+# Writers buffer triples and write them in bulk; readers memory-map
+# triples.bin and tokens.bin.
+#
+# The triples are those of DataFingerprint's traversal (as written by
+# --tripler), so they are the statements the fingerprint is made of. With
+# several workers each writes a part store for a chunk of the files and the
+# parts are merged, remapping their token ids, into one store.
+#
+# USAGE: python3 -m datafingerprint.triplestore -i <json_dir> -o <store> [--workers 4]
+#        python3 -m datafingerprint.triplestore -i <dir_of_.triple_files> -o <store> --from-text
+# -----------------------------------------------------------------------------
+import click
+import json
+import multiprocessing
+import os
+import shutil
+import numpy as np
+from datafingerprint.readers import input_name, list_inputs, open_text
+from datafingerprint.triples import TripleSink
+from datafingerprint.vector_store import token_key
+
+STORE_VERSION = 1
+TRIPLE_DTYPE = np.dtype('<i4')
+
+
+# -----------------------------------------------------------------------------
+# token_value
+# the string or number a token key stands for
+# -----------------------------------------------------------------------------
+def token_value(key):
+    text = key[1:].decode('utf-8', 'surrogatepass')
+    if key[:1] == b's':
+        return text
+    if text in ('True', 'False'):
+        return text == 'True'
+    if text == 'None':
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+# -----------------------------------------------------------------------------
+# parse_text_value
+# a triple item as written in .triple files: quoted strings (and floats,
+# which encode like numeric strings), bare ints and booleans
+# -----------------------------------------------------------------------------
+def parse_text_value(item):
+    if len(item) >= 2 and item[0] == '"' and item[-1] == '"':
+        return item[1:-1]
+    if item in ('True', 'False'):
+        return item == 'True'
+    return int(item)
+
+
+# -----------------------------------------------------------------------------
+# read_text_triples
+# the triples of a .triple text file
+# -----------------------------------------------------------------------------
+def read_text_triples(path):
+    triples = []
+    with open_text(path) as f:
+        for line in f:
+            items = line.rstrip('\n').split('\t')
+            if len(items) == 3:
+                triples.append(tuple(parse_text_value(item) for item in items))
+    return triples
+
+
+class TripleStoreWriter(object):
+    """Intern the triples of documents and write them to a new store."""
+    def __init__(self, path, buffer_size=1 << 16):
+        self.path = path
+        os.makedirs(path)
+        self.buffer_size = buffer_size
+        self.tokens = {}
+        self.keys = []
+        self.buffer = []
+        self.count = 0
+        self.offsets = [0]
+        self.ids = []
+        self.file = open(os.path.join(path, 'triples.bin'), 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    # intern
+    # the id of a token, assigning the next one to a new token
+    # -------------------------------------------------------------------------
+    def intern(self, value):
+        key = token_key(value)
+        i = self.tokens.get(key)
+        if i is None:
+            i = self.tokens[key] = len(self.keys)
+            self.keys.append(key)
+        return i
+
+    # -------------------------------------------------------------------------
+    # write
+    # intern and buffer a chunk of triples of the current document
+    # -------------------------------------------------------------------------
+    def write(self, chunk):
+        intern = self.intern
+        for name, key, cargo in chunk:
+            self.buffer.extend((intern(name), intern(key), intern(cargo)))
+        self.count += len(chunk)
+        if len(self.buffer) >= 3 * self.buffer_size:
+            self.flush()
+
+    # -------------------------------------------------------------------------
+    # sink
+    # a TripleSink feeding the current document, for DataFingerprint
+    # -------------------------------------------------------------------------
+    def sink(self, chunk_size=4096):
+        return TripleSink(self.write, chunk_size)
+
+    # -------------------------------------------------------------------------
+    # end_document
+    # close the current document under doc_id
+    # -------------------------------------------------------------------------
+    def end_document(self, doc_id):
+        self.offsets.append(self.count)
+        self.ids.append(doc_id)
+
+    def add_document(self, doc_id, triples):
+        self.write(triples)
+        self.end_document(doc_id)
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(np.array(self.buffer, dtype=TRIPLE_DTYPE).tobytes())
+            self.buffer = []
+
+    # -------------------------------------------------------------------------
+    # close
+    # write the buffered triples, the intern table and the documents
+    # -------------------------------------------------------------------------
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+        write_tokens(self.path, self.keys)
+        np.save(os.path.join(self.path, 'documents.npy'), np.array(self.offsets, dtype=np.int64))
+        with open(os.path.join(self.path, 'ids.txt'), 'w') as f:
+            f.write(''.join(str(i) + '\n' for i in self.ids))
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump({'version': STORE_VERSION, 'documents': len(self.ids), 'triples': self.count,
+                       'tokens': len(self.keys)}, f, indent=2)
+
+
+# -----------------------------------------------------------------------------
+# write_tokens
+# the token keys of a store and their offsets
+# -----------------------------------------------------------------------------
+def write_tokens(path, keys):
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(k) for k in keys])
+    np.save(os.path.join(path, 'token_offsets.npy'), offsets)
+    with open(os.path.join(path, 'tokens.bin'), 'wb') as f:
+        f.write(b''.join(keys))
+
+
+class TripleStore(object):
+    """A memory-mapped triple store."""
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != STORE_VERSION:
+            raise ValueError("Unsupported triple store version in " + str(path))
+        self.token_offsets = np.load(os.path.join(path, 'token_offsets.npy'))
+        self.token_bytes = np.memmap(os.path.join(path, 'tokens.bin'), dtype=np.uint8, mode='r') \
+            if self.token_offsets[-1] else np.zeros(0, dtype=np.uint8)
+        n = self.meta['triples']
+        self.triples = np.memmap(os.path.join(path, 'triples.bin'), dtype=TRIPLE_DTYPE, mode='r', shape=(n, 3)) \
+            if n else np.zeros((0, 3), dtype=TRIPLE_DTYPE)
+        self.offsets = np.load(os.path.join(path, 'documents.npy'))
+        with open(os.path.join(path, 'ids.txt')) as f:
+            self.ids = f.read().splitlines()
+
+    def __len__(self):
+        return len(self.ids)
+
+    # -------------------------------------------------------------------------
+    # key
+    # the key of token i
+    # -------------------------------------------------------------------------
+    def key(self, i):
+        return self.token_bytes[self.token_offsets[i]:self.token_offsets[i+1]].tobytes()
+
+    def keys(self):
+        data = self.token_bytes.tobytes()
+        return [data[self.token_offsets[i]:self.token_offsets[i+1]] for i in range(len(self.token_offsets) - 1)]
+
+    # -------------------------------------------------------------------------
+    # tokens
+    # the values of all tokens, indexed by token id
+    # -------------------------------------------------------------------------
+    def tokens(self):
+        return [token_value(k) for k in self.keys()]
+
+    # -------------------------------------------------------------------------
+    # document
+    # the token id triples (a view) of document number i
+    # -------------------------------------------------------------------------
+    def document(self, i):
+        return self.triples[self.offsets[i]:self.offsets[i+1]]
+
+    # -------------------------------------------------------------------------
+    # document_triples
+    # the (name, key, cargo) values of document number i
+    # -------------------------------------------------------------------------
+    def document_triples(self, i):
+        return [tuple(token_value(self.key(t)) for t in row) for row in self.document(i).tolist()]
+
+
+# -----------------------------------------------------------------------------
+# merge_stores
+# concatenate the documents of several stores into a new one, interning
+# their tokens again
+# -----------------------------------------------------------------------------
+def merge_stores(parts, path, chunk_rows=1 << 20):
+    os.makedirs(path)
+    tokens = {}
+    keys = []
+    offsets = [np.zeros(1, dtype=np.int64)]
+    ids = []
+    count = 0
+    with open(os.path.join(path, 'triples.bin'), 'wb') as f:
+        for part in parts:
+            store = TripleStore(part)
+            remap = np.empty(len(store.token_offsets) - 1, dtype=TRIPLE_DTYPE)
+            for i, key in enumerate(store.keys()):
+                j = tokens.get(key)
+                if j is None:
+                    j = tokens[key] = len(keys)
+                    keys.append(key)
+                remap[i] = j
+            for start in range(0, len(store.triples), chunk_rows):
+                f.write(remap[store.triples[start:start+chunk_rows]].tobytes())
+            offsets.append(store.offsets[1:] + count)
+            ids.extend(store.ids)
+            count += len(store.triples)
+    write_tokens(path, keys)
+    np.save(os.path.join(path, 'documents.npy'), np.concatenate(offsets))
+    with open(os.path.join(path, 'ids.txt'), 'w') as f:
+        f.write(''.join(i + '\n' for i in ids))
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'version': STORE_VERSION, 'documents': len(ids), 'triples': count, 'tokens': len(keys)}, f, indent=2)
+    return TripleStore(path)
+
+
+# -----------------------------------------------------------------------------
+# json_triples
+# (id, triples) of a json file as traversed by DataFingerprint, or None if
+# the file is empty or invalid
+# -----------------------------------------------------------------------------
+def json_triples(file):
+    from datafingerprint.datafingerprint import DataFingerprint
+    triples = []
+    # only the traversal is needed, not the vectors
+    dfp = DataFingerprint(debug=0, triple_sink=triples, encode=False)
+    if not dfp.fingerprint_document(file):
+        return None
+    dfp.triple_sink.flush()
+    return input_name(file), triples
+
+
+# -----------------------------------------------------------------------------
+# text_triples
+# (id, triples) of a .triple text file
+# -----------------------------------------------------------------------------
+def text_triples(file):
+    return input_name(file), read_text_triples(file)
+
+
+# -----------------------------------------------------------------------------
+# write_part
+# a store of the triples of a list of files
+# -----------------------------------------------------------------------------
+def write_part(path, files, extract):
+    with TripleStoreWriter(path) as writer:
+        for file in files:
+            record = extract(file)
+            if record is not None:
+                writer.add_document(*record)
+    return path
+
+
+# -----------------------------------------------------------------------------
+# build_store
+# extract the triples of files into a store, with a pool of workers each
+# writing a part store for a chunk of the files
+# -----------------------------------------------------------------------------
+def build_store(path, files, extract=json_triples, workers=1, chunk_size=None):
+    files = list(files)
+    if workers <= 1:
+        write_part(path, files, extract)
+        return TripleStore(path)
+    if chunk_size is None:
+        chunk_size = max(1, min(4096, len(files) // (workers * 4)))
+    tmp = path.rstrip(os.sep) + '.parts%d' % os.getpid()
+    os.makedirs(tmp)
+    try:
+        jobs = [(os.path.join(tmp, 'part%06d' % n), files[i:i+chunk_size], extract)
+                for n, i in enumerate(range(0, len(files), chunk_size))]
+        with multiprocessing.Pool(workers) as pool:
+            parts = pool.starmap(write_part, jobs)
+        return merge_stores(parts, path)
+    finally:
+        shutil.rmtree(tmp)
+
+
+# -------------------------------------------------------------------------
+# main
+# the parallel tripler: extract the triples of json files (or convert
+# .triple files) into one store
+# -------------------------------------------------------------------------
+@click.command()
+@click.option('--file_path', '--input', '-i', multiple=True, required=True,
+    help="JSON files or directories of JSON files (or of .triple files with --from-text)")
+@click.option('--output', '-o', required=True, help="Directory to write the triple store to")
+@click.option('--workers', default=1, type=click.IntRange(1, None), help="Number of worker processes")
+@click.option('--from-text/--from-json', default=False, help="Read .triple text files instead of JSON files")
+def main(file_path, output, workers, from_text):
+    extension = 'triple' if from_text else 'json'
+    files = []
+    for path in file_path:
+        files.extend(list_inputs(path, extension) if os.path.isdir(path) else [path])
+    store = build_store(output, files, text_triples if from_text else json_triples, workers)
+    print("Stored %d triples of %d documents (%d distinct tokens) in %s" %
+          (len(store.triples), len(store), len(store.token_offsets) - 1, output))
+
+
+if __name__ == '__main__':
+    main()
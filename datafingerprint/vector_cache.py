@@ -0,0 +1,107 @@
+# -----------------------------------------------------------------------------
+# vector_cache.py
+# bounded, per-encoder cache of token vectors for DataFingerprint.vector_value
+#
+# Strings and numbers are kept in separate LRU partitions with their own entry
+# limits: keys repeat a lot and are worth keeping, while high-cardinality
+# numbers mostly pollute the cache (LIBLPH.pm does not cache numbers at all,
+# the equivalent here is max_numbers=0). An optional byte budget applies to
+# both partitions together.
+# -----------------------------------------------------------------------------
+import sys
+from collections import OrderedDict
+
+
+class VectorCache(object):
+    def __init__(self, max_entries=100000, max_bytes=None, max_numbers=10000):
+        self.max_entries = max_entries      # string entries, None for no limit
+        self.max_bytes = max_bytes          # total bytes, None for no limit
+        self.max_numbers = max_numbers      # numeric entries, 0 disables caching
+        self.strings = OrderedDict()
+        self.numbers = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.strings) + len(self.numbers)
+
+    # -------------------------------------------------------------------------
+    # entry_size
+    # approximate memory held by one cache entry
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def entry_size(key, value):
+        return sys.getsizeof(key) + value.nbytes
+
+    # -------------------------------------------------------------------------
+    # get
+    # return the cached vector for key (marking it recently used) or None
+    # -------------------------------------------------------------------------
+    def get(self, key):
+        partition = self.strings if isinstance(key, str) else self.numbers
+        value = partition.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        partition.move_to_end(key)
+        self.hits += 1
+        return value
+
+    # -------------------------------------------------------------------------
+    # put
+    # store a vector, evicting least recently used entries over the budgets
+    # -------------------------------------------------------------------------
+    def put(self, key, value):
+        if isinstance(key, str):
+            partition, limit = self.strings, self.max_entries
+        else:
+            partition, limit = self.numbers, self.max_numbers
+        if limit == 0 or key in partition:
+            return
+        partition[key] = value
+        self.nbytes += self.entry_size(key, value)
+        if limit is not None and len(partition) > limit:
+            self.evict(partition)
+        if self.max_bytes is not None:
+            while self.nbytes > self.max_bytes and len(self):
+                # trim whichever partition is larger
+                if len(self.strings) >= len(self.numbers):
+                    self.evict(self.strings)
+                else:
+                    self.evict(self.numbers)
+
+    # -------------------------------------------------------------------------
+    # evict
+    # drop the least recently used entry of a partition
+    # -------------------------------------------------------------------------
+    def evict(self, partition):
+        key, value = partition.popitem(last=False)
+        self.nbytes -= self.entry_size(key, value)
+        self.evictions += 1
+
+    # -------------------------------------------------------------------------
+    # clear
+    # drop all entries, keeping the counters
+    # -------------------------------------------------------------------------
+    def clear(self):
+        self.strings.clear()
+        self.numbers.clear()
+        self.nbytes = 0
+
+    # -------------------------------------------------------------------------
+    # stats
+    # hit/miss/eviction counters and current size
+    # -------------------------------------------------------------------------
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'strings': len(self.strings),
+            'numbers': len(self.numbers),
+            'bytes': self.nbytes,
+        }
@@ -0,0 +1,183 @@
+# -----------------------------------------------------------------------------
+# vector_store.py
+# persistent, memory-mapped token -> vector table shared across runs and
+# worker processes
+#
+# A store is a directory holding
+#   meta.json     fingerprint lengths and encoding parameters it was built for
+#   hashes.npy    sorted 64-bit hashes of the token keys (uint64, N)
+#   vectors.npy   token vectors in hash order (float64, N x sum of lengths)
+#   offsets.npy   offsets of each token key in tokens.bin (int64, N+1)
+#   tokens.bin    the token keys, used to rule out hash collisions
+# The arrays are opened with mmap_mode='r', so any number of processes share
+# one copy in the page cache and a fresh worker starts warm.
+#
+# USAGE: python3 -m datafingerprint.vector_store -i <json_dir_or_file> -o <store>
+# -----------------------------------------------------------------------------
+import click
+import hashlib
+import json
+import os
+import shutil
+from collections import Counter
+import numpy as np
+from datafingerprint.readers import list_inputs
+
+STORE_VERSION = 1
+
+
+# -----------------------------------------------------------------------------
+# token_key
+# type-tagged byte key of a token, so that "1" and 1 are stored apart
+# -----------------------------------------------------------------------------
+def token_key(o):
+    if isinstance(o, str):
+        return b's' + o.encode('utf-8', 'surrogatepass')
+    return b'n' + repr(o).encode('ascii')
+
+
+# -----------------------------------------------------------------------------
+# token_hash
+# stable 64-bit hash of a token key (python's hash() is salted per process)
+# -----------------------------------------------------------------------------
+def token_hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+# -----------------------------------------------------------------------------
+# encoding_parameters
+# the parameters of a DataFingerprint that determine its token vectors
+# -----------------------------------------------------------------------------
+def encoding_parameters(dfp):
+    return {'configs': dfp.config_parameters()}
+
+
+# -----------------------------------------------------------------------------
+# vocabulary
+# count the tokens vector_value will be asked for when fingerprinting obj
+# -----------------------------------------------------------------------------
+def vocabulary(obj, counts=None):
+    if counts is None:
+        counts = Counter()
+    if isinstance(obj, dict):
+        counts.update(obj.keys())
+        for cargo in obj.values():
+            vocabulary(cargo, counts)
+    elif isinstance(obj, list):
+        # array positions, array lengths and the elements themselves
+        counts.update(range(len(obj) + 1))
+        for item in obj:
+            vocabulary(item, counts)
+    elif obj is not None:
+        counts[obj] += 1
+    return counts
+
+
+class VectorStore(object):
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != STORE_VERSION:
+            raise ValueError("Unsupported vector store version in " + str(path))
+        self.parameters = {'configs': self.meta['configs']}
+        self.hashes = np.load(os.path.join(path, 'hashes.npy'), mmap_mode='r')
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        self.tokens = np.memmap(os.path.join(path, 'tokens.bin'), dtype=np.uint8, mode='r') \
+            if self.offsets[-1] else np.zeros(0, dtype=np.uint8)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.hashes)
+
+    # -------------------------------------------------------------------------
+    # check
+    # raise ValueError unless the store was built with the encoding of dfp
+    # -------------------------------------------------------------------------
+    def check(self, dfp):
+        expected = encoding_parameters(dfp)
+        if expected != self.parameters:
+            raise ValueError("Vector store %s was built for %s, not %s" % (self.path, self.parameters, expected))
+
+    # -------------------------------------------------------------------------
+    # get
+    # the stored vector of token o (a read-only view) or None
+    # -------------------------------------------------------------------------
+    def get(self, o):
+        key = token_key(o)
+        h = np.uint64(token_hash(key))
+        i = int(np.searchsorted(self.hashes, h))
+        while i < len(self.hashes) and self.hashes[i] == h:
+            if self.tokens[self.offsets[i]:self.offsets[i+1]].tobytes() == key:
+                self.hits += 1
+                return np.asarray(self.vectors[i])
+            i += 1
+        self.misses += 1
+        return None
+
+    # -------------------------------------------------------------------------
+    # build
+    # compute the vectors of tokens with dfp and write them as a store at path
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def build(path, tokens, dfp):
+        keys = {}
+        for o in tokens:
+            keys.setdefault(token_key(o), o)
+        items = sorted((token_hash(k), k) for k in keys)
+        hashes = np.array([h for h, k in items], dtype=np.uint64)
+        vectors = np.zeros((len(items), dfp.width))
+        for i, (h, k) in enumerate(items):
+            vectors[i] = dfp.compute_vector_value(keys[k])
+        offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(k) for h, k in items])
+
+        # write next to the target and swap in, so readers never see a partial store
+        tmp = path.rstrip(os.sep) + '.tmp%d' % os.getpid()
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, 'hashes.npy'), hashes)
+        np.save(os.path.join(tmp, 'vectors.npy'), vectors)
+        np.save(os.path.join(tmp, 'offsets.npy'), offsets)
+        with open(os.path.join(tmp, 'tokens.bin'), 'wb') as f:
+            for h, k in items:
+                f.write(k)
+        meta = encoding_parameters(dfp)
+        meta.update({'version': STORE_VERSION, 'count': len(items)})
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+        return VectorStore(path)
+
+
+# -------------------------------------------------------------------------
+# main
+# vocabulary pass over a corpus followed by building the store
+# -------------------------------------------------------------------------
+@click.command()
+@click.option('--file_path', '--input', '-i', multiple=True, required=True,
+    help="JSON files or directories of JSON files to collect the vocabulary from")
+@click.option('--output', '-o', required=True, help="Directory to write the vector store to")
+@click.option('--fp-length', default='13', help="The fingerprint length(s) the store is built for (e.g. 11,13).")
+@click.option('--min-count', default=2, help="Only store tokens seen at least this many times.")
+@click.option('--max-tokens', default=None, type=int, help="Only store the most frequent tokens.")
+def main(file_path, output, fp_length, min_count, max_tokens):
+    from datafingerprint.datafingerprint import DataFingerprint
+    dfp = DataFingerprint(length=fp_length, debug=0)
+    counts = Counter()
+    for path in file_path:
+        files = list_inputs(path, 'json') if os.path.isdir(path) else [path]
+        for file in files:
+            data = dfp.read_json(file)
+            if data:
+                vocabulary(data, counts)
+    tokens = [t for t, n in counts.most_common(max_tokens) if n >= min_count]
+    store = VectorStore.build(output, tokens, dfp)
+    print("Stored %d token vectors in %s" % (len(store), output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# -----------------------------------------------------------------------------
+# writers.py
+# buffered writers for blocks of fingerprints
+#
+# A writer takes (id, statements, fp) records one at a time or as blocks,
+# buffers them and writes each full buffer in one go, so a run writes its
+# output once, in streamed chunks. Formats:
+#   tsv  id, statements and the values printed with %.<decimal>f, tab
+#        delimited, as bin/LPH_*.pl write them; a whole block of values is
+#        formatted with one vectorized call
+#   npy  <base>.npy, the (N x L) float64 matrix, whose header is rewritten
+#        with the final shape on closing, and <base>.ids with one
+#        "id<TAB>statements" line per row
+#   fp   a serialized database <base>.db.fp/<base>.db.id (see fpdb.py), the
+#        statements kept as the ignored column; named apart from the tsv
+#        <base>.fp so that one does not overwrite the other
+# -----------------------------------------------------------------------------
+import numpy as np
+from datafingerprint.fpdb import FingerprintDB
+
+FORMATS = ('tsv', 'npy', 'fp')
+BUFFER_SIZE = 4096
+NPY_HEADER_SIZE = 128
+
+
+# -----------------------------------------------------------------------------
+# format_values
+# the values of a block of fingerprints as strings, %.<decimal>f
+# -----------------------------------------------------------------------------
+def format_values(fps, decimal=3):
+    fps = np.asarray(fps, dtype=float)
+    return np.char.mod('%%.%df' % decimal, fps.reshape(len(fps), -1))
+
+
+# -----------------------------------------------------------------------------
+# format_rows
+# tab-delimited lines for a block of records
+# -----------------------------------------------------------------------------
+def format_rows(ids, statements, fps, decimal=3):
+    values = format_values(fps, decimal).tolist()
+    return ''.join('%s\t%d\t%s\n' % (i, s, '\t'.join(v)) for i, s, v in zip(ids, statements, values))
+
+
+# -----------------------------------------------------------------------------
+# npy_header
+# a .npy header of fixed size for an (n x L) float64 matrix, so that it can
+# be rewritten in place once n is known
+# -----------------------------------------------------------------------------
+def npy_header(n, L):
+    header = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d, %d), }" % (n, L)
+    header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + np.uint16(len(header)).astype('<u2').tobytes() + header.encode('latin1')
+
+
+class FingerprintWriter(object):
+    """Buffer fingerprint records and write them in blocks with the write(ids, statements, fps) of a format."""
+    def __init__(self, base, L, decimal=3, buffer_size=BUFFER_SIZE):
+        self.base = base
+        self.L = L
+        self.decimal = decimal
+        self.buffer_size = buffer_size
+        self.ids = []
+        self.statements = []
+        self.fps = []
+        self.count = 0
+        self.open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    # add
+    # buffer one record, writing the buffer once it holds buffer_size
+    # -------------------------------------------------------------------------
+    def add(self, patient_id, statements, fp):
+        self.ids.append(patient_id)
+        self.statements.append(statements)
+        self.fps.append(fp)
+        if len(self.ids) >= self.buffer_size:
+            self.flush()
+
+    # -------------------------------------------------------------------------
+    # add_block
+    # buffer a block of records
+    # -------------------------------------------------------------------------
+    def add_block(self, ids, statements, fps):
+        self.flush()
+        fps = np.asarray(fps, dtype=float).reshape(-1, self.L)
+        for start in range(0, len(fps), self.buffer_size):
+            end = start + self.buffer_size
+            self.write(list(ids[start:end]), list(statements[start:end]), fps[start:end])
+            self.count += len(fps[start:end])
+
+    # -------------------------------------------------------------------------
+    # flush
+    # write the buffered records
+    # -------------------------------------------------------------------------
+    def flush(self):
+        if self.ids:
+            fps = np.array(self.fps, dtype=float).reshape(-1, self.L)
+            self.write(self.ids, self.statements, fps)
+            self.count += len(self.ids)
+            self.ids = []
+            self.statements = []
+            self.fps = []
+
+    def close(self):
+        self.flush()
+
+
+class TSVWriter(FingerprintWriter):
+    """Write fingerprints as tab-delimited text, like bin/LPH_*.pl."""
+    def open(self):
+        self.path = self.base + '.fp'
+        self.file = open(self.path, 'w')
+
+    def write(self, ids, statements, fps):
+        self.file.write(format_rows(ids, statements, fps, self.decimal))
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class NpyWriter(FingerprintWriter):
+    """Write fingerprints as a .npy matrix and a list of ids."""
+    def open(self):
+        self.path = self.base + '.npy'
+        self.file = open(self.path, 'wb')
+        self.file.write(npy_header(0, self.L))
+        self.id_file = open(self.base + '.ids', 'w')
+
+    def write(self, ids, statements, fps):
+        self.file.write(np.ascontiguousarray(fps, dtype='<f8').tobytes())
+        self.id_file.write(''.join('%s\t%d\n' % (i, s) for i, s in zip(ids, statements)))
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.seek(0)
+            self.file.write(npy_header(self.count, self.L))
+            self.file.close()
+            self.id_file.close()
+
+
+class DBWriter(FingerprintWriter):
+    """Write fingerprints to a new serialized fingerprint database."""
+    def open(self):
+        self.path = self.base + '.db'
+        self.db = FingerprintDB.create(self.path, self.L)
+
+    def write(self, ids, statements, fps):
+        self.db.append(ids, fps, extra=[[s] for s in statements])
+
+
+WRITERS = {'tsv': TSVWriter, 'npy': NpyWriter, 'fp': DBWriter}
+
+
+class SplitWriter(object):
+    """Write the per-config parts of concatenated fingerprints to separate writers."""
+    def __init__(self, writers, segments):
+        self.writers = writers
+        self.segments = segments
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, patient_id, statements, fp):
+        for writer, seg in zip(self.writers, self.segments):
+            writer.add(patient_id, statements, fp[seg])
+
+    def add_block(self, ids, statements, fps):
+        fps = np.asarray(fps, dtype=float)
+        for writer, seg in zip(self.writers, self.segments):
+            writer.add_block(ids, statements, fps[:, seg])
+
+    def flush(self):
+        for writer in self.writers:
+            writer.flush()
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+# -----------------------------------------------------------------------------
+# open_writer
+# a writer for one of FORMATS
+# -----------------------------------------------------------------------------
+def open_writer(base, L, format='tsv', decimal=3, buffer_size=BUFFER_SIZE):
+    if format not in WRITERS:
+        raise ValueError('Unknown output format "%s", use one of %s' % (format, ', '.join(FORMATS)))
+    return WRITERS[format](base, L, decimal, buffer_size)
@@ -0,0 +1,124 @@
+# -----------------------------------------------------------------------------
+# xml_reader.py
+# XML input for DataFingerprint, mapped onto the dict/list model of json
+#
+# Elements are mapped as XML::Simple does for bin/LPH_XML.pl (ForceArray
+# off): an element becomes a dict of its attributes and child elements, a
+# child element that occurs more than once becomes a list in document order,
+# text next to attributes or children is kept as 'content' (a list if it is
+# split by child elements), and an element with text only becomes that text
+# (an empty one, an empty dict). Namespaces
+# are dropped from names. As with XMLin, a document is the data of its root
+# element, whose tag is dropped.
+#
+# iter_xml_records parses incrementally (iterparse) and yields one record
+# at a time: the children of the root element (as in PubMed's
+# PubmedArticleSet/PubmedArticle), or every outermost element with a given
+# tag. Elements are cleared as soon as they have been converted, so memory
+# is bounded by the size of one record, not of the file.
+# -----------------------------------------------------------------------------
+import re
+import xml.etree.ElementTree as ET
+from datafingerprint.readers import COMPRESSED, clean_id, open_input
+
+XML_FILE = re.compile(r'\.xml(%s)?$' % '|'.join(re.escape(s) for s in COMPRESSED), re.IGNORECASE)
+
+
+# -----------------------------------------------------------------------------
+# is_xml
+# whether a path names an (optionally compressed) .xml file
+# -----------------------------------------------------------------------------
+def is_xml(path):
+    return bool(XML_FILE.search(str(path)))
+
+
+# -----------------------------------------------------------------------------
+# local_name
+# a tag or attribute name without its namespace
+# -----------------------------------------------------------------------------
+def local_name(name):
+    return name.rsplit('}', 1)[-1]
+
+
+# -----------------------------------------------------------------------------
+# element_data
+# the dict, list or string an element is mapped to
+# -----------------------------------------------------------------------------
+def element_data(elem):
+    data = {}
+    for name, value in elem.attrib.items():
+        data[local_name(name)] = value
+    for child in elem:
+        name = local_name(child.tag)
+        value = element_data(child)
+        if name not in data:
+            data[name] = value
+        elif isinstance(data[name], list):
+            data[name].append(value)
+        else:
+            data[name] = [data[name], value]
+    # the text of mixed content is in the element's text and its children's tails
+    texts = [t.strip() for t in [elem.text] + [child.tail for child in elem] if t and t.strip()]
+    text = texts[0] if len(texts) == 1 else texts
+    if not data:
+        return text if text else {}
+    if text:
+        data['content'] = text
+    return data
+
+
+# -----------------------------------------------------------------------------
+# read_xml
+# the data of a whole xml document
+# -----------------------------------------------------------------------------
+def read_xml(path):
+    with open_input(path) as stream:
+        return element_data(ET.parse(stream).getroot())
+
+
+# -----------------------------------------------------------------------------
+# pop_path
+# remove and return the value at a '/'-separated path of keys, or None
+# -----------------------------------------------------------------------------
+def pop_path(data, path):
+    keys = path.split('/')
+    for key in keys[:-1]:
+        data = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(data, dict):
+        return None
+    value = data.get(keys[-1])
+    if value is None or isinstance(value, (list, dict)):
+        return None
+    return data.pop(keys[-1])
+
+
+# -----------------------------------------------------------------------------
+# iter_xml_records
+# yield (id, data) for the records of an xml file, read incrementally; the
+# id is taken (and removed) from id_field, a '/'-separated path of keys
+# such as MedlineCitation/PMID, else it is the number of the record
+# -----------------------------------------------------------------------------
+def iter_xml_records(path, record_tag=None, id_field=None):
+    stack = []
+    inside = 0
+    n = 0
+    with open_input(path) as stream:
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                if inside or (local_name(elem.tag) == record_tag if record_tag else len(stack) == 1):
+                    inside += 1
+                stack.append(elem)
+                continue
+            stack.pop()
+            if inside:
+                inside -= 1
+                if inside:
+                    continue
+                data = element_data(elem)
+                record_id = pop_path(data, id_field) if id_field else None
+                yield clean_id(n if record_id is None else record_id), data
+                n += 1
+            # nothing outside a record is needed once it has ended
+            elem.clear()
+            if stack:
+                del stack[-1][:]
@@ -0,0 +1,67 @@
+# -----------------------------------------------------------------------------
+# benchmark_accumulator.py
+# compare statements/sec of recurse_structure using the blocked triple
+# accumulator against the original per-element add_vector_value loop
+#
+# USAGE: python3 scripts/benchmark_accumulator.py [n_records]
+# -----------------------------------------------------------------------------
+import sys
+import time
+import numpy as np
+
+sys.path.append('.')
+from datafingerprint.datafingerprint import DataFingerprint
+
+
+class LoopFingerprint(DataFingerprint):
+    # the original implementation: one interpreter iteration per position
+    def add_vector_value(self, v1, v2, v3, stuff=None):
+        length = self.width
+        fp = self.accumulator.fp
+        for i in range(length):
+            v = (v1[i] + v2[int((i+1) % length)] + v3[int((i+2) % length)])/3
+            fp[i] += v
+
+
+# -----------------------------------------------------------------------------
+# make_document
+# a flat-ish document with a mix of repeated keys, strings and numbers
+# -----------------------------------------------------------------------------
+def make_document(n_records, seed=1):
+    rng = np.random.RandomState(seed)
+    words = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta']
+    rows = []
+    for i in range(n_records):
+        rows.append({
+            'id': 'record%d' % i,
+            'word': words[rng.randint(len(words))],
+            'value': round(float(rng.uniform(-1000, 1000)), 3),
+            'count': int(rng.randint(100)),
+            'tags': [words[j] for j in rng.randint(len(words), size=3)],
+        })
+    return {'rows': rows}
+
+
+def time_run(cls, doc, length):
+    dfp = cls(length=length, debug=0)
+    dfp.recurse_structure(doc)      # warm the vector cache
+    dfp.reset()
+    start = time.perf_counter()
+    dfp.recurse_structure(doc)
+    dfp.fp
+    elapsed = time.perf_counter() - start
+    return dfp.statements / elapsed
+
+
+def main():
+    n_records = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    doc = make_document(n_records)
+    print('L\tloop_statements_per_sec\tblocked_statements_per_sec\tspeedup')
+    for length in (13, 50, 200):
+        loop = time_run(LoopFingerprint, doc, length)
+        blocked = time_run(DataFingerprint, doc, length)
+        print('%d\t%.0f\t%.0f\t%.1fx' % (length, loop, blocked, blocked / loop))
+
+
+if __name__ == '__main__':
+    main()
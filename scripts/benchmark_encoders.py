@@ -0,0 +1,278 @@
+# -----------------------------------------------------------------------------
+# benchmark_encoders.py
+# throughput of the DataFingerprint encoder on synthetic documents of a
+# configurable shape, written as JSON so runs of two commits can be compared
+#
+# The generator makes nested documents with a given depth, fan-out (keys per
+# object), array length, string length and cardinality (number of distinct
+# strings) and share of numeric leaves. For every fingerprint length it
+# times vector_value per encoding (uncached and cached), add_vector_value,
+# recurse_structure and an end-to-end process() of a directory of documents.
+# Each timing is the best of --repeat runs.
+#
+# USAGE: python3 scripts/benchmark_encoders.py [-L 13,50,200] [-o results.json]
+#        python3 scripts/benchmark_encoders.py --compare base.json new.json
+# -----------------------------------------------------------------------------
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import click
+import numpy as np
+
+sys.path.append('.')
+from datafingerprint.datafingerprint import DataFingerprint
+
+NUMERIC_ENCODINGS = ('ME', 'ML', 'smooth')
+STRING_ENCODINGS = ('decay', 'pair_sum')
+
+
+class DocumentGenerator(object):
+    """Random nested json documents of a configurable shape."""
+    def __init__(self, depth=3, fanout=5, array_length=4, string_length=8, cardinality=1000,
+                 numeric_share=0.5, seed=1):
+        self.depth = depth
+        self.fanout = fanout
+        self.array_length = array_length
+        self.string_length = string_length
+        self.numeric_share = numeric_share
+        self.rng = np.random.RandomState(seed)
+        letters = np.array(list('abcdefghijklmnopqrstuvwxyz0123456789'))
+        self.strings = [''.join(self.rng.choice(letters, size=string_length)) for i in range(cardinality)]
+        self.keys = ['key%d' % i for i in range(max(fanout * 4, 1))]
+
+    # -------------------------------------------------------------------------
+    # leaf
+    # a random number (int or float over many magnitudes) or string
+    # -------------------------------------------------------------------------
+    def leaf(self):
+        if self.rng.uniform() < self.numeric_share:
+            if self.rng.uniform() < 0.5:
+                return int(self.rng.randint(-100000, 100000))
+            return float(self.rng.uniform(-1, 1) * 10 ** self.rng.randint(-5, 8))
+        return self.strings[self.rng.randint(len(self.strings))]
+
+    # -------------------------------------------------------------------------
+    # value
+    # an object of fanout keys whose values are nested objects (while depth
+    # remains), arrays of leaves or leaves
+    # -------------------------------------------------------------------------
+    def value(self, depth):
+        if depth <= 0:
+            return self.leaf()
+        obj = {}
+        for key in self.rng.choice(self.keys, size=self.fanout, replace=False):
+            kind = self.rng.randint(3)
+            if kind == 0:
+                obj[str(key)] = self.value(depth - 1)
+            elif kind == 1:
+                obj[str(key)] = [self.leaf() for i in range(self.array_length)]
+            else:
+                obj[str(key)] = self.leaf()
+        return obj
+
+    def document(self):
+        return self.value(self.depth)
+
+    def documents(self, n):
+        return [self.document() for i in range(n)]
+
+    def shape(self):
+        return {'depth': self.depth, 'fanout': self.fanout, 'array_length': self.array_length,
+                'string_length': self.string_length, 'cardinality': len(self.strings),
+                'numeric_share': self.numeric_share}
+
+
+# -----------------------------------------------------------------------------
+# best_time
+# the shortest of repeat runs of a function, after calling setup before each
+# -----------------------------------------------------------------------------
+def best_time(run, repeat, setup=None):
+    best = float('inf')
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def result(benchmark, L, count, elapsed, unit, **extra):
+    return dict(benchmark=benchmark, L=L, rate=count / elapsed, unit=unit, count=count, seconds=elapsed, **extra)
+
+
+# -----------------------------------------------------------------------------
+# bench_vector_value
+# values/sec of vector_value for each encoding, every value new to the cache
+# (encoding) and then cached
+# -----------------------------------------------------------------------------
+def bench_vector_value(generator, L, repeat, n_values=5000):
+    numbers = [generator.leaf() for i in range(n_values * 4)]
+    numbers = list(dict.fromkeys(o for o in numbers if not isinstance(o, str)))[:n_values]
+    strings = list(dict.fromkeys(generator.strings))[:n_values]
+    results = []
+    for encoding in NUMERIC_ENCODINGS + STRING_ENCODINGS:
+        if encoding in NUMERIC_ENCODINGS:
+            values, config = numbers, {'numeric_encoding': encoding}
+        else:
+            values, config = strings, {'string_encoding': encoding}
+        dfp = DataFingerprint(length=L, debug=0, encodings=[config], number_cache_size=len(values))
+
+        def run():
+            for o in values:
+                dfp.vector_value(o)
+        results.append(result('vector_value', L, len(values), best_time(run, repeat, dfp.clear_cache),
+                              'values/sec', encoding=encoding, cached=False))
+        results.append(result('vector_value', L, len(values), best_time(run, repeat),
+                              'values/sec', encoding=encoding, cached=True))
+    return results
+
+
+# -----------------------------------------------------------------------------
+# bench_add_vector_value
+# statements/sec of add_vector_value, including reducing them into fp
+# -----------------------------------------------------------------------------
+def bench_add_vector_value(L, repeat, n_statements=20000):
+    vectors = np.random.RandomState(2).uniform(size=(64, L))
+    dfp = DataFingerprint(length=L, debug=0)
+
+    def run():
+        for i in range(n_statements):
+            dfp.add_vector_value(vectors[i % 64], vectors[(i + 1) % 64], vectors[(i + 2) % 64])
+        dfp.fp
+    return [result('add_vector_value', L, n_statements, best_time(run, repeat, dfp.reset), 'statements/sec')]
+
+
+# -----------------------------------------------------------------------------
+# bench_recurse_structure
+# statements/sec of recurse_structure over documents, with the vector cache
+# emptied first (cold) and kept from a previous run (warm)
+# -----------------------------------------------------------------------------
+def bench_recurse_structure(documents, L, repeat):
+    dfp = DataFingerprint(length=L, debug=0)
+
+    def run():
+        for doc in documents:
+            dfp.recurse_structure(doc)
+            dfp.fp
+            dfp.reset()
+    statements = 0
+    for doc in documents:
+        dfp.recurse_structure(doc)
+        statements += dfp.statements
+        dfp.reset()
+
+    def cold():
+        dfp.reset()
+        dfp.clear_cache()
+    return [result('recurse_structure', L, statements, best_time(run, repeat, cold), 'statements/sec', cached=False),
+            result('recurse_structure', L, statements, best_time(run, repeat, dfp.reset), 'statements/sec',
+                   cached=True)]
+
+
+# -----------------------------------------------------------------------------
+# bench_process
+# documents/sec of process() on a directory of json files, output included
+# -----------------------------------------------------------------------------
+def bench_process(documents, L, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, doc in enumerate(documents):
+            with open(os.path.join(tmp, 'doc%06d.json' % n), 'w') as f:
+                json.dump(doc, f)
+
+        def run():
+            dfp = DataFingerprint(length=L, debug=0, file_paths=[tmp])
+            # process() echoes every fingerprint
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                dfp.process()
+        return [result('process', L, len(documents), best_time(run, repeat), 'documents/sec')]
+
+
+# -----------------------------------------------------------------------------
+# git_commit
+# the commit being benchmarked, if run from a git checkout
+# -----------------------------------------------------------------------------
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def key(r):
+    return (r['benchmark'], r['L'], r.get('encoding'), r.get('cached'))
+
+
+# -----------------------------------------------------------------------------
+# compare
+# print the rate of every benchmark of new relative to base; returns the
+# number slower than base by more than tolerance
+# -----------------------------------------------------------------------------
+def compare(base, new, tolerance):
+    base_rates = dict((key(r), r['rate']) for r in base['results'])
+    regressions = 0
+    print('benchmark\tL\tencoding\tcached\tbase\tnew\tratio')
+    for r in new['results']:
+        if key(r) not in base_rates:
+            continue
+        ratio = r['rate'] / base_rates[key(r)]
+        slower = ratio < 1 - tolerance
+        regressions += slower
+        print('%s\t%d\t%s\t%s\t%.0f\t%.0f\t%.2f%s' % (r['benchmark'], r['L'], r.get('encoding', '-'),
+              r.get('cached', '-'), base_rates[key(r)], r['rate'], ratio, '\tSLOWER' if slower else ''))
+    return regressions
+
+
+@click.command()
+@click.option('--lengths', '-L', default='13,50,200', help="Comma-separated fingerprint lengths")
+@click.option('--documents', default=200, help="Number of documents for recurse_structure and process")
+@click.option('--depth', default=3, help="Nesting depth of objects")
+@click.option('--fanout', default=5, help="Keys per object")
+@click.option('--array-length', default=4, help="Elements per array")
+@click.option('--string-length', default=8, help="Characters per string")
+@click.option('--cardinality', default=1000, help="Number of distinct strings")
+@click.option('--numeric-share', default=0.5, help="Share of numeric leaves")
+@click.option('--repeat', default=3, help="Runs per timing, the best is kept")
+@click.option('--seed', default=1)
+@click.option('--output', '-o', default=None, help="Write the results to this file instead of stdout")
+@click.option('--compare', 'compare_files', nargs=2, default=None,
+    help="Compare two result files (base, new) instead of benchmarking")
+@click.option('--tolerance', default=0.1, help="With --compare, the slowdown reported as a regression")
+def main(lengths, documents, depth, fanout, array_length, string_length, cardinality, numeric_share, repeat, seed,
+         output, compare_files, tolerance):
+    if compare_files:
+        with open(compare_files[0]) as f, open(compare_files[1]) as g:
+            sys.exit(1 if compare(json.load(f), json.load(g), tolerance) else 0)
+    generator = DocumentGenerator(depth, fanout, array_length, string_length, cardinality, numeric_share, seed)
+    docs = generator.documents(documents)
+    results = []
+    for L in DataFingerprint.parse_lengths(lengths):
+        results.extend(bench_vector_value(generator, L, repeat))
+        results.extend(bench_add_vector_value(L, repeat))
+        results.extend(bench_recurse_structure(docs, L, repeat))
+        results.extend(bench_process(docs, L, repeat))
+        sys.stderr.write('L=%d done\n' % L)
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'shape': dict(generator.shape(), documents=documents, seed=seed),
+        'repeat': repeat,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
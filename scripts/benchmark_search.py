@@ -0,0 +1,78 @@
+# -----------------------------------------------------------------------------
+# benchmark_search.py
+# compare comparisons/sec of bin/fpc and datafingerprint.search on the same
+# random all-against-all serialized database
+#
+# fpc writes every pair as text, so it is timed writing to /dev/null; the
+# python engine is timed computing all tiles only, keeping pairs above a
+# cutoff, and writing every pair in fpc's format.
+#
+# USAGE: python3 scripts/benchmark_search.py [n_fingerprints] [L]
+# -----------------------------------------------------------------------------
+import sys
+import os
+import subprocess
+import tempfile
+import time
+import numpy as np
+
+sys.path.append('.')
+from datafingerprint.fpdb import FingerprintDB
+from datafingerprint.search import correlation_blocks, search
+
+FPC = os.path.join('bin', 'fpc')
+
+
+# -----------------------------------------------------------------------------
+# make_database
+# a database of n random fingerprints of length L
+# -----------------------------------------------------------------------------
+def make_database(path, n, L, seed=1):
+    rng = np.random.RandomState(seed)
+    db = FingerprintDB.create(path, L)
+    for start in range(0, n, 100000):
+        count = min(100000, n - start)
+        db.append(['fp%d' % i for i in range(start, start + count)], rng.uniform(size=(count, L)))
+    return FingerprintDB(path)
+
+
+def rate(comparisons, run):
+    start = time.perf_counter()
+    run()
+    return comparisons / (time.perf_counter() - start)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    L = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    comparisons = n * (n - 1) // 2
+    with tempfile.TemporaryDirectory() as tmp:
+        db = make_database(os.path.join(tmp, 'db'), n, L)
+        fps = db.vectors()
+
+        def fpc():
+            with open(os.devnull, 'w') as out:
+                subprocess.check_call([FPC, db.fp_path], stdout=out)
+
+        def tiles():
+            for q0, t0, C in correlation_blocks(fps):
+                pass
+
+        def cutoff():
+            sum(len(c) for qi, ti, c in search(fps, cutoff=0.5))
+
+        def text():
+            with open(os.devnull, 'w') as out:
+                for qi, ti, c in search(fps):
+                    out.write(''.join('%d\t%d\t%.6f\n' % t for t in zip(qi + 1, ti + 1, c)))
+
+        print('mode\tcomparisons_per_sec')
+        if os.path.exists(FPC):
+            print('fpc\t%.0f' % rate(comparisons, fpc))
+        print('python_tiles\t%.0f' % rate(comparisons, tiles))
+        print('python_cutoff_0.5\t%.0f' % rate(comparisons, cutoff))
+        print('python_text\t%.0f' % rate(comparisons, text))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+# -----------------------------------------------------------------------------
+# benchmark_search_scale.py
+# search engines on synthetic serialized fingerprint databases of realistic
+# size (millions of entries), extending the idea of pseudoFP.py
+#
+# generate writes a target database <base>.fp/.id and a query database
+# <base>.query.fp/.id, a chunk at a time, so databases of tens of millions
+# of fingerprints never have to fit in memory. Fingerprints are drawn around
+# --clusters random centres (spread by --spread, cluster sizes skewed by
+# --skew) and ranked as serializeLPH.pl does; the cluster of every entry is
+# kept as the extra column of the .id file. The records are written in .id
+# order, so FingerprintDB opens them without reading the .id file.
+#
+# run times, each in a process of its own so that its peak RSS can be told:
+#   query_vs_target_topk    exact k best targets of every query
+#   query_vs_target_cutoff  all query/target pairs above --cutoff
+#   all_vs_all_topk         k best of every entry within the first
+#                           --all-vs-all entries of the target
+#   all_vs_all_cutoff       pairs above --cutoff within the same entries
+#   ivf_build, ivf_nprobe_* the approximate index of ivf.py, with its
+#                           recall@k against the exact top k
+#   fpc, searchLPHs         bin/fpc and bin/searchLPHs.pl on the query and
+#                           target databases, if present (--external)
+# and writes comparisons/sec and peak RSS of each as JSON.
+#
+# USAGE: python3 scripts/benchmark_search_scale.py generate <base> --entries 1000000 -L 50
+#        python3 scripts/benchmark_search_scale.py run <base> [-o results.json]
+# -----------------------------------------------------------------------------
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import click
+import numpy as np
+
+sys.path.append('.')
+from datafingerprint.fpdb import FP_VERSION, HEADER_SIZE, RANK_DTYPE, FingerprintDB, db_paths, ranks
+from datafingerprint.ivf import IVFIndex, recall
+from datafingerprint.report import PerQueryTopK
+from datafingerprint.search import DEFAULT_BLOCK_SIZE, correlation_blocks, prepare, search
+from datafingerprint.stats import peak_memory
+
+CHUNK_SIZE = 100000
+FPC = os.path.join('bin', 'fpc')
+SEARCH_LPHS = os.path.join('bin', 'searchLPHs.pl')
+
+
+# -----------------------------------------------------------------------------
+# write_database
+# stream n fingerprints around the cluster centres to a database, chunk by
+# chunk; returns the number written
+# -----------------------------------------------------------------------------
+def write_database(path, n, centres, weights, spread, rng, prefix='fp'):
+    base, fp_path, id_path = db_paths(path)
+    L = centres.shape[1]
+    with open(fp_path, 'wb') as fp_file, open(id_path, 'wb') as id_file:
+        id_file.write(('#created\t%s\n#version\t%s\n#L\t%d\n' %
+                       (time.strftime('%a %b %d %H:%M:%S %Z %Y'), FP_VERSION, L)).encode())
+        fp_file.write(np.array([L], dtype=np.dtype('<i4')).tobytes())
+        for start in range(0, n, CHUNK_SIZE):
+            count = min(CHUNK_SIZE, n - start)
+            clusters = rng.choice(len(centres), size=count, p=weights)
+            values = centres[clusters] + spread * rng.standard_normal((count, L))
+            fp_file.write(ranks(values).astype(RANK_DTYPE).tobytes())
+            seeks = HEADER_SIZE + (start + np.arange(count, dtype=np.int64)) * L * RANK_DTYPE.itemsize
+            id_file.write(''.join('%d\t%s%d\t%d\n' % (seek, prefix, start + i, c)
+                                  for i, (seek, c) in enumerate(zip(seeks, clusters))).encode())
+    return n
+
+
+# -----------------------------------------------------------------------------
+# isolated
+# run function(*args) in a forked process; its result with the seconds it
+# took and the peak RSS of that process
+# -----------------------------------------------------------------------------
+def isolated(function, *args):
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        return pool.apply(measure, (function,) + args)
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    result['seconds'] = time.perf_counter() - start
+    result['peak_rss_mb'] = peak_memory()['peak_rss_mb']
+    return result
+
+
+# -----------------------------------------------------------------------------
+# external
+# run a command with its output discarded; the seconds it took and its peak
+# RSS in MiB
+# -----------------------------------------------------------------------------
+def external(command):
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as out:
+        process = subprocess.Popen(command, stdout=out)
+        pid, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    if status:
+        raise subprocess.CalledProcessError(status, command)
+    return {'seconds': seconds, 'peak_rss_mb': usage.ru_maxrss / 1024.0}
+
+
+# -----------------------------------------------------------------------------
+# searched
+# the query and target vectors of a search: the query database against the
+# target, or (without a query) the first n entries of the target all
+# against all; opened in the process that searches, so no vectors are copied
+# -----------------------------------------------------------------------------
+def searched(query_path, target_path, n=None):
+    target = FingerprintDB(target_path).vectors()
+    if query_path is None:
+        return target[:n], None
+    return np.asarray(FingerprintDB(query_path).vectors()), target
+
+
+def top_k(query_path, target_path, k, block_size, n=None):
+    query, target = searched(query_path, target_path, n)
+    best = PerQueryTopK(k, len(query))
+    for q0, t0, C in correlation_blocks(query, target, block_size):
+        best.add(q0, t0, C, target is None)
+    order = np.argsort(-best.c, axis=1, kind='stable')
+    return {'found': np.take_along_axis(best.t, order, axis=1)}
+
+
+def cutoff_pairs(query_path, target_path, cutoff, block_size, n=None):
+    query, target = searched(query_path, target_path, n)
+    return {'pairs': int(sum(len(c) for qi, ti, c in search(query, target, cutoff, block_size)))}
+
+
+def ivf_build(index_path, db_path, nlist):
+    IVFIndex.build(index_path, FingerprintDB(db_path), nlist)
+    return {}
+
+
+def ivf_search(index_path, query_path, db_path, k, nprobe):
+    found, scores = IVFIndex(index_path, FingerprintDB(db_path)).search(FingerprintDB(query_path).vectors(), k, nprobe)
+    return {'found': found}
+
+
+# -----------------------------------------------------------------------------
+# rate
+# a result with its number of comparisons and comparisons per second
+# -----------------------------------------------------------------------------
+def rate(r, comparisons):
+    return dict(r, comparisons=comparisons, comparisons_per_sec=comparisons / r['seconds'])
+
+
+@click.group()
+def main():
+    pass
+
+
+# -------------------------------------------------------------------------
+# generate
+# write the target and query databases of a clustered synthetic collection
+# -------------------------------------------------------------------------
+@main.command()
+@click.argument('base')
+@click.option('--entries', default=1000000, help="Fingerprints in the target database")
+@click.option('--queries', default=1000, help="Fingerprints in the query database")
+@click.option('--fp-length', '-L', default=50, help="Fingerprint length")
+@click.option('--clusters', default=1000, help="Number of cluster centres")
+@click.option('--spread', default=0.3, help="Standard deviation of fingerprints around their centre (centres are uniform in [0, 1))")
+@click.option('--skew', default=1.0, help="Cluster i is drawn with weight 1 / (i + 1)^skew; 0 for clusters of equal size")
+@click.option('--seed', default=1)
+def generate(base, entries, queries, fp_length, clusters, spread, skew, seed):
+    rng = np.random.RandomState(seed)
+    centres = rng.uniform(size=(clusters, fp_length))
+    weights = 1.0 / np.arange(1, clusters + 1) ** skew
+    weights /= weights.sum()
+    start = time.perf_counter()
+    write_database(base, entries, centres, weights, spread, rng)
+    seconds = time.perf_counter() - start
+    write_database(base + '.query', queries, centres, weights, spread, rng, 'query')
+    print("Wrote %d fingerprints (%.0f per second, %.1f MiB) and %d queries" %
+          (entries, entries / seconds, os.path.getsize(base + '.fp') / float(1 << 20), queries))
+
+
+# -------------------------------------------------------------------------
+# run
+# time every search of the generated databases at base
+# -------------------------------------------------------------------------
+@main.command()
+@click.argument('base')
+@click.option('--k', default=10, help="Matches per query for the top-k searches")
+@click.option('--cutoff', default=0.9, help="Correlation cutoff of the cutoff searches")
+@click.option('--all-vs-all', 'all_vs_all', default=20000, help="Entries of the target searched all against all")
+@click.option('--nprobe', default='1,4,16', help="Comma-separated numbers of cells probed by the ivf index, empty to skip it")
+@click.option('--nlist', default=None, type=int, help="Cells of the ivf index (default 4 sqrt(N))")
+@click.option('--block-size', default=DEFAULT_BLOCK_SIZE, help="Fingerprints per block of the exact searches")
+@click.option('--external/--no-external', 'external_engines', default=True, help="Also time bin/fpc and bin/searchLPHs.pl when present")
+@click.option('--output', '-o', default=None, help="Write the results to this file instead of stdout")
+def run(base, k, cutoff, all_vs_all, nprobe, nlist, block_size, external_engines, output):
+    target = FingerprintDB(base)
+    query = FingerprintDB(base + '.query')
+    nq, n = len(query), len(target)
+    subset = min(all_vs_all, n)
+    pairs = subset * (subset - 1) // 2
+    results = {}
+
+    def note(name, result):
+        # the matches themselves are only needed for recall
+        results[name] = dict((key, value) for key, value in result.items() if key != 'found')
+        if 'comparisons_per_sec' in result:
+            sys.stderr.write('%s\t%.0f comparisons/sec\n' % (name, result['comparisons_per_sec']))
+        else:
+            sys.stderr.write('%s\t%.1f sec\n' % (name, result['seconds']))
+
+    exact = isolated(top_k, query.fp_path, base, k, block_size)
+    note('query_vs_target_topk', rate(exact, nq * n))
+    note('query_vs_target_cutoff', rate(isolated(cutoff_pairs, query.fp_path, base, cutoff, block_size), nq * n))
+    note('all_vs_all_topk', rate(isolated(top_k, None, base, k, block_size, subset), pairs))
+    note('all_vs_all_cutoff', rate(isolated(cutoff_pairs, None, base, cutoff, block_size, subset), pairs))
+    if nprobe:
+        with tempfile.TemporaryDirectory() as tmp:
+            index_path = os.path.join(tmp, 'ivf')
+            note('ivf_build', isolated(ivf_build, index_path, base, nlist))
+            index = IVFIndex(index_path, target)
+            sizes = np.diff(index.offsets)
+            P = prepare(query.vectors())
+            for p in [int(x) for x in nprobe.split(',')]:
+                r = isolated(ivf_search, index_path, query.fp_path, base, k, p)
+                # the comparisons are with the entries of the probed cells
+                scanned = int(sizes[index.probe(P, p)].sum())
+                note('ivf_nprobe_%d' % p, dict(rate(r, scanned), nlist=index.nlist,
+                                                recall=recall(r['found'], exact['found'])))
+    if external_engines and os.path.exists(FPC):
+        note('fpc', rate(external([FPC, query.fp_path, target.fp_path]), nq * n))
+        if os.path.exists(SEARCH_LPHS):
+            note('searchLPHs', rate(external(['perl', SEARCH_LPHS, query.fp_path, target.fp_path, str(cutoff)]),
+                                    nq * n))
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'database': {'entries': n, 'queries': nq, 'L': target.L, 'all_vs_all': subset},
+        'k': k,
+        'cutoff': cutoff,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
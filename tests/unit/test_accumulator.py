@@ -0,0 +1,95 @@
+"""
+This file contains the unit tests for the datafingerprint/accumulator.py TripleAccumulator class
+The TripleAccumulator buffers triples and reduces them into a fingerprint in blocks
+"""
+import copy
+import numpy
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+import pytest
+
+from datafingerprint.accumulator import TripleAccumulator
+from datafingerprint.datafingerprint import DataFingerprint
+
+
+def loop_add_vector_value(fp, v1, v2, v3):
+  """ The original per-element loop, used as the reference implementation """
+  length = len(fp)
+  for i in range(length):
+    fp[i] += (v1[i] + v2[int((i+1) % length)] + v3[int((i+2) % length)])/3
+
+
+class LoopFingerprint(DataFingerprint):
+  def add_vector_value(self, v1, v2, v3, stuff=None):
+    loop_add_vector_value(self.accumulator.fp, v1, v2, v3)
+
+
+def large_document(n_records, seed=1):
+  rng = numpy.random.RandomState(seed)
+  words = ["alpha", "beta", "gamma", "delta", "epsilon"]
+  rows = []
+  for i in range(n_records):
+    rows.append({
+      "id": "record%d" % i,
+      "word": words[rng.randint(len(words))],
+      "value": float(rng.uniform(-1000, 1000)),
+      "small": float(rng.uniform(-1, 1) * 10 ** rng.randint(-5, 5)),
+      "tags": [words[j] for j in rng.randint(len(words), size=3)],
+    })
+  return {"rows": rows}
+
+
+class TestTripleAccumulator:
+
+  @pytest.mark.parametrize("length", [2, 13, 50, 200])
+  @pytest.mark.parametrize("block_size", [1, 7, 1024])
+  def test_parity_with_loop(self, length, block_size):
+    """ Blocked accumulation matches the per-element loop """
+    rng = numpy.random.RandomState(length)
+    expected = numpy.zeros(length)
+    acc = TripleAccumulator(length, block_size)
+    for _ in range(300):
+      v1, v2, v3 = rng.rand(3, length)
+      loop_add_vector_value(expected, v1, v2, v3)
+      acc.add(v1, v2, v3)
+    assert_array_equal(acc.flush(), expected)
+
+  def test_flush_is_idempotent(self):
+    acc = TripleAccumulator(13)
+    acc.add(numpy.ones(13), numpy.ones(13), numpy.ones(13))
+    assert_array_almost_equal(acc.flush(), numpy.ones(13))
+    assert_array_almost_equal(acc.flush(), numpy.ones(13))
+
+  def test_reset(self):
+    acc = TripleAccumulator(13)
+    acc.add(numpy.ones(13), numpy.ones(13), numpy.ones(13))
+    acc.reset()
+    assert numpy.count_nonzero(acc.flush()) == 0
+
+  def test_recurse_structure_parity(self):
+    """ A whole document gives the same fingerprint as the looped version """
+    doc = {
+      "name": {"first": "John", "last": "Smith"},
+      "children": ["Adam", "Beth", "Chloe"],
+      "scores": [1.5, 2, 3.25, 4e5],
+    }
+    dfp = DataFingerprint(debug=0, block_size=2)
+    dfp.recurse_structure(copy.deepcopy(doc))
+    reference = LoopFingerprint(debug=0)
+    reference.recurse_structure(copy.deepcopy(doc))
+    assert dfp.statements == reference.statements
+    assert_array_almost_equal(dfp.fp, reference.fp, 10)
+
+  @pytest.mark.parametrize("length", [13, 50])
+  def test_printed_parity_large_document(self, length):
+    """ Thousands of statements print exactly as with the looped version """
+    doc = large_document(1000)
+    printed = []
+    fps = []
+    for cls in (DataFingerprint, LoopFingerprint):
+      dfp = cls(length=length, debug=0)
+      dfp.recurse_structure(doc)
+      fps.append(dfp.fp.copy())
+      printed.append('\t'.join(str(round(i, dfp.decimal)) for i in dfp.fp))
+      printed.append('\t'.join(str(round(i, dfp.decimal)) for i in dfp.normalize()))
+    assert printed[:2] == printed[2:]
+    assert_array_equal(fps[0], fps[1])
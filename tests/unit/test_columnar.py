@@ -0,0 +1,93 @@
+"""
+This file contains the unit tests for datafingerprint/columnar.py
+Records sharing the same keys fingerprinted column by column must match recursing each record
+"""
+import json
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+
+from datafingerprint.columnar import fingerprint_records, shared_keys
+from datafingerprint.datafingerprint import DataFingerprint, fingerprint_many
+from datafingerprint.writers import format_rows
+
+RECORDS = [
+  {"name": "ann", "age": 31, "score": 1.5, "flag": True, "note": "", "tags": ["a", "b"], "extra": None},
+  {"name": "bob", "age": 0, "score": 0.0, "flag": False, "note": "x", "tags": {"k": 2}, "extra": "1"},
+  {"name": "ann", "age": 31, "score": -2e5, "flag": True, "note": "y", "tags": [], "extra": 7},
+  {"name": "", "age": None, "score": "3.25", "flag": None, "note": "z", "tags": [["p"]], "extra": 0},
+]
+
+
+def recursed(records, **kwargs):
+  dfp = DataFingerprint(debug=0, **kwargs)
+  results = []
+  for record in records:
+    dfp.recurse_structure(record)
+    results.append((dfp.statements, dfp.fp.copy()))
+    dfp.reset()
+  return results
+
+
+class TestColumnar:
+
+  def test_shared_keys(self):
+    assert shared_keys(RECORDS) == list(RECORDS[0])
+    assert shared_keys(RECORDS + [{"name": "x"}]) is None
+    assert shared_keys(RECORDS + [["name"]]) is None
+    assert shared_keys([{}, {}]) is None
+    # recursion adds the statements of a record in its own key order
+    assert shared_keys([{"a": 1, "b": 2}, {"b": 2, "a": 1}]) is None
+    assert shared_keys([]) is None
+
+  @pytest.mark.parametrize("kwargs", [
+    {},
+    {"length": "11,17"},
+    {"length": 7, "encodings": [{"numeric_encoding": "ML"}, {"string_encoding": "pair_sum"}]},
+  ])
+  def test_matches_recursion(self, kwargs):
+    statements, fps = fingerprint_records(DataFingerprint(debug=0, **kwargs), RECORDS)
+    for i, (count, fp) in enumerate(recursed(RECORDS, **kwargs)):
+      assert statements[i] == count
+      assert_array_equal(fps[i], fp)
+
+  def test_rows_mode(self, tmp_path):
+    rows = {"r%d" % i: dict(RECORDS[i % 4], seq=i) for i in range(50)}
+    rows["empty"] = {key: None for key in RECORDS[0]}
+    rows["empty"]["seq"] = None
+    path = tmp_path / "rows.json"
+    path.write_text(json.dumps(rows))
+    columnar = list(DataFingerprint(debug=0, columnar=True).fingerprint_rows(str(path)))
+    by_row = list(DataFingerprint(debug=0).fingerprint_rows(str(path)))
+    assert [r[:2] for r in columnar] == [r[:2] for r in by_row]
+    assert len(columnar) == 50
+    for c, r in zip(columnar, by_row):
+      assert_array_equal(c[2], r[2])
+
+  def test_fingerprint_many(self):
+    ids, statements, fps = fingerprint_many(RECORDS, ids=list("abcd"), columnar=True)
+    assert ids == list("abcd")
+    for i, (count, fp) in enumerate(recursed(RECORDS)):
+      assert statements[i] == count
+      assert_array_equal(fps[i], fp)
+
+  def test_printed_parity(self, tmp_path):
+    """ The printed fingerprints of many rows are those of the row by row path """
+    rng = np.random.RandomState(0)
+    rows = {}
+    for i in range(300):
+      rows["r%d" % i] = {
+        "age": int(rng.randint(0, 100)),
+        "score": float(rng.normal() * 10 ** rng.randint(-3, 6)),
+        "code": "c%d" % rng.randint(20),
+        "visits": [float(v) for v in rng.uniform(0, 50, size=rng.randint(0, 4))],
+        "lab": {"value": float(rng.normal()), "unit": "mg"},
+      }
+    path = tmp_path / "rows.json"
+    path.write_text(json.dumps(rows))
+    printed = []
+    for columnar in (True, False):
+      records = list(DataFingerprint(debug=0, length="11,13", columnar=columnar).fingerprint_rows(str(path)))
+      ids, statements, fps = zip(*records)
+      printed.append(format_rows(ids, statements, np.array(fps)))
+    assert printed[0] == printed[1]
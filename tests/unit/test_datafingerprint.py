@@ -3,12 +3,14 @@ This file contains the unit tests for the datafingerprint/datafingerprint.py Dat
 The DataFingerprint class is a collection of methods that can be used to create a
 data fingerprint
 """
-from mock import call, mock_open, patch
+import copy
+import json
 import numpy
 from numpy.testing import assert_array_equal, assert_array_almost_equal
 import pytest
 
-from datafingerprint.datafingerprint import DataFingerprint
+from datafingerprint.datafingerprint import DataFingerprint, fingerprint_many
+from datafingerprint.triples import TripleSink
 
 
 class TestDataFingeprint:
@@ -192,23 +194,193 @@ class TestDataFingeprint:
     res = self.dfp.reformat(test_input)
     assert res == expected
 
-  @patch("builtins.open", new_callable=mock_open())
-  def test_triples(self, m):
+  def test_triples(self, tmp_path):
     """ Test writing triples to file """
-    self.dfp.triples = [(1,2),(3,4,5)]
-    self.dfp.output_triples("test.fp")
-
-    m.assert_called_with('test.fp', 'w')
-    handle = m()
-    # TODO: Verify that there should be a tab at the end of line 1 (1\t2\t\n)
-    # TODO: Verify there should not be a tab at the end of line 2 (3\t4\t5\n)
-    calls = [
-      call.__enter__(),
-      call.__enter__().write('1'), call.__enter__().write('\t'),
-      call.__enter__().write('2'), call.__enter__().write('\t'),
-      call.__enter__().write('\n'),
-      call.__enter__().write('3'), call.__enter__().write('\t'),
-      call.__enter__().write('4'), call.__enter__().write('\t'),
-      call.__enter__().write('5'), call.__enter__().write('\n')
+    self.dfp.output_triples(str(tmp_path / "test.triple"), {"a": "x", "b": [1, 2]})
+    assert (tmp_path / "test.triple").read_text() == \
+      '"root"\t"a"\t"x"\n"b"\t0\t1\n"b"\t1\t2\n"b"\t2\t2\n"root"\t"b"\t2\n'
+
+class TestMultipleConfigs:
+  doc = {
+    "name": {"first": "John", "last": "Smith"},
+    "children": ["Adam", "Beth", "Chloe"],
+    "age": 42,
+    "height": 1.82,
+  }
+
+  @pytest.mark.parametrize(
+    "test_input, expected",
+    [
+      (13, [13]),
+      ("11,13", [11, 13]),
+      ("13 11, 13", [11, 13]),
+      ([50, 13], [13, 50]),
     ]
-    handle.assert_has_calls(calls, m.return_value.__enter__.return_value)
\ No newline at end of file
+  )
+  def test_parse_lengths(self, test_input, expected):
+    assert DataFingerprint.parse_lengths(test_input) == expected
+
+  @pytest.mark.parametrize("test_input", ["", "x", "1", [0, 13]])
+  def test_parse_lengths_invalid(self, test_input):
+    with pytest.raises(ValueError):
+      DataFingerprint.parse_lengths(test_input)
+
+  def fingerprint(self, **kwargs):
+    dfp = DataFingerprint(debug=0, **kwargs)
+    dfp.recurse_structure(copy.deepcopy(self.doc))
+    return dfp
+
+  def test_several_lengths_in_one_pass(self):
+    """ One traversal gives the same fingerprints as one run per length """
+    multi = self.fingerprint(length="11,13")
+    assert multi.lengths == [11, 13]
+    assert multi.width == len(multi.fp) == 24
+    # a single length is ambiguous with several
+    with pytest.raises(ValueError):
+      multi.L
+    fp11, fp13 = multi.split(multi.fp)
+    assert_array_almost_equal(fp11, self.fingerprint(length=11).fp)
+    assert_array_almost_equal(fp13, self.fingerprint(length=13).fp)
+    assert multi.statements == self.fingerprint(length=13).statements
+
+  def test_several_encodings_in_one_pass(self):
+    multi = self.fingerprint(encodings=[{}, {'numeric_encoding': 'ML', 'string_encoding': 'pair_sum'}])
+    assert multi.config_labels() == ['L13', 'L13.ML.pair_sum']
+    reference = DataFingerprint(debug=0)
+    reference.numeric_encoding = 'ML'
+    reference.string_encoding = 'pair_sum'
+    reference.recurse_structure(copy.deepcopy(self.doc))
+    default, other = multi.split(multi.fp)
+    assert_array_almost_equal(default, self.fingerprint().fp)
+    assert_array_almost_equal(other, reference.fp)
+
+  def test_normalize_per_config(self):
+    multi = self.fingerprint(length=[11, 13])
+    norm11, norm13 = multi.split(multi.normalize())
+    assert_array_almost_equal(norm11, self.fingerprint(length=11).normalize())
+    assert_array_almost_equal(norm13, self.fingerprint(length=13).normalize())
+
+  def test_vector_values_several_lengths(self):
+    multi = DataFingerprint(length=[11, 13])
+    values = ["GATC", 42, "Beth"]
+    expected = numpy.array([multi.compute_vector_value(v) for v in values])
+    assert_array_equal(multi.vector_values(values), expected)
+
+
+class TestTriples:
+  doc = {
+    "name": {"first": "John", "last": "Smith"},
+    "children": ["Adam", "Beth", {"name": "Chloe", "ages": [3, 4]}],
+    "age": 42,
+  }
+
+  def test_input_not_mutated(self):
+    doc = copy.deepcopy(self.doc)
+    dfp = DataFingerprint(debug=0)
+    dfp.recurse_structure(doc)
+    assert doc == self.doc
+    again = DataFingerprint(debug=0)
+    again.recurse_structure(doc)
+    assert_array_equal(again.fp, dfp.fp)
+
+  def test_no_triples_by_default(self):
+    dfp = DataFingerprint(debug=0, tripler=False)
+    assert dfp.tripler is False
+    assert dfp.triple_sink is None
+    dfp.recurse_structure(self.doc)
+    assert dfp.triple_sink is None
+
+  def test_traversal_only(self):
+    """ Without encoding the same triples are produced but no vector is computed """
+    encoded, traversed = [], []
+    reference = DataFingerprint(debug=0, triple_sink=encoded)
+    reference.recurse_structure(copy.deepcopy(self.doc))
+    reference.triple_sink.flush()
+    dfp = DataFingerprint(debug=0, triple_sink=traversed, encode=False)
+    dfp.recurse_structure(copy.deepcopy(self.doc))
+    dfp.triple_sink.flush()
+    assert traversed == encoded
+    assert dfp.stats.statements == reference.stats.statements
+    assert dfp.cache.misses == 0
+    assert not dfp.fp.any()
+
+  def test_triples_to_callback_in_chunks(self):
+    chunks = []
+    dfp = DataFingerprint(debug=0, triple_sink=TripleSink(chunks.append, chunk_size=3))
+    dfp.recurse_structure(self.doc)
+    dfp.reset()
+    triples = [t for chunk in chunks for t in chunk]
+    assert all(len(chunk) <= 3 for chunk in chunks)
+    assert len(triples) == 14
+    assert triples[0] == ('name', 'first', 'John')
+    assert ('children', 0, 'Adam') in triples
+    assert ('children', 2, 3) in triples
+    assert triples[-1] == ('root', 'age', 42)
+
+  def test_tripler_writes_triple_file(self, tmp_path):
+    path = tmp_path / "doc.json"
+    path.write_text('{"a": "x", "b": [1, 2]}')
+    record = DataFingerprint(debug=0, tripler=True).fingerprint_file(str(path))
+    assert record[1] == 5
+    assert (tmp_path / "doc.triple").read_text() == \
+      '"root"\t"a"\t"x"\n"b"\t0\t1\n"b"\t1\t2\n"b"\t2\t2\n"root"\t"b"\t2\n'
+
+  def test_output_triples_as_tripler(self, tmp_path):
+    """ output_triples writes the .triple file of the tripler, leaving the fingerprint alone """
+    path = tmp_path / "doc.json"
+    path.write_text(json.dumps(self.doc))
+    DataFingerprint(debug=0, tripler=True).fingerprint_file(str(path))
+    dfp = DataFingerprint(debug=0)
+    dfp.recurse_structure(copy.deepcopy(self.doc))
+    fp, statements = dfp.fp.copy(), dfp.statements
+    dfp.output_triples(str(tmp_path / "out.triple"), self.doc)
+    assert (tmp_path / "out.triple").read_text() == (tmp_path / "doc.triple").read_text()
+    assert dfp.triple_sink is None
+    assert dfp.statements == statements
+    assert_array_equal(dfp.fp, fp)
+
+
+class TestFingerprintMany:
+  docs = [{"a": "x", "b": [1, 2]}, [{"c": 1.5}, "y"], {"name": "z"}]
+
+  def expected(self, **kwargs):
+    dfp = DataFingerprint(debug=0, **kwargs)
+    records = []
+    for doc in self.docs:
+      dfp.recurse_structure(doc)
+      records.append((dfp.statements, dfp.fp.copy()))
+      dfp.reset()
+    return records
+
+  def test_objects(self, capsys):
+    ids, statements, fps = fingerprint_many(self.docs)
+    assert capsys.readouterr().out == ''
+    assert ids == ['0', '1', '2']
+    assert fps.shape == (3, 13)
+    for i, (count, fp) in enumerate(self.expected()):
+      assert statements[i] == count
+      assert_array_almost_equal(fps[i], fp)
+
+  def test_files_and_objects(self, tmp_path):
+    path = tmp_path / "doc.json"
+    path.write_text('{"name": "z"}')
+    (tmp_path / "empty.json").write_text('{}')
+    ids, statements, fps = fingerprint_many([self.docs[0], str(path), str(tmp_path / "empty.json")])
+    assert ids == ['0', 'doc']
+    assert_array_almost_equal(fps[1], self.expected()[2][1])
+
+  def test_generator_grows_matrix(self):
+    ids, statements, fps = fingerprint_many((self.docs[i % 3] for i in range(2500)), length=5)
+    assert fps.shape == (2500, 5)
+    assert_array_almost_equal(fps[2002], fps[1])
+
+  def test_normalize_several_lengths(self):
+    ids, statements, fps = fingerprint_many(self.docs, ids=['p', 'q', 'r'], normalize=True, length="5,7")
+    dfp = DataFingerprint(debug=0, length="5,7")
+    assert ids == ['p', 'q', 'r']
+    for i, (count, fp) in enumerate(self.expected(length="5,7")):
+      assert_array_almost_equal(fps[i], dfp.normalize(fp))
+
+  def test_ids_must_match(self):
+    with pytest.raises(ValueError):
+      fingerprint_many(self.docs, ids=['a'])
@@ -1,3 +1,5 @@
+import json
+import shutil
 from click.testing import CliRunner
 from datafingerprint.datafingerprint import main
 """
@@ -13,4 +15,37 @@ def test_main():
   assert '--tripler' in result.output
   assert '--normalize' in result.output
   assert '--fp-length' in result.output
-  assert '--help' in result.output
\ No newline at end of file
+  assert '--help' in result.output
+
+def test_main_several_lengths(tmp_path):
+  """ Several lengths give one output file per length """
+  shutil.copy('validation/test3.json', str(tmp_path))
+  runner = CliRunner()
+  result = runner.invoke(main, ['--input', str(tmp_path), '--fp-length', '11,13', '--debug', '0'])
+  assert result.exit_code == 0
+  fp11 = (tmp_path / 'out.L11.fp').read_text().split('\t')
+  fp13 = (tmp_path / 'out.L13.fp').read_text().split('\t')
+  assert fp11[0] == fp13[0] == 'test3'
+  assert len(fp11) == 2 + 11
+  assert len(fp13) == 2 + 13
+
+def test_main_rows_several_lengths(tmp_path):
+  """ Rows and line-delimited records give one output file per length """
+  rows = {"r%d" % i: {"age": 20 + i, "name": "n%d" % i, "tags": ["a", "b"]} for i in range(5)}
+  (tmp_path / "rows.json").write_text(json.dumps(rows))
+  (tmp_path / "lines.jsonl").write_text(''.join(json.dumps(dict(row, id=i)) + '\n' for i, row in rows.items()))
+  runner = CliRunner()
+  for name, mode in (('rows', '--rows'), ('lines', '--linewise')):
+    path = str(tmp_path / ("rows.json" if mode == '--rows' else "lines.jsonl"))
+    result = runner.invoke(main, ['--input', path, '--fp-length', '11,13', '--debug', '0', mode])
+    assert result.exit_code == 0
+    assert result.output == ''
+    for L in (11, 13):
+      lines = (tmp_path / ('%s.L%d.fp' % (name, L))).read_text().splitlines()
+      assert [line.split('\t')[0] for line in lines] == list(rows)
+      assert all(len(line.split('\t')) == 2 + L for line in lines)
+    # the values are those of a single length
+    single = runner.invoke(main, ['--input', path, '--fp-length', '13', '--debug', '0', mode])
+    written = (tmp_path / ('%s.L13.fp' % name)).read_text()
+    assert [[float(v) for v in line.split('\t')[1:]] for line in single.output.splitlines()] == \
+      [[float(v) for v in line.split('\t')[1:]] for line in written.splitlines()]
@@ -0,0 +1,61 @@
+"""
+This file contains the unit tests for the datafingerprint/encoders.py batch string encoders
+encode_strings must give exactly the same vectors as DataFingerprint.vector_value
+"""
+import numpy
+from numpy.testing import assert_array_equal
+import pytest
+
+from datafingerprint.datafingerprint import DataFingerprint
+from datafingerprint.encoders import encode_strings
+
+
+def random_strings(n, seed=1):
+  rng = numpy.random.RandomState(seed)
+  strings = []
+  for _ in range(n):
+    size = rng.randint(1, 40)
+    low, high = [(32, 127), (65, 91), (160, 5000)][rng.randint(3)]
+    strings.append(''.join(chr(c) for c in rng.randint(low, high, size=size)))
+  return [s for s in strings if not DataFingerprint.isnumeric(s)]
+
+
+class TestEncodeStrings:
+
+  @pytest.mark.parametrize("encoding", ["decay", "pair_sum"])
+  @pytest.mark.parametrize("length", [13, 50, 200])
+  def test_parity_with_vector_value(self, encoding, length):
+    """ Bit-for-bit the same as the scalar path, across chunk boundaries """
+    dfp = DataFingerprint(length=length)
+    dfp.string_encoding = encoding
+    strings = random_strings(300) + ["GATC", "A", "AA"]
+    expected = numpy.array([dfp.compute_vector_value(s) for s in strings])
+    res = encode_strings(strings, length, encoding, dfp.string_encoding_decay, max_cells=500)
+    assert_array_equal(res, expected)
+
+  def test_known_values(self):
+    res = encode_strings(["A", "GATC", ""], 13)
+    expected = [
+      [1., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0.],
+      [0.12, 0.2127, 0.3453, 0.072, 0., 0., 0.25, 0., 0., 0., 0., 0., 0.],
+      [0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0.],
+    ]
+    numpy.testing.assert_array_almost_equal(res, expected)
+
+  def test_empty_list(self):
+    assert encode_strings([], 13).shape == (0, 13)
+
+  def test_unknown_encoding(self):
+    with pytest.raises(ValueError):
+      encode_strings(["GATC"], 13, "nope")
+
+  def test_vector_values_mixed(self):
+    """ DataFingerprint.vector_values matches vector_value for any mix of values """
+    values = ["GATC", 42, "42", "", 3.5, "GATC", "Beth", 0, True]
+    dfp = DataFingerprint()
+    res = dfp.vector_values(values)
+    reference = DataFingerprint()
+    expected = numpy.array([reference.vector_value(v) for v in values])
+    assert_array_equal(res, expected)
+    # the batch-encoded strings are now cached
+    assert dfp.cache.get("Beth") is not None
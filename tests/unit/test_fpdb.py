@@ -0,0 +1,105 @@
+"""
+This file contains the unit tests for the datafingerprint/fpdb.py FingerprintDB class
+A FingerprintDB is a serialized .fp/.id fingerprint database as written by bin/serializeLPH.pl
+"""
+import struct
+from click.testing import CliRunner
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+
+from datafingerprint.fpdb import FingerprintDB, main, ranks, standardize
+
+
+FPS = np.array([
+  [0.5, 0.1, 0.9, 0.3],
+  [1.0, 1.0, 0.0, 2.0],
+  [4.0, 3.0, 2.0, 1.0],
+])
+
+
+class TestRanks:
+
+  def test_ranks(self):
+    assert_array_equal(ranks(FPS), [[2, 0, 3, 1], [1, 2, 0, 3], [3, 2, 1, 0]])
+
+  def test_ranks_unchanged_by_standardize(self):
+    assert_array_equal(ranks(standardize(FPS)), ranks(FPS))
+
+
+class TestFingerprintDB:
+
+  def test_create_and_append(self, tmp_path):
+    db = FingerprintDB.create(str(tmp_path / "db"), 4)
+    assert len(db) == 0
+    assert db.append(["a", "b", "c"], FPS, extra=[[7], [8], [9]]) == 3
+    assert len(db) == 3
+    assert db.ids() == ["a", "b", "c"]
+    assert db.extra(1) == ["8"]
+    assert_array_equal(db.get("b"), [1, 2, 0, 3])
+    assert db.get("z") is None
+    assert "c" in db
+
+    # the layout read by fpc and searchLPHs.pl
+    data = (tmp_path / "db.fp").read_bytes()
+    assert struct.unpack('i', data[:4]) == (4,)
+    assert struct.unpack('4i', data[4:20]) == (2, 0, 3, 1)
+    lines = (tmp_path / "db.id").read_text().splitlines()
+    assert lines[2] == "#L\t4"
+    assert lines[3:] == ["4\ta\t7", "20\tb\t8", "36\tc\t9"]
+
+  def test_reopen_is_memory_mapped(self, tmp_path):
+    FingerprintDB.create(str(tmp_path / "db"), 4).append(["a", "b", "c"], FPS)
+    db = FingerprintDB(str(tmp_path / "db.fp"))
+    assert isinstance(db.fps, np.memmap)
+    assert db.fps.shape == (3, 4)
+    assert_array_equal(db[[2, 0]], ranks(FPS)[[2, 0]])
+    assert db.index("b") == 1
+
+  def test_sequential_records_read_without_ids(self, tmp_path):
+    FingerprintDB.create(str(tmp_path / "db"), 4).append(["a", "b", "c"], FPS)
+    (tmp_path / "db.idx").unlink()
+    db = FingerprintDB(str(tmp_path / "db"))
+    assert len(db) == 3
+    assert_array_equal(db[1], ranks(FPS)[1])
+    assert_array_equal(db[-1], ranks(FPS)[2])
+    assert isinstance(db.vectors(), np.memmap)
+    assert db.rows is None
+    # the ids are read when asked for
+    assert db.id(2) == "c"
+    assert_array_equal(db.vectors(), ranks(FPS))
+
+  def test_records_out_of_order(self, tmp_path):
+    FingerprintDB.create(str(tmp_path / "db"), 4).append(["a", "b", "c"], FPS)
+    lines = (tmp_path / "db.id").read_text().splitlines(True)
+    (tmp_path / "db.id").write_text("".join(lines[:3] + ["36\tc\n", "4\ta\n", "20\tb\n"]))
+    (tmp_path / "db.idx").unlink()
+    db = FingerprintDB(str(tmp_path / "db"))
+    assert db.entries is None
+    assert_array_equal(db[0], ranks(FPS)[2])
+    assert_array_equal(db.vectors(), ranks(FPS)[[2, 0, 1]])
+    assert db.ids() == ["c", "a", "b"]
+
+  def test_append_skips_known_ids(self, tmp_path):
+    db = FingerprintDB.open(str(tmp_path / "db"), 4)
+    db.append(["a", "b"], FPS[:2])
+    db = FingerprintDB.open(str(tmp_path / "db"), 4)
+    assert db.append(["b", "c", "c"], FPS) == 1
+    assert db.ids() == ["a", "b", "c"]
+    assert_array_equal(db.get("c"), ranks(FPS)[1])
+
+  def test_incompatible_length(self, tmp_path):
+    FingerprintDB.create(str(tmp_path / "db"), 4)
+    with pytest.raises(ValueError):
+      FingerprintDB.open(str(tmp_path / "db"), 5)
+
+  def test_main(self, tmp_path):
+    text = tmp_path / "out.fp"
+    text.write_text("a\t3\t0.5\t0.1\t0.9\t0.3\t\nb\t5\t1.0\t1.0\t0.0\t2.0\t\n")
+    result = CliRunner().invoke(main, ['-o', str(tmp_path / "db"), '--fp-length', '4', str(text)])
+    assert result.exit_code == 0
+    assert "Added 2 fingerprints" in result.output
+    db = FingerprintDB(str(tmp_path / "db"))
+    assert db.ids() == ["a", "b"]
+    assert db.extra(0) == ["3"]
+    assert_array_equal(db.fps, ranks(FPS[:2]))
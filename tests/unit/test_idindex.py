@@ -0,0 +1,106 @@
+"""
+This file contains the unit tests for the datafingerprint/idindex.py IdIndex class
+An IdIndex is the persistent id -> entry index kept next to a serialized fingerprint database
+"""
+import os
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from datafingerprint.fpdb import FingerprintDB, ranks
+from datafingerprint.idindex import IdIndex
+
+
+def fps(n, seed=0):
+  return np.random.RandomState(seed).uniform(size=(n, 5))
+
+
+class TestIdIndex:
+
+  def test_lookup_after_reopen(self, tmp_path):
+    db = FingerprintDB.create(str(tmp_path / "db"), 5)
+    db.append(['a%d' % i for i in range(50)], fps(50))
+    assert os.path.exists(str(tmp_path / "db.idx"))
+    db = FingerprintDB(str(tmp_path / "db"))
+    assert db.rows is None
+    assert len(db) == 50
+    assert db.index('a17') == 17
+    assert 'b' not in db
+    assert_array_equal(db.id_index.lookup_many(['a3', 'x', 'a49']), [3, -1, 49])
+    # the ids themselves are only read when needed
+    assert db.rows is None
+    assert db.id(17) == 'a17'
+
+  def test_log_is_compacted(self, tmp_path):
+    db = FingerprintDB.create(str(tmp_path / "db"), 5)
+    for batch in range(5):
+      db.append(['a%d_%d' % (batch, i) for i in range(20)], fps(20, batch))
+    index = IdIndex(str(tmp_path / "db"), str(tmp_path / "db.id"))
+    assert len(index) == 100
+    assert index.logged < 100
+    assert index.lookup('a4_19') == 99
+    assert index.lookup('a0_0') == 0
+
+  def test_lines_appended_by_other_tools(self, tmp_path):
+    db = FingerprintDB.create(str(tmp_path / "db"), 5)
+    db.append(['a', 'b'], fps(2))
+    # as appended by bin/serializeLPH.pl, which does not know the index
+    with open(str(tmp_path / "db.fp"), 'ab') as f:
+      f.write(ranks(fps(1, 7)).tobytes())
+    with open(str(tmp_path / "db.id"), 'a') as f:
+      f.write('44\tc\t3\n')
+    db = FingerprintDB(str(tmp_path / "db"))
+    assert len(db) == 3
+    assert db.index('c') == 2
+    assert db.append(['c', 'd'], fps(2)) == 1
+    assert db.ids() == ['a', 'b', 'c', 'd']
+
+  def test_interrupted_append_is_dropped(self, tmp_path):
+    db = FingerprintDB.create(str(tmp_path / "db"), 5)
+    db.append(['a', 'b'], fps(2))
+    # records written to .fp, but the .id line cut short
+    with open(str(tmp_path / "db.fp"), 'ab') as f:
+      f.write(ranks(fps(2, 3)).tobytes())
+    with open(str(tmp_path / "db.id"), 'a') as f:
+      f.write('44\tc')
+    db = FingerprintDB(str(tmp_path / "db"))
+    assert len(db) == 2
+    assert db.append(['c'], fps(1, 4)) == 1
+    db = FingerprintDB(str(tmp_path / "db"))
+    assert db.ids() == ['a', 'b', 'c']
+    assert db.fps.shape == (3, 5)
+    assert_array_equal(db.get('c'), ranks(fps(1, 4))[0])
+
+  def test_rebuilt_when_id_file_replaced(self, tmp_path):
+    db = FingerprintDB.create(str(tmp_path / "db"), 5)
+    db.append(['a%d' % i for i in range(10)], fps(10))
+    os.remove(str(tmp_path / "db.id"))
+    os.remove(str(tmp_path / "db.fp"))
+    idx = (tmp_path / "db.idx").read_bytes()
+    db = FingerprintDB.create(str(tmp_path / "db"), 5)
+    (tmp_path / "db.idx").write_bytes(idx)
+    db = FingerprintDB(str(tmp_path / "db"))
+    assert len(db) == 0
+    assert 'a1' not in db
+
+  def test_bulk_build(self, tmp_path, monkeypatch):
+    """ The first index of a large .id file is built without the log or the recent ids """
+    def unused(*args):
+      raise AssertionError("the bulk build goes through add or compact")
+    monkeypatch.setattr(IdIndex, 'add', unused)
+    monkeypatch.setattr(IdIndex, 'compact', unused)
+    n = 100000
+    header = b'#created\tnow\n#version\t1\n#L\t5\n'
+    lines = [b'%d\tid%d\t%d\n' % (4 + 20 * i, i, i % 3) for i in range(n)]
+    # a comment and a blank line in the middle, a repeated id and a last line cut short
+    lines[500:500] = [b'#note\n', b'\n']
+    lines.append(b'%d\tid7\t0\n' % (4 + 20 * n))
+    (tmp_path / "db.id").write_bytes(header + b''.join(lines) + b'44\tcut')
+    index = IdIndex.build(str(tmp_path / "db"), str(tmp_path / "db.id"), len(header), chunk_size=4096)
+    assert len(index) == n + 1
+    assert index.recent == {}
+    assert not os.path.exists(str(tmp_path / "db.idx.log"))
+    assert index.end == os.path.getsize(str(tmp_path / "db.id")) - len(b'44\tcut')
+    assert_array_equal(index.lookup_many(['id0', 'id499', 'id500', 'id%d' % (n - 1), 'id7', 'cut', 'x']),
+                       [0, 499, 500, n - 1, 7, -1, -1])
+    hashes = index.hashes[:-1]
+    assert np.all(hashes[1:] >= hashes[:-1])
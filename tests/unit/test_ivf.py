@@ -0,0 +1,98 @@
+"""
+This file contains the unit tests for the datafingerprint/ivf.py IVFIndex class
+An IVFIndex is an inverted-file approximate nearest-neighbour index over a serialized fingerprint database
+"""
+from click.testing import CliRunner
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+
+from datafingerprint.fpdb import FingerprintDB
+from datafingerprint.ivf import IVFIndex, exact_search, main, recall
+
+
+def clustered(n, L=20, clusters=10, seed=0):
+  rng = np.random.RandomState(seed)
+  centers = rng.normal(size=(clusters, L))
+  return centers[rng.randint(clusters, size=n)] + 0.5 * rng.normal(size=(n, L))
+
+
+@pytest.fixture
+def db(tmp_path):
+  db = FingerprintDB.create(str(tmp_path / "db"), 20)
+  db.append(['e%d' % i for i in range(600)], clustered(600))
+  return db
+
+
+class TestIVFIndex:
+
+  def test_build(self, tmp_path, db):
+    index = IVFIndex.build(str(tmp_path / "index"), db, nlist=8)
+    assert len(index) == 600
+    assert index.compacted == 600
+    assert index.offsets[-1] == 600
+    assert_array_equal(np.sort(np.asarray(index.entries)), np.arange(600))
+
+  def test_all_cells_is_exact(self, tmp_path, db):
+    index = IVFIndex.build(str(tmp_path / "index"), db, nlist=8)
+    queries = np.asarray(db[:20])
+    found, scores = index.search(queries, k=5, nprobe=8)
+    assert recall(found, exact_search(queries, db, 5)) == pytest.approx(1, abs=0.02)
+    assert_array_equal(found[:, 0], np.arange(20))
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+  def test_recall_grows_with_nprobe(self, tmp_path, db):
+    index = IVFIndex.build(str(tmp_path / "index"), db, nlist=16)
+    queries = np.asarray(db[::10])
+    exact = exact_search(queries, db, 10)
+    recalls = [recall(index.search(queries, 10, p)[0], exact) for p in (1, 4, 16)]
+    assert recalls[0] <= recalls[1] <= recalls[2]
+    assert recalls[1] > 0.8
+
+  def test_add_after_append(self, tmp_path, db):
+    IVFIndex.build(str(tmp_path / "index"), db, nlist=8)
+    more = clustered(20, seed=1)
+    db.append(['new%d' % i for i in range(20)], more)
+    index = IVFIndex(str(tmp_path / "index"), db, compact_fraction=1.0)
+    assert index.add() == 20
+    # the appended entries are searched from the tail before compaction
+    assert index.compacted == 600
+    found, scores = index.search(np.asarray(db[600:605]), k=1, nprobe=8)
+    assert_array_equal(found[:, 0], np.arange(600, 605))
+    index.compact()
+    assert index.compacted == 620
+    assert index.add() == 0
+
+  def test_empty_database(self, tmp_path):
+    empty = FingerprintDB.create(str(tmp_path / "empty"), 20)
+    with pytest.raises(ValueError):
+      IVFIndex.build(str(tmp_path / "index"), empty)
+    with pytest.raises(ValueError):
+      IVFIndex.build(str(tmp_path / "index"), empty, nlist=4)
+
+  def test_nlist_clamped_to_entries(self, tmp_path):
+    small = FingerprintDB.create(str(tmp_path / "small"), 20)
+    small.append(['e%d' % i for i in range(5)], clustered(5))
+    index = IVFIndex.build(str(tmp_path / "index"), small, nlist=50)
+    assert index.nlist == 5
+    assert len(index) == 5
+    found, scores = index.search(np.asarray(small[:5]), k=1, nprobe=5)
+    assert_array_equal(found[:, 0], np.arange(5))
+    # the index is read from the memory map, without the ids
+    assert small.rows is None
+
+  def test_incompatible_length(self, tmp_path, db):
+    IVFIndex.build(str(tmp_path / "index"), db, nlist=4)
+    other = FingerprintDB.create(str(tmp_path / "other"), 13)
+    with pytest.raises(ValueError):
+      IVFIndex(str(tmp_path / "index"), other)
+
+  def test_main_evaluate(self, tmp_path, db):
+    runner = CliRunner()
+    result = runner.invoke(main, ['build', db.base, str(tmp_path / "index"), '--nlist', '8'])
+    assert result.exit_code == 0
+    result = runner.invoke(main, ['evaluate', db.base, str(tmp_path / "index"), '--queries', '10', '--nprobe', '1,8'])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0] == "nprobe\trecall@10\tms_per_query"
+    assert float(lines[2].split('\t')[1]) == pytest.approx(1, abs=0.05)
@@ -0,0 +1,84 @@
+"""
+This file contains the unit tests for the datafingerprint/parallel.py process pool
+Fingerprinting with several workers must give the same results, in the same order, as one process
+"""
+import gzip
+import json
+from click.testing import CliRunner
+from numpy.testing import assert_array_almost_equal
+import pytest
+
+from datafingerprint.datafingerprint import DataFingerprint, fingerprint_many, main
+from datafingerprint.parallel import fingerprint_files
+
+
+@pytest.fixture
+def json_dir(tmp_path):
+  for i in range(12):
+    doc = {"id": "p%d" % i, "age": 20 + i, "tags": ["a", "b", "c"][:1 + i % 3], "nested": {"x": i * 1.5}}
+    (tmp_path / ("p%02d.json" % i)).write_text(json.dumps(doc))
+  (tmp_path / "empty.json").write_text("{}")
+  return tmp_path
+
+
+def test_same_records_in_input_order(json_dir):
+  files = sorted(str(p) for p in json_dir.glob("*.json"))
+  dfp = DataFingerprint(debug=0, length="11,13")
+  serial = [dfp.fingerprint_file(f) for f in files]
+  serial = [r for r in serial if r]
+  parallel = list(fingerprint_files(files, dfp, workers=3, chunk_size=2))
+  assert [r[0] for r in parallel] == [r[0] for r in serial]
+  assert [r[1] for r in parallel] == [r[1] for r in serial]
+  for p, s in zip(parallel, serial):
+    assert_array_almost_equal(p[2], s[2])
+
+
+def test_fingerprint_many_with_workers(json_dir):
+  files = sorted(str(p) for p in json_dir.glob("*.json"))
+  serial = fingerprint_many(files)
+  parallel = fingerprint_many(files, ids=['f%d' % i for i in range(len(files))], workers=2)
+  assert parallel[0] == ['f%d' % i for i, f in enumerate(files) if 'empty' not in f]
+  assert list(parallel[1]) == list(serial[1])
+  assert_array_almost_equal(parallel[2], serial[2])
+
+
+def test_ids_by_position_with_duplicate_names(tmp_path):
+  """ Files with the same name in different places, or compressed, keep the id at their position """
+  for d in ("a", "b"):
+    (tmp_path / d).mkdir()
+  docs = [{"n": 1}, {"n": 2, "s": "v"}, {"n": 3, "t": [1, 2]}, {}, {"n": 4}]
+  files = [tmp_path / "a" / "x.json", tmp_path / "b" / "x.json", tmp_path / "x.json.gz", tmp_path / "a" / "y.json",
+           tmp_path / "x.json"]
+  for doc, f in zip(docs, files):
+    if f.suffix == '.gz':
+      with gzip.open(str(f), 'wt') as out:
+        out.write(json.dumps(doc))
+    else:
+      f.write_text(json.dumps(doc))
+  files = [str(f) for f in files]
+  ids = ['i%d' % i for i in range(len(files))]
+  serial = fingerprint_many(files, ids=ids)
+  parallel = fingerprint_many(files, ids=ids, workers=2)
+  assert parallel[0] == serial[0] == ['i0', 'i1', 'i2', 'i4']
+  assert list(parallel[1]) == list(serial[1])
+  assert_array_almost_equal(parallel[2], serial[2])
+
+
+def test_worker_sees_changed_encoding(json_dir):
+  files = sorted(str(p) for p in json_dir.glob("p*.json"))
+  dfp = DataFingerprint(debug=0)
+  dfp.string_encoding = 'pair_sum'
+  expected = dfp.fingerprint_file(files[0])
+  res = list(fingerprint_files(files[:1], dfp, workers=2))
+  assert_array_almost_equal(res[0][2], expected[2])
+
+
+def test_main_workers(json_dir):
+  runner = CliRunner()
+  result = runner.invoke(main, ['--input', str(json_dir), '--debug', '0'])
+  assert result.exit_code == 0
+  serial = (json_dir / 'out.fp').read_text()
+  result = runner.invoke(main, ['--input', str(json_dir), '--debug', '0', '--workers', '2'])
+  assert result.exit_code == 0
+  assert (json_dir / 'out.fp').read_text() == serial
+  assert serial.count('\n') == 12
@@ -0,0 +1,232 @@
+"""
+This file contains the unit tests for the datafingerprint/readers.py streaming input
+and the line-delimited json mode of DataFingerprint
+"""
+import bz2
+import copy
+import glob
+import gzip
+import io
+import json
+import lzma
+import os
+from click.testing import CliRunner
+from numpy.testing import assert_array_almost_equal
+import pytest
+
+from datafingerprint.datafingerprint import DataFingerprint, main
+from datafingerprint.readers import (ThreadedReader, clean_id, input_name, iter_jsonl, iter_top_level, list_inputs,
+                                    open_input)
+
+RECORDS = [
+  {"id": "Q1", "label": "universe", "claims": {"P31": ["Q36906", "Q1454986"]}},
+  {"id": "Q2", "label": "Earth", "mass": 5.97e24},
+  {"label": "no id here"},
+  {"id": "Q3 bad id", "label": "life"},
+]
+
+
+def dump_lines(records):
+  # wikidata style: a json array with one object per line
+  return "[\n" + ",\n".join(json.dumps(r) for r in records) + "\n]\n"
+
+
+class TestReaders:
+
+  def test_iter_jsonl(self):
+    stream = io.BytesIO(dump_lines(RECORDS).encode('utf-8'))
+    res = list(iter_jsonl(stream))
+    assert [i for i, e in res] == ["Q1", "Q2", "Q3badid"]
+    assert "id" not in res[0][1]
+
+  def test_iter_jsonl_id_field(self):
+    stream = io.BytesIO(dump_lines(RECORDS).encode('utf-8'))
+    res = list(iter_jsonl(stream, "label"))
+    assert [i for i, e in res] == ["universe", "Earth", "noidhere", "life"]
+
+  def test_invalid_line_skipped(self, capsys):
+    stream = io.BytesIO(b'{"id": "a"}\n{"id": \n{"id": "b"}\n')
+    assert [i for i, e in iter_jsonl(stream)] == ["a", "b"]
+    assert "Invalid json line skipped" in capsys.readouterr().err
+
+  @pytest.mark.parametrize("suffix, opener", [(".jsonl", open), (".jsonl.gz", gzip.open), (".jsonl.bz2", bz2.open),
+                                              (".jsonl.xz", lzma.open)])
+  def test_open_input(self, tmp_path, suffix, opener):
+    path = str(tmp_path / ("dump" + suffix))
+    with opener(path, "wt") as f:
+      f.write(dump_lines(RECORDS))
+    with open_input(path) as stream:
+      assert len(list(iter_jsonl(stream))) == 3
+
+  def test_clean_id(self):
+    assert clean_id("a b\tc/d") == "abcd"
+    assert clean_id(42) == "42"
+
+  def test_input_name(self):
+    assert input_name("data/p1.json.gz") == "p1"
+    assert input_name("p1.json") == "p1"
+    assert input_name("p1.tar.xz") == "p1"
+
+  def test_list_inputs(self, tmp_path):
+    for name in ["b.json", "a.json.gz", "c.JSON.bz2", "d.json.txt", "e.xml"]:
+      (tmp_path / name).write_text("{}")
+    (tmp_path / "f.json").mkdir()
+    assert [os.path.basename(f) for f in list_inputs(str(tmp_path), "json")] == ["a.json.gz", "b.json", "c.JSON.bz2"]
+
+
+class TestThreadedReader:
+
+  def test_blocks(self):
+    data = bytes(range(256)) * 100
+    reader = io.BufferedReader(ThreadedReader(io.BytesIO(data), block_size=7, read_ahead=2), 13)
+    assert reader.read(5) == data[:5]
+    assert reader.read() == data[5:]
+    assert reader.read() == b''
+
+  def test_error_is_raised_by_the_reader(self, tmp_path):
+    path = str(tmp_path / "truncated.json.gz")
+    with open(path, "wb") as f:
+      f.write(gzip.compress(b'{"a": 1}' * 1000)[:-20])
+    with pytest.raises(EOFError):
+      with open_input(path) as stream:
+        stream.read()
+
+  def test_close_stops_reading(self):
+    source = io.BytesIO(b"x" * 10000)
+    reader = ThreadedReader(source, block_size=10, read_ahead=1)
+    reader.read(3)
+    reader.close()
+    assert not reader.thread.is_alive()
+    assert source.closed
+
+
+class TestFingerprintJsonl:
+
+  def test_fingerprint_jsonl(self, tmp_path):
+    path = tmp_path / "dump.jsonl"
+    path.write_text(dump_lines(RECORDS))
+    dfp = DataFingerprint(debug=0)
+    res = list(dfp.fingerprint_jsonl(str(path)))
+    assert [r[0] for r in res] == ["Q1", "Q2", "Q3badid"]
+    reference = DataFingerprint(debug=0)
+    entry = copy.deepcopy(RECORDS[1])
+    del entry["id"]
+    reference.recurse_structure(entry)
+    assert res[1][1] == reference.statements
+    assert_array_almost_equal(res[1][2], reference.fp)
+
+  def test_main_linewise_compressed_stdin(self):
+    result = CliRunner().invoke(main, ['--input', '-', '--linewise', '--debug', '0'],
+                                input=gzip.compress(dump_lines(RECORDS).encode('utf-8')))
+    assert result.exit_code == 0
+    assert [line.split('\t')[0] for line in result.output.splitlines()] == ["Q1", "Q2", "Q3badid"]
+
+  def test_compressed_directory(self, tmp_path):
+    plain = tmp_path / "plain"
+    packed = tmp_path / "packed"
+    plain.mkdir()
+    packed.mkdir()
+    for i, (opener, suffix) in enumerate([(open, ""), (gzip.open, ".gz"), (bz2.open, ".bz2"), (lzma.open, ".xz")]):
+      doc = json.dumps(dict(RECORDS[i % 2], n=i))
+      (plain / ("p%d.json" % i)).write_text(doc)
+      with opener(str(packed / ("p%d.json%s" % (i, suffix))), "wt") as f:
+        f.write(doc)
+    for directory in [plain, packed]:
+      result = CliRunner().invoke(main, ['--input', str(directory), '--debug', '0'])
+      assert result.exit_code == 0
+    assert (plain / "out.fp").read_text() == (packed / "out.fp").read_text()
+    assert (packed / "out.fp").read_text().count("\n") == 4
+
+  def test_main_linewise_stdin(self):
+    runner = CliRunner()
+    result = runner.invoke(main, ['--input', '-', '--linewise', '--debug', '0'], input=dump_lines(RECORDS))
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert [line.split('\t')[0] for line in lines] == ["Q1", "Q2", "Q3badid"]
+    assert len(lines[0].split('\t')) == 2 + 13
+
+
+class TestIterTopLevel:
+
+  @pytest.mark.parametrize("chunk_size", [1, 3, 4096])
+  @pytest.mark.parametrize(
+    "doc",
+    [
+      '{"a": 1, "b": [1, 2, {"c": "x"}], "n": 12345678901234567890, "f": -1.5e-3}',
+      '[1, 2.5e10, "s", {"k": null}, true]',
+      '"just a string"',
+      ' 12345 ',
+      '{}',
+      '[]',
+    ]
+  )
+  def test_same_as_json_load(self, doc, chunk_size):
+    res = list(iter_top_level(io.StringIO(doc), chunk_size))
+    expected = json.loads(doc)
+    if isinstance(expected, dict):
+      assert [(k, v) for kind, k, v in res] == list(expected.items())
+    elif isinstance(expected, list):
+      assert [(i, v) for kind, i, v in res] == list(enumerate(expected))
+    else:
+      assert res == [('scalar', None, expected)]
+
+  @pytest.mark.parametrize("doc", ['{"a" 1}', '[1, 2', '{"a": 1} x', '[1 2]', ''])
+  def test_invalid(self, doc):
+    with pytest.raises(json.JSONDecodeError):
+      list(iter_top_level(io.StringIO(doc), 2))
+
+
+class TestStreamingFingerprint:
+
+  @pytest.mark.parametrize("path", sorted(glob.glob('validation/*.json')))
+  @pytest.mark.parametrize("arrays_are_sets", [False, True])
+  def test_stream_matches_whole_document(self, path, arrays_are_sets):
+    whole_triples, streamed_triples = [], []
+    whole = DataFingerprint(debug=0, triple_sink=whole_triples)
+    whole.array_are_sets = arrays_are_sets
+    try:
+      with open(path) as f:
+        data = json.load(f)
+    except ValueError:
+      return
+    if not data:
+      return
+    whole.recurse_structure(data)
+    streamed = DataFingerprint(debug=0, triple_sink=streamed_triples)
+    streamed.array_are_sets = arrays_are_sets
+    with open(path) as f:
+      streamed.recurse_items(iter_top_level(f, 7))
+    assert streamed.statements == whole.statements
+    whole.triple_sink.flush()
+    streamed.triple_sink.flush()
+    assert streamed_triples == whole_triples
+    assert_array_almost_equal(streamed.fp, whole.fp)
+
+  def test_stream_invalid_file(self, capsys):
+    dfp = DataFingerprint(debug=0, stream=True)
+    assert dfp.fingerprint_file('validation/wrong.json') is None
+    assert 'Invalid json file skipped' in capsys.readouterr().err
+
+  def test_fingerprint_rows(self, tmp_path):
+    rows = {"p1": {"age": 40, "sex": "F"}, "p2": {"age": 51, "smoker": True}, "p3": {}}
+    path = tmp_path / "cohort.json"
+    path.write_text(json.dumps(rows))
+    res = list(DataFingerprint(debug=0).fingerprint_rows(str(path)))
+    assert [r[0] for r in res] == ["p1", "p2"]
+    reference = DataFingerprint(debug=0)
+    reference.recurse_structure(rows["p2"])
+    assert res[1][1] == reference.statements
+    assert_array_almost_equal(res[1][2], reference.fp)
+
+  def test_fingerprint_rows_of_array(self, tmp_path):
+    path = tmp_path / "cohort.json"
+    path.write_text(json.dumps([{"id": "a", "x": 1}, {"x": 2}]))
+    res = list(DataFingerprint(debug=0).fingerprint_rows(str(path)))
+    assert [r[0] for r in res] == ["a", "1"]
+
+  def test_main_rows(self, tmp_path):
+    path = tmp_path / "cohort.json"
+    path.write_text(json.dumps({"p1": {"age": 40}, "p2": {"age": 51}}))
+    result = CliRunner().invoke(main, ['--input', str(path), '--rows', '--debug', '0'])
+    assert result.exit_code == 0
+    assert [line.split('\t')[0] for line in result.output.splitlines()] == ["p1", "p2"]
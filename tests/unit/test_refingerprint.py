@@ -0,0 +1,80 @@
+"""
+This file contains the unit tests for datafingerprint/refingerprint.py
+Fingerprints computed from the triples of documents must equal those computed from the json documents
+"""
+import json
+from click.testing import CliRunner
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from datafingerprint.datafingerprint import DataFingerprint
+from datafingerprint.refingerprint import fingerprint_store, fingerprint_triples, main
+from datafingerprint.triplestore import build_store
+
+DOCS = [
+  {"name": "root", "n": 3, "x": 2.5, "nested": {"a": "1", "b": [1, 2, {"c": "root"}]}},
+  [{"id": 1, "flag": True}, {"id": 2, "flag": False}, "text"],
+  {"only": "one"},
+  [["deep", 1], ["deeper", 2.75]],
+]
+
+
+@pytest.fixture
+def files(tmp_path):
+  files = []
+  for i, doc in enumerate(DOCS):
+    path = tmp_path / ("doc%d.json" % i)
+    path.write_text(json.dumps(doc))
+    files.append(str(path))
+  return files
+
+
+def from_json(files, **kwargs):
+  dfp = DataFingerprint(debug=0, **kwargs)
+  return [dfp.fingerprint_file(file) for file in files]
+
+
+class TestRefingerprint:
+
+  @pytest.mark.parametrize("kwargs", [
+    {},
+    {"length": "11,17"},
+    {"length": 7, "encodings": [{"numeric_encoding": "ML"}, {"string_encoding": "pair_sum"}]},
+  ])
+  def test_store_matches_json(self, tmp_path, files, kwargs):
+    store = build_store(str(tmp_path / "store"), files)
+    expected = from_json(files, **kwargs)
+    # a tiny chunk size splits documents across chunks
+    records = list(fingerprint_store(DataFingerprint(debug=0, **kwargs), store, chunk_size=4))
+    assert [r[:2] for r in records] == [r[:2] for r in expected]
+    for record, reference in zip(records, expected):
+      assert_allclose(record[2], reference[2], atol=1e-12)
+
+  def test_text_triples_match_json(self, tmp_path, files):
+    dfp = DataFingerprint(debug=0, tripler=True)
+    for file in files:
+      dfp.fingerprint_file(file)
+    expected = from_json(files, length=11)
+    records = list(fingerprint_triples(DataFingerprint(debug=0, length=11), str(tmp_path)))
+    assert [r[:2] for r in records] == [r[:2] for r in expected]
+    for record, reference in zip(records, expected):
+      assert_allclose(record[2], reference[2], atol=1e-12)
+
+  def test_empty_documents_are_kept(self, tmp_path):
+    path = tmp_path / "scalar.json"
+    path.write_text('["just one"]')
+    store = build_store(str(tmp_path / "store"), [str(path)])
+    (record,) = fingerprint_store(DataFingerprint(debug=0), store)
+    assert record[0] == "scalar" and record[1] == 0
+    assert not np.any(record[2])
+
+  def test_main(self, tmp_path, files):
+    build_store(str(tmp_path / "store"), files)
+    result = CliRunner().invoke(main, ["-i", str(tmp_path / "store"), "--fp-length", "5"])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert len(lines) == len(DOCS)
+    fields = lines[0].split("\t")
+    assert fields[0] == "doc0"
+    assert len(fields) == 2 + 5
@@ -0,0 +1,86 @@
+"""
+This file contains the unit tests for datafingerprint/report.py
+The collectors keep the top pairs and the correlation histogram of a search in bounded memory
+"""
+import io
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+import pytest
+
+from datafingerprint.report import Histogram, PerQueryTopK, TopK, write_pairs
+from datafingerprint.search import correlation_blocks, prepare
+
+
+@pytest.fixture
+def fps():
+  return np.random.RandomState(5).uniform(size=(30, 11)).argsort(axis=1)
+
+
+def full_matrix(fps):
+  p = prepare(fps, np.float64)
+  return p @ p.T
+
+
+def run(collector, fps, target=None, block_size=7):
+  for q0, t0, C in correlation_blocks(fps, target, block_size, np.float64):
+    collector.add(q0, t0, C, target is None)
+  return collector
+
+
+class TestTopK:
+
+  @pytest.mark.parametrize("k", [1, 10, 500])
+  def test_all_vs_all(self, fps, k):
+    qi, ti, c = run(TopK(k), fps).result()
+    C = full_matrix(fps)
+    i, j = np.triu_indices(len(fps), 1)
+    expected = np.sort(C[i, j])[::-1][:k]
+    assert_array_almost_equal(c, expected)
+    assert np.all(qi < ti)
+    assert_array_almost_equal(C[qi, ti], c)
+
+  def test_cutoff(self, fps):
+    qi, ti, c = run(TopK(1000, cutoff=0.4), fps[:5], fps).result()
+    C = full_matrix(fps)[:5]
+    assert len(c) == (C >= 0.4).sum()
+    assert np.all(np.diff(c) <= 0)
+
+
+class TestPerQueryTopK:
+
+  @pytest.mark.parametrize("block_size", [4, 64])
+  def test_all_vs_all(self, fps, block_size):
+    qi, ti, c = run(PerQueryTopK(3, len(fps)), fps, block_size=block_size).result()
+    C = full_matrix(fps)
+    np.fill_diagonal(C, -np.inf)
+    assert_array_equal(qi, np.repeat(np.arange(len(fps)), 3))
+    assert_array_almost_equal(c.reshape(-1, 3), -np.sort(-C, axis=1)[:, :3])
+    assert_array_almost_equal(C[qi, ti], c)
+
+  def test_query_vs_target_cutoff(self, fps):
+    qi, ti, c = run(PerQueryTopK(5, 4, cutoff=0.99), fps[:4], fps).result()
+    assert_array_equal(qi, ti)
+    assert_array_almost_equal(c, 1)
+
+
+class TestHistogram:
+
+  def test_counts_every_pair(self, fps):
+    h = run(Histogram(), fps)
+    C = full_matrix(fps)
+    i, j = np.triu_indices(len(fps), 1)
+    assert h.counts.sum() == len(i)
+    assert_array_equal(h.counts, np.bincount((np.round(C[i, j], 6) * 100 + 100).astype(int), minlength=201))
+
+  def test_write(self):
+    h = Histogram()
+    h.add(0, 0, np.array([[0.5, 0.505, -1.0]]))
+    f = io.StringIO()
+    h.write(f)
+    assert f.getvalue() == "CORR\tPAIRS\n-1.00\t1\n0.50\t2\n"
+
+
+def test_write_pairs():
+  f = io.StringIO()
+  write_pairs(f, np.array([0]), np.array([2]), np.array([0.25]))
+  assert f.getvalue() == "1\t3\t0.250000\n"
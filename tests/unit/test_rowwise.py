@@ -0,0 +1,112 @@
+"""
+This file contains the unit tests for the datafingerprint/rowwise.py RowEncoder class
+A RowEncoder is a DataFingerprint computing the row-wise geometric fingerprint of fingerprint_runner.py
+"""
+import copy
+import json
+import math
+from click.testing import CliRunner
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+import pytest
+
+from datafingerprint.datafingerprint import DataFingerprint
+from datafingerprint.rowwise import RowEncoder, main
+
+ROWS = {
+  "p1": {"age": 31, "sex": "F", "bmi": 22.5, "dx": {"code": "E11", "n": 2}, "smoker": False, "note": ""},
+  "p2": {"age": 0, "sex": "M", "tags": [1, 2], "visits": 12},
+  "p3": {"note": None},
+}
+
+
+def geometric(v1, v2, v3):
+  tmp = np.zeros(len(v1))
+  for i in range(len(v1)):
+    xx = 1 + abs(v1[i] * math.cos(v1[i]))
+    yy = 1 + abs(v2[i] * math.cos(2 * v2[i]))
+    zz = 1 + abs(v3[i] * math.cos(3 * v3[i]))
+    tmp[i] = (xx * yy * zz) ** (1 / 3) - 1
+  tmp = tmp - min(tmp)
+  return tmp / sum(tmp) if sum(tmp) else tmp
+
+
+class TestRowEncoder:
+
+  def test_numbers_weigh_the_exponent(self):
+    encoder = RowEncoder(length=10)
+    # 250 = 2.5e2: mantissa weight 0.5 split over positions 2 and 3, exponent weight 0.5 at 2
+    assert_array_almost_equal(encoder.vector_value(250)[:4], [0, 0, 0.75, 0.25])
+    assert not np.any(encoder.vector_value(0))
+    assert not np.any(encoder.vector_value([1, 2]))
+    # numeric strings are strings
+    assert not np.array_equal(encoder.vector_value("250"), encoder.vector_value(250))
+    assert not np.any(encoder.vector_value(""))
+
+  def test_last_statement_wins(self):
+    encoder = RowEncoder(length=7)
+    statements, fp = encoder.fingerprint({"a": "x", "b": 3})
+    assert statements == 2
+    v = encoder.vector_value
+    assert_array_almost_equal(fp, geometric(v(0), v("b"), v(3)))
+    assert encoder.statements == 0
+
+  def test_accumulate(self):
+    encoder = RowEncoder(length=7, accumulate=True, block_size=1)
+    statements, fp = encoder.fingerprint({"a": "x", "b": {"c": 3}})
+    v = encoder.vector_value
+    expected = geometric(v("b"), v("c"), v(3)) + geometric(v(0), v("a"), v("x")) + geometric(v(0), v("b"), v(1))
+    assert statements == 3
+    assert_array_almost_equal(fp, expected)
+
+  def test_parity_with_recursion(self):
+    """ A row is traversed, and its strings and numbers encoded, as by DataFingerprint """
+    row = {"age": 31, "sex": "F", "bmi": 22.5, "dx": {"code": "E11", "n": 2, "when": {"y": 2019}}, "note": ""}
+    encoded, expected = [], []
+    encoder = RowEncoder(length=11, triple_sink=encoded)
+    encoder.recurse_structure(copy.deepcopy(row))
+    encoder.triple_sink.flush()
+    dfp = DataFingerprint(debug=0, length=11, triple_sink=expected)
+    dfp.recurse_structure(copy.deepcopy(row))
+    dfp.triple_sink.flush()
+    assert encoded == expected
+    assert encoder.statements == dfp.statements == 8
+    # at the default exponent weight numbers are encoded as DataFingerprint's ME
+    for value in ["F", "E11", "x y", 31, 22.5, 2019, -0.004, 0, "age"]:
+      assert_array_almost_equal(encoder.vector_value(value), dfp.vector_value(value))
+
+  def test_encoders_are_independent(self):
+    a, b = RowEncoder(length=5), RowEncoder(length=9)
+    a.recurse_structure(ROWS["p1"])
+    assert b.fingerprint(ROWS["p2"])[1].shape == (9,)
+    assert a.statements == 7
+
+
+class TestFingerprintRows:
+
+  @pytest.fixture
+  def rows_file(self, tmp_path):
+    path = tmp_path / "rows.json"
+    path.write_text(json.dumps(dict(("r%d" % i, dict(ROWS["p1"], age=i)) for i in range(40))))
+    return str(path)
+
+  def test_workers_keep_order(self, rows_file):
+    serial = list(RowEncoder(length=11).fingerprint_rows(rows_file))
+    parallel = list(RowEncoder(length=11, workers=2).fingerprint_rows(rows_file))
+    assert [r[0] for r in parallel] == ["r%d" % i for i in range(40)]
+    assert [r[1] for r in parallel] == [r[1] for r in serial]
+    for p, s in zip(parallel, serial):
+      assert_array_almost_equal(p[2], s[2])
+
+  def test_main(self, tmp_path):
+    path = tmp_path / "rows.json"
+    path.write_text(json.dumps(ROWS))
+    result = CliRunner().invoke(main, [str(path), "13"])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    # rows without statements are left out
+    assert [line.split("\t")[:2] for line in lines] == [["p1", "7"], ["p2", "4"]]
+    assert len(lines[0].split("\t")) == 2 + 13
+    result = CliRunner().invoke(main, [str(path), "13", "-o", str(tmp_path / "out"), "--output-format", "npy"])
+    assert result.exit_code == 0
+    assert np.load(str(tmp_path / "out.npy")).shape == (2, 13)
@@ -0,0 +1,61 @@
+"""
+This file contains the unit tests for datafingerprint/search.py
+The search engine computes rank correlations of serialized fingerprints as blocked matrix products
+"""
+from click.testing import CliRunner
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+import pytest
+
+from datafingerprint.fpdb import FingerprintDB, ranks
+from datafingerprint.search import correlation, main, search
+
+
+def spearman(a, b):
+  L = len(a)
+  d = np.asarray(a, dtype=float) - np.asarray(b, dtype=float)
+  return 1 - 6 * (d ** 2).sum() / (L * (L * L - 1))
+
+
+@pytest.fixture
+def fps():
+  return ranks(np.random.RandomState(3).uniform(size=(23, 13)))
+
+
+def collect(results):
+  qi, ti, c = (np.concatenate(x) for x in zip(*results))
+  order = np.lexsort((ti, qi))
+  return qi[order], ti[order], c[order]
+
+
+class TestSearch:
+
+  def test_correlation_is_spearman(self, fps):
+    assert correlation(fps[0], fps[1]) == pytest.approx(spearman(fps[0], fps[1]))
+    assert correlation(fps[0], fps[0]) == pytest.approx(1)
+
+  @pytest.mark.parametrize("block_size", [1, 5, 23, 100])
+  def test_all_vs_all_upper_triangle(self, fps, block_size):
+    qi, ti, c = collect(search(fps, block_size=block_size, dtype=np.float64))
+    expected = [(i, j) for i in range(len(fps)) for j in range(i + 1, len(fps))]
+    assert list(zip(qi, ti)) == expected
+    assert_array_almost_equal(c, [spearman(fps[i], fps[j]) for i, j in expected])
+
+  @pytest.mark.parametrize("block_size", [4, 64])
+  def test_query_vs_target_with_cutoff(self, fps, block_size):
+    qi, ti, c = collect(search(fps[:7], fps, cutoff=0.3, block_size=block_size))
+    expected = [(i, j) for i in range(7) for j in range(len(fps)) if spearman(fps[i], fps[j]) >= 0.3 + 1e-6]
+    assert set(expected) <= set(zip(qi, ti))
+    assert np.all(c >= 0.3)
+    assert np.all(c[qi == ti] == pytest.approx(1))
+
+  def test_main_fpc_format(self, tmp_path, fps):
+    FingerprintDB.create(str(tmp_path / "db"), 13).append(['a%d' % i for i in range(4)], fps[:4])
+    result = CliRunner().invoke(main, [str(tmp_path / "db.fp")])
+    assert result.exit_code == 0
+    lines = [line.split('\t') for line in result.output.splitlines()]
+    assert [(q, t) for q, t, c in lines] == [('1', '2'), ('1', '3'), ('1', '4'), ('2', '3'), ('2', '4'), ('3', '4')]
+    assert float(lines[0][2]) == pytest.approx(spearman(fps[0], fps[1]), abs=1e-6)
+    result = CliRunner().invoke(main, [str(tmp_path / "db"), str(tmp_path / "db"), '--ids', '--cutoff', '0.99'])
+    assert_array_equal([line.split('\t')[:2] for line in result.output.splitlines()],
+                       [['a%d' % i, 'a%d' % i] for i in range(4)])
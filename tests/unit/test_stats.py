@@ -0,0 +1,139 @@
+"""
+This file contains the unit tests for datafingerprint/stats.py RunStats
+and the stats=True / --stats instrumentation of DataFingerprint
+"""
+import json
+import time
+from click.testing import CliRunner
+from numpy.testing import assert_array_equal
+import pytest
+
+from datafingerprint.datafingerprint import DataFingerprint, main
+from datafingerprint.stats import RunStats
+
+DOCS = [{"a": 1, "b": ["x", "y", {"c": 2.5}]}, {"a": 2, "d": "x"}, {"e": None}]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+  for n, doc in enumerate(DOCS):
+    (tmp_path / ("doc%d.json" % n)).write_text(json.dumps(doc))
+  return tmp_path
+
+
+class TestRunStats:
+
+  def test_timed_sections_are_exclusive(self):
+    stats = RunStats()
+    inner = stats.timed("inner", lambda: time.sleep(0.01))
+
+    def work():
+      inner()
+      inner()
+    outer = stats.timed("outer", work)
+    outer()
+    inner()
+    assert stats.calls == {"outer": 1, "inner": 1}
+    assert stats.seconds["outer"] >= 0.02
+
+  def test_timer(self):
+    stats = RunStats()
+    with stats.timer("write"):
+      with stats.timer("format"):
+        pass
+    assert stats.calls == {"write": 1}
+    disabled = RunStats(enabled=False)
+    with disabled.timer("write"):
+      pass
+    assert not disabled.calls
+
+  def test_timed_iter(self):
+    stats = RunStats()
+    assert list(stats.timed_iter("read", iter([1, 2, 3]))) == [1, 2, 3]
+    assert stats.calls["read"] == 4
+    disabled = RunStats(enabled=False)
+    items = iter([1])
+    assert disabled.timed_iter("read", items) is items
+
+  def test_documents(self):
+    stats = RunStats()
+    for n in [0, 1, 5, 6, 100]:
+      stats.document(n)
+    documents = stats.report()["documents"]
+    assert documents["count"] == 5 and documents["statements"] == 112
+    assert documents["min_statements"] == 0 and documents["max_statements"] == 100
+    assert documents["statements_histogram"] == {"0": 1, "1-1": 1, "4-7": 2, "64-127": 1}
+
+  def test_take_and_merge(self):
+    worker, parent = RunStats(), RunStats()
+    worker.timed("vector_value", lambda: None)()
+    worker.document(3)
+    counters = worker.take()
+    assert worker.documents == 0 and not worker.calls
+    parent.document(1)
+    parent.merge(counters)
+    parent.merge(None)
+    report = parent.report()
+    assert report["documents"]["count"] == 2 and report["documents"]["min_statements"] == 1
+    assert report["phases"]["vector_value"]["calls"] == 1
+
+
+class TestInstrumentation:
+
+  def test_disabled_by_default(self):
+    dfp = DataFingerprint(debug=0)
+    assert "compute_vector_value" not in vars(dfp)
+    dfp.recurse_structure(DOCS[0])
+    assert dfp.stats_report()["phases"] == {}
+
+  def test_same_fingerprints(self, corpus):
+    files = sorted(str(f) for f in corpus.iterdir())
+    plain = DataFingerprint(debug=0).fingerprint_many(files)
+    dfp = DataFingerprint(debug=0, stats=True)
+    timed = dfp.fingerprint_many(files)
+    assert timed[0] == plain[0]
+    assert_array_equal(timed[2], plain[2])
+    report = dfp.stats_report()
+    assert {"read", "vector_value", "add_vector_value"} <= set(report["phases"])
+    # values are only encoded on a cache miss
+    assert report["phases"]["vector_value"]["calls"] == dfp.cache.misses
+    assert report["phases"]["read"]["calls"] == 3
+    assert report["documents"]["count"] == 3
+    assert report["documents"]["statements"] == sum(timed[1])
+    assert report["cache"]["hits"] == dfp.cache.hits and report["cache"]["hit_rate"] > 0
+    assert report["memory"]["peak_rss_mb"] > 0
+
+  def test_workers_are_merged(self, corpus):
+    files = sorted(str(f) for f in corpus.iterdir())
+    serial = DataFingerprint(debug=0, stats=True)
+    serial.fingerprint_many(files)
+    parallel = DataFingerprint(debug=0, stats=True, workers=2)
+    parallel.fingerprint_many(files)
+    expected, report = serial.stats_report(), parallel.stats_report()
+    assert report["documents"] == expected["documents"]
+    # each worker has a cache of its own, so only the lookups add up
+    lookups = report["cache"]["hits"] + report["cache"]["misses"]
+    assert lookups == expected["cache"]["hits"] + expected["cache"]["misses"]
+
+  def test_main_stats(self, corpus, tmp_path):
+    path = tmp_path / "stats.json"
+    result = CliRunner().invoke(main, ["--input", str(corpus), "--debug", "0", "--stats", str(path)])
+    assert result.exit_code == 0
+    report = json.loads(path.read_text())
+    assert report["documents"]["count"] == 3
+    assert {"write", "format"} <= set(report["phases"])
+    # one block written to out.fp and the three lines echoed to the screen
+    assert report["phases"]["write"]["calls"] == 1 + 3
+    assert report["phases"]["format"]["calls"] == 3
+
+  def test_main_stats_rows(self, tmp_path):
+    rows = tmp_path / "rows.json"
+    rows.write_text(json.dumps({"r%d" % n: doc for n, doc in enumerate(DOCS)}))
+    path = tmp_path / "stats.json"
+    result = CliRunner().invoke(main, ["--input", str(rows), "--rows", "--debug", "0", "--stats", str(path)])
+    assert result.exit_code == 0
+    report = json.loads(path.read_text())
+    # formatting and writing the lines are told apart; the last row has no statements
+    assert len(result.output.splitlines()) == 2
+    assert report["phases"]["format"]["calls"] == 2
+    assert report["phases"]["write"]["calls"] == 2
@@ -0,0 +1,94 @@
+"""
+This file contains the unit tests for the datafingerprint/triplestore.py TripleStore classes
+A triple store keeps the interned (name, key, cargo) triples of many documents in one directory
+"""
+import json
+from click.testing import CliRunner
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from datafingerprint.datafingerprint import DataFingerprint
+from datafingerprint.triples import TextTripleSink
+from datafingerprint.triplestore import TripleStore, TripleStoreWriter, build_store, json_triples, main, \
+  merge_stores, token_value
+from datafingerprint.vector_store import token_key
+
+
+def write_docs(tmp_path, n=6):
+  files = []
+  for i in range(n):
+    path = tmp_path / ("doc%d.json" % i)
+    path.write_text(json.dumps({"name": "d%d" % i, "n": i, "tags": ["a", "b", i], "x": {"y": "1", "z": 1.5}}))
+    files.append(str(path))
+  return files
+
+
+class TestTripleStore:
+
+  def test_token_values_keep_their_type(self):
+    for value in ["1", 1, 1.5, True, False, None, "", "é"]:
+      decoded = token_value(token_key(value))
+      assert decoded == value and type(decoded) is type(value)
+
+  def test_roundtrip(self, tmp_path):
+    with TripleStoreWriter(str(tmp_path / "store"), buffer_size=2) as writer:
+      writer.add_document("a", [("root", "k", "v"), ("root", "n", 1)])
+      writer.add_document("empty", [])
+      with writer.sink(chunk_size=1) as sink:
+        sink.add("x", "k", "1")
+      writer.end_document("b")
+    store = TripleStore(str(tmp_path / "store"))
+    assert len(store) == 3
+    assert store.ids == ["a", "empty", "b"]
+    assert store.document_triples(0) == [("root", "k", "v"), ("root", "n", 1)]
+    assert store.document_triples(1) == []
+    assert store.document_triples(2) == [("x", "k", "1")]
+    # "1" and 1 are different tokens, "k" is interned once
+    assert store.meta["tokens"] == 7
+    assert isinstance(store.triples, np.memmap)
+    assert_array_equal(store.document(2)[0], [5, 1, 6])
+
+  def test_json_triples_are_those_of_the_fingerprint(self, tmp_path):
+    files = write_docs(tmp_path, 1)
+    triples = []
+    dfp = DataFingerprint(triple_sink=triples)
+    dfp.fingerprint_document(files[0])
+    dfp.triple_sink.flush()
+    assert json_triples(files[0]) == ("doc0", triples)
+    assert len(triples) == dfp.statements
+
+  def test_parallel_equals_serial(self, tmp_path):
+    files = write_docs(tmp_path)
+    serial = build_store(str(tmp_path / "serial"), files)
+    parallel = build_store(str(tmp_path / "parallel"), files, workers=2, chunk_size=2)
+    assert parallel.ids == serial.ids
+    assert parallel.meta == serial.meta
+    for i in range(len(serial)):
+      assert parallel.document_triples(i) == serial.document_triples(i)
+    assert not list(tmp_path.glob("*.parts*"))
+
+  def test_merge_remaps_tokens(self, tmp_path):
+    with TripleStoreWriter(str(tmp_path / "a")) as writer:
+      writer.add_document("a", [("p", "q", 1)])
+    with TripleStoreWriter(str(tmp_path / "b")) as writer:
+      writer.add_document("b", [(1, "q", "p")])
+    store = merge_stores([str(tmp_path / "a"), str(tmp_path / "b")], str(tmp_path / "ab"))
+    assert store.meta["tokens"] == 3
+    assert store.document_triples(1) == [(1, "q", "p")]
+    assert_array_equal(store.document(1), store.document(0)[:, ::-1])
+
+  def test_main_from_text(self, tmp_path):
+    files = write_docs(tmp_path, 2)
+    for file in files:
+      with TextTripleSink(file.replace(".json", ".triple")) as sink:
+        for triple in json_triples(file)[1]:
+          sink.add(*triple)
+    result = CliRunner().invoke(main, ["-i", str(tmp_path), "-o", str(tmp_path / "text"), "--from-text"])
+    assert result.exit_code == 0
+    assert result.output.startswith("Stored ")
+    text = TripleStore(str(tmp_path / "text"))
+    store = build_store(str(tmp_path / "json"), files)
+    assert text.ids == ["doc0", "doc1"]
+    # floats are quoted in .triple files and read back as strings, which
+    # encode like the numbers
+    assert [t[:2] for t in text.document_triples(0)] == [t[:2] for t in store.document_triples(0)]
@@ -0,0 +1,93 @@
+"""
+This file contains the unit tests for the datafingerprint/vector_cache.py VectorCache class
+The VectorCache is the bounded, per-instance store behind DataFingerprint.vector_value
+"""
+import gc
+import weakref
+import numpy
+from numpy.testing import assert_array_equal
+
+from datafingerprint.datafingerprint import DataFingerprint
+from datafingerprint.vector_cache import VectorCache
+
+
+class TestVectorCache:
+
+  def test_hit_and_miss_counters(self):
+    cache = VectorCache()
+    assert cache.get("key") is None
+    cache.put("key", numpy.ones(13))
+    assert_array_equal(cache.get("key"), numpy.ones(13))
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+    assert stats['strings'] == 1
+
+  def test_lru_eviction(self):
+    cache = VectorCache(max_entries=2)
+    cache.put("a", numpy.zeros(13))
+    cache.put("b", numpy.zeros(13))
+    cache.get("a")                  # "b" is now least recently used
+    cache.put("c", numpy.zeros(13))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.evictions == 1
+
+  def test_numbers_have_separate_policy(self):
+    cache = VectorCache(max_entries=10, max_numbers=0)
+    cache.put(42, numpy.zeros(13))
+    cache.put("42", numpy.zeros(13))
+    assert cache.get(42) is None
+    assert cache.get("42") is not None
+    assert len(cache) == 1
+
+  def test_byte_budget(self):
+    entry = VectorCache.entry_size("k0", numpy.zeros(13))
+    cache = VectorCache(max_entries=None, max_bytes=3 * entry)
+    for i in range(10):
+      cache.put("k%d" % i, numpy.zeros(13))
+    assert cache.nbytes <= 3 * entry
+    assert len(cache) == 3
+    assert cache.evictions == 7
+
+  def test_clear(self):
+    cache = VectorCache()
+    cache.put("a", numpy.zeros(13))
+    cache.put(1, numpy.zeros(13))
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+  def test_datafingerprint_uses_instance_cache(self):
+    dfp = DataFingerprint(cache_size=1, number_cache_size=0)
+    first = dfp.vector_value("GATC")
+    assert dfp.vector_value("GATC") is first
+    dfp.vector_value("TAGC")
+    dfp.vector_value(7)
+    stats = dfp.cache.stats()
+    assert stats['strings'] == 1
+    assert stats['numbers'] == 0
+    assert stats['evictions'] == 1
+
+  def test_datafingerprint_counts_each_lookup_once(self):
+    dfp = DataFingerprint(debug=0)
+    dfp.vector_value("GATC")
+    dfp.vector_value(42)
+    assert (dfp.cache.hits, dfp.cache.misses) == (0, 2)
+    # a mixed batch: two cached values, two batched strings (one repeated)
+    # and two values encoded one at a time
+    dfp.vector_values(["GATC", 42, "Beth", 3.5, "", "Beth"])
+    assert (dfp.cache.hits, dfp.cache.misses) == (2, 6)
+    dfp.vector_value("Beth")
+    dfp.vector_value(3.5)
+    assert (dfp.cache.hits, dfp.cache.misses) == (4, 6)
+
+  def test_datafingerprint_is_not_kept_alive(self):
+    dfp = DataFingerprint()
+    dfp.vector_value("GATC")
+    ref = weakref.ref(dfp)
+    del dfp
+    gc.collect()
+    assert ref() is None
@@ -0,0 +1,88 @@
+"""
+This file contains the unit tests for the datafingerprint/vector_store.py VectorStore class
+The VectorStore is an on-disk, memory-mapped table of token vectors
+"""
+import copy
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+import pytest
+
+from datafingerprint.datafingerprint import DataFingerprint
+from datafingerprint.vector_store import VectorStore, vocabulary
+
+
+DOC = {
+  "name": {"first": "John", "last": "Smith"},
+  "children": ["Adam", "Beth", "Chloe"],
+  "age": 42,
+  "height": 1.82,
+}
+
+
+class TestVectorStore:
+
+  def test_vocabulary(self):
+    counts = vocabulary(DOC)
+    assert counts["name"] == 1
+    assert counts["Beth"] == 1
+    assert counts[42] == 1
+    # array positions 0..3 and the length 3 of the children array
+    assert counts[3] == 1
+
+  def test_build_and_get(self, tmp_path):
+    dfp = DataFingerprint(debug=0)
+    tokens = list(vocabulary(DOC))
+    store = VectorStore.build(str(tmp_path / "store"), tokens, dfp)
+    assert len(store) == len(tokens)
+    for token in tokens:
+      assert_array_equal(store.get(token), dfp.compute_vector_value(token))
+    assert store.get("not in the store") is None
+    assert store.get("42") is None    # strings and numbers are stored apart
+    assert store.hits == len(tokens)
+
+  def test_reopen_read_only(self, tmp_path):
+    dfp = DataFingerprint(debug=0)
+    VectorStore.build(str(tmp_path / "store"), ["GATC"], dfp)
+    store = VectorStore(str(tmp_path / "store"))
+    vector = store.get("GATC")
+    assert_array_equal(vector, dfp.compute_vector_value("GATC"))
+    assert not vector.flags.writeable
+
+  def test_empty_store(self, tmp_path):
+    store = VectorStore.build(str(tmp_path / "store"), [], DataFingerprint(debug=0))
+    assert len(store) == 0
+    assert store.get("anything") is None
+
+  def test_mismatched_encoding(self, tmp_path):
+    VectorStore.build(str(tmp_path / "store"), ["GATC"], DataFingerprint(debug=0))
+    dfp = DataFingerprint(length=20, vector_store=str(tmp_path / "store"))
+    with pytest.raises(ValueError):
+      dfp.vector_value("GATC")
+
+  def test_checked_after_configuration(self, tmp_path):
+    """ The store is checked against the attributes set after construction """
+    path = str(tmp_path / "store")
+    VectorStore.build(path, ["GATC"], DataFingerprint(debug=0))
+    dfp = DataFingerprint(debug=0, vector_store=path)
+    dfp.numeric_encoding = "ML"
+    with pytest.raises(ValueError):
+      dfp.recurse_structure(copy.deepcopy(DOC))
+    with pytest.raises(ValueError):
+      dfp.worker_parameters()
+    # a store built for ML serves an instance set to ML
+    ml = DataFingerprint(debug=0)
+    ml.numeric_encoding = "ML"
+    VectorStore.build(path, ["GATC"], ml)
+    dfp = DataFingerprint(debug=0, vector_store=path)
+    dfp.numeric_encoding = "ML"
+    assert_array_equal(dfp.vector_value("GATC"), ml.compute_vector_value("GATC"))
+    assert dfp.vector_store.hits == 1
+
+  def test_fingerprint_with_store(self, tmp_path):
+    path = str(tmp_path / "store")
+    VectorStore.build(path, list(vocabulary(DOC)), DataFingerprint(debug=0))
+    dfp = DataFingerprint(debug=0, vector_store=path)
+    dfp.recurse_structure(copy.deepcopy(DOC))
+    reference = DataFingerprint(debug=0)
+    reference.recurse_structure(copy.deepcopy(DOC))
+    assert dfp.vector_store.hits > 0
+    assert_array_almost_equal(dfp.fp, reference.fp)
@@ -0,0 +1,93 @@
+"""
+This file contains the unit tests for datafingerprint/writers.py
+Writers buffer fingerprint records and write them in blocks as text, .npy or a serialized database
+"""
+import json
+from click.testing import CliRunner
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+
+from datafingerprint.datafingerprint import DataFingerprint, main
+from datafingerprint.fpdb import FingerprintDB, ranks, read_fingerprint_text
+from datafingerprint.writers import format_rows, open_writer
+
+FPS = np.array([[0.12345, -1.0, 2.5], [0.0, -0.0004, 10.0], [1e-9, 3.14159, -2.0]])
+
+
+class TestWriters:
+
+  def test_format_rows_like_perl(self):
+    text = format_rows(['a', 'b'], [3, 4], FPS[:2], decimal=3)
+    assert text == "a\t3\t0.123\t-1.000\t2.500\nb\t4\t0.000\t-0.000\t10.000\n"
+
+  def test_tsv_streams_blocks(self, tmp_path):
+    with open_writer(str(tmp_path / "out"), 3, 'tsv', buffer_size=2) as writer:
+      for i, fp in enumerate(FPS):
+        writer.add('id%d' % i, i, fp)
+      assert writer.count == 2
+    records = list(read_fingerprint_text(str(tmp_path / "out.fp"), 3))
+    assert [r[0] for r in records] == ['id0', 'id1', 'id2']
+    assert records[2][1] == ['2']
+    assert records[2][2] == [0.0, 3.142, -2.0]
+
+  def test_npy(self, tmp_path):
+    with open_writer(str(tmp_path / "out"), 3, 'npy', buffer_size=2) as writer:
+      writer.add('x', 1, FPS[0])
+      writer.add_block(['y', 'z'], [2, 3], FPS[1:])
+    assert_array_equal(np.load(str(tmp_path / "out.npy")), FPS)
+    assert (tmp_path / "out.ids").read_text() == "x\t1\ny\t2\nz\t3\n"
+
+  def test_empty_npy(self, tmp_path):
+    open_writer(str(tmp_path / "out"), 3, 'npy').close()
+    assert np.load(str(tmp_path / "out.npy")).shape == (0, 3)
+
+  def test_serialized(self, tmp_path):
+    with open_writer(str(tmp_path / "out"), 3, 'fp') as writer:
+      writer.add_block(['a', 'b', 'c'], [5, 6, 7], FPS)
+    db = FingerprintDB(str(tmp_path / "out.db"))
+    assert db.ids() == ['a', 'b', 'c']
+    assert db.extra(1) == ['6']
+    assert_array_equal(db.vectors(), ranks(FPS))
+
+  def test_unknown_format(self, tmp_path):
+    with pytest.raises(ValueError):
+      open_writer(str(tmp_path / "out"), 3, 'xml')
+
+
+class TestProcessOutput:
+
+  @pytest.fixture
+  def json_dir(self, tmp_path):
+    for i in range(5):
+      (tmp_path / ("p%d.json" % i)).write_text(json.dumps({"n": i, "s": "v%d" % i}))
+    return tmp_path
+
+  def test_out_fp_written_once(self, json_dir):
+    dfp = DataFingerprint(debug=0, file_paths=[str(json_dir)], length="5,7")
+    dfp.process()
+    for L in (5, 7):
+      records = list(read_fingerprint_text(str(json_dir / ("out.L%d.fp" % L)), L))
+      assert [r[0] for r in records] == ['p%d' % i for i in range(5)]
+      expected = DataFingerprint(debug=0, length=L).fingerprint_file(str(json_dir / "p3.json"))
+      assert records[3][2] == [float('%.3f' % v) for v in expected[2]]
+
+  @pytest.mark.parametrize("output_format", ['npy', 'fp'])
+  def test_main_output_format(self, json_dir, output_format):
+    result = CliRunner().invoke(main, ['--input', str(json_dir), '--debug', '0', '--output-format', output_format])
+    assert result.exit_code == 0
+    if output_format == 'npy':
+      assert np.load(str(json_dir / "out.npy")).shape == (5, 13)
+    else:
+      assert len(FingerprintDB(str(json_dir / "out.db"))) == 5
+
+  def test_tsv_and_fp_side_by_side(self, json_dir):
+    """ The text output and the serialized database do not overwrite each other """
+    for output_format in ('tsv', 'fp'):
+      result = CliRunner().invoke(main, ['--input', str(json_dir), '--debug', '0', '--output-format', output_format])
+      assert result.exit_code == 0
+    records = list(read_fingerprint_text(str(json_dir / "out.fp"), 13))
+    assert [r[0] for r in records] == ['p%d' % i for i in range(5)]
+    db = FingerprintDB(str(json_dir / "out.db"))
+    assert db.ids() == ['p%d' % i for i in range(5)]
+    assert_array_equal(db.vectors(), ranks(np.array([r[2] for r in records])))
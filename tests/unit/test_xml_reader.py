@@ -0,0 +1,123 @@
+"""
+This file contains the unit tests for datafingerprint/xml_reader.py
+XML elements are mapped onto dicts, lists and strings and fingerprinted like the equivalent json
+"""
+import gzip
+from click.testing import CliRunner
+from numpy.testing import assert_array_almost_equal
+import pytest
+import xml.etree.ElementTree as ET
+
+from datafingerprint.datafingerprint import DataFingerprint, fingerprint_many, main
+from datafingerprint.xml_reader import element_data, is_xml, iter_xml_records, read_xml
+
+ARTICLES = """<?xml version="1.0"?>
+<PubmedArticleSet xmlns:x="urn:x">
+  <PubmedArticle status="done">
+    <MedlineCitation><PMID Version="1">101</PMID><Title>Alpha</Title></MedlineCitation>
+    <Author>Smith</Author><Author>Jones</Author>
+  </PubmedArticle>
+  <!-- a comment -->
+  <PubmedArticle status="new">
+    <MedlineCitation><PMID Version="1">102</PMID><Title>Beta</Title></MedlineCitation>
+    <Author>Lee</Author><Empty/>
+  </PubmedArticle>
+</PubmedArticleSet>
+"""
+
+FIRST = {"status": "done", "MedlineCitation": {"PMID": {"Version": "1", "content": "101"}, "Title": "Alpha"},
+         "Author": ["Smith", "Jones"]}
+
+
+@pytest.fixture
+def articles(tmp_path):
+  path = tmp_path / "articles.xml"
+  path.write_text(ARTICLES)
+  return str(path)
+
+
+class TestElementData:
+
+  def test_mapping(self):
+    elem = ET.fromstring('<a x="1"><b>t</b><b><c/></b><x:d xmlns:x="urn:x">u</x:d>text</a>')
+    mixed = ET.fromstring('<p>one <i>two</i> three</p>')
+    assert element_data(mixed) == {"i": "two", "content": ["one", "three"]}
+    assert element_data(elem) == {"x": "1", "b": ["t", {"c": {}}], "d": "u", "content": "text"}
+    assert element_data(ET.fromstring('<a> only </a>')) == "only"
+    assert element_data(ET.fromstring('<a/>')) == {}
+
+  def test_is_xml(self):
+    assert is_xml("a/b.xml") and is_xml("b.XML.gz") and is_xml("b.xml.xz")
+    assert not is_xml("b.json") and not is_xml("b.xml.txt")
+
+  def test_read_xml_drops_the_root(self, articles):
+    data = read_xml(articles)
+    assert list(data) == ["PubmedArticle"]
+    assert data["PubmedArticle"][0] == FIRST
+
+
+class TestXmlRecords:
+
+  def test_records_are_children_of_root(self, articles):
+    records = list(iter_xml_records(articles))
+    assert [r[0] for r in records] == ["0", "1"]
+    assert records[0][1] == FIRST
+
+  def test_id_path(self, articles):
+    records = list(iter_xml_records(articles, id_field="MedlineCitation/PMID/content"))
+    assert [r[0] for r in records] == ["101", "102"]
+    assert records[0][1]["MedlineCitation"]["PMID"] == {"Version": "1"}
+
+  def test_record_tag(self, tmp_path, articles):
+    path = tmp_path / "articles.xml.gz"
+    with gzip.open(str(path), "wt") as f:
+      f.write(ARTICLES)
+    records = list(iter_xml_records(str(path), record_tag="MedlineCitation"))
+    assert [r[1]["Title"] for r in records] == ["Alpha", "Beta"]
+
+  def test_elements_are_cleared(self, articles):
+    seen = []
+    parse = ET.iterparse
+
+    def spy(*args, **kwargs):
+      for event, elem in parse(*args, **kwargs):
+        seen.append(elem)
+        yield event, elem
+    ET.iterparse = spy
+    try:
+      list(iter_xml_records(articles))
+    finally:
+      ET.iterparse = parse
+    root = seen[0]
+    assert root.tag == "PubmedArticleSet"
+    assert len(root) == 0
+
+
+class TestXmlFingerprints:
+
+  def test_same_as_json(self, articles):
+    dfp = DataFingerprint(debug=0)
+    xml_record = dfp.fingerprint_file(articles)
+    json_fp = DataFingerprint(debug=0)
+    json_fp.recurse_structure(read_xml(articles))
+    assert xml_record[0] == "articles"
+    assert xml_record[1] == json_fp.statements
+    assert_array_almost_equal(xml_record[2], json_fp.fp)
+
+  @pytest.mark.parametrize("workers", [1, 2])
+  def test_rows(self, articles, workers):
+    dfp = DataFingerprint(debug=0, xml=True, id_field="MedlineCitation/PMID/content", workers=workers)
+    records = list(dfp.fingerprint_rows(articles))
+    data = [r[1] for r in iter_xml_records(articles, id_field="MedlineCitation/PMID/content")]
+    ids, statements, fps = fingerprint_many(data, columnar=False)
+    assert [r[0] for r in records] == ["101", "102"]
+    assert [r[1] for r in records] == list(statements)
+    for record, fp in zip(records, fps):
+      assert_array_almost_equal(record[2], fp)
+
+  def test_main_directory(self, tmp_path, articles):
+    (tmp_path / "bad.xml").write_text("<a><b></a>")
+    result = CliRunner().invoke(main, ["--input", str(tmp_path), "--xml", "--debug", "0", "--workers", "2"])
+    assert result.exit_code == 0
+    assert (tmp_path / "out.fp").read_text().startswith("articles\t")
+    assert (tmp_path / "out.fp").read_text().count("\n") == 1